@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Memory footprint, build time and query latency of the analytics snapshot
+
+Builds a ClaimsSnapshot from synthetic pre-encoded columns (no database), then
+applies an incremental batch of changed rows and times date-range queries.
+
+    cd hospital_claims_backend
+    python benchmarks/analytics_snapshot.py --rows 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'hospital_claims'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_claims.settings')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+
+from claims.analytics import VALUE_COLUMNS, ClaimsSnapshot  # noqa: E402
+
+
+def synthetic_columns(rows, tpas, insurers, years, rng):
+    first_day = date.today().toordinal() - 365 * years
+    day_ordinals = first_day + rng.integers(0, 365 * years, rows)
+    values = np.empty((rows, len(VALUE_COLUMNS)), dtype=np.int64)
+    values[:, 0] = 1
+    values[:, 1:] = rng.integers(5_000_000, 45_000_000, (rows, len(VALUE_COLUMNS) - 1))
+    return (
+        np.arange(1, rows + 1, dtype=np.int64),
+        day_ordinals.astype(np.int64),
+        rng.integers(0, tpas, rows).astype(np.int32),
+        rng.integers(0, insurers, rows).astype(np.int32),
+        values,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--tpas', type=int, default=40)
+    parser.add_argument('--insurers', type=int, default=30)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--changes', type=int, default=5_000, help='Rows in the incremental batch')
+    parser.add_argument('--queries', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    columns = synthetic_columns(args.rows, args.tpas, args.insurers, args.years, rng)
+    tpa_names = [f'TPA {i}' for i in range(args.tpas)]
+    insurer_names = [f'Insurer {i}' for i in range(args.insurers)]
+
+    start = time.perf_counter()
+    snapshot = ClaimsSnapshot().from_arrays(*columns, tpa_names, insurer_names)
+    build_seconds = time.perf_counter() - start
+
+    # Incremental batch: move some rows to new dates/TPAs, as refresh() does
+    changed = rng.choice(args.rows, args.changes, replace=False)
+    start = time.perf_counter()
+    snapshot._accumulate(snapshot.days[changed], snapshot.tpas[changed], snapshot.insurers[changed],
+                         snapshot.values[changed], -1)
+    snapshot.tpas[changed] = rng.integers(0, args.tpas, args.changes)
+    snapshot._accumulate(snapshot.days[changed], snapshot.tpas[changed], snapshot.insurers[changed],
+                         snapshot.values[changed], 1)
+    snapshot._rebuild_prefix()
+    incremental_seconds = time.perf_counter() - start
+
+    first_day = date.fromordinal(snapshot.base_day)
+    span = snapshot.n_days
+    ranges = [
+        (first_day + timedelta(days=int(a)), first_day + timedelta(days=int(a + b)))
+        for a, b in zip(rng.integers(0, span, args.queries), rng.integers(0, 365, args.queries))
+    ]
+    start = time.perf_counter()
+    for range_start, range_end in ranges:
+        snapshot._range_totals('tpa', range_start, range_end)
+    query_seconds = (time.perf_counter() - start) / args.queries
+
+    print(f'rows:                 {args.rows:,}')
+    print(f'memory:               {snapshot.memory_bytes() / 1024 / 1024:.1f} MiB')
+    print(f'full build:           {build_seconds:.3f} s')
+    print(f'incremental ({args.changes:,} rows): {incremental_seconds * 1000:.1f} ms')
+    print(f'range x TPA query:    {query_seconds * 1e6:.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+HTTP load test of the claims API: throughput and latency per endpoint
+
+Seeds a database with a fixed synthetic dataset (manage.py generate_claims,
+same seed and end date every run), boots the app under gunicorn against it,
+and runs concurrent virtual users through a weighted mix of claims list
+pages, searches, claim detail, PATCH edits, the combined dashboard request
+(all sections in one, as Dashboard.tsx does) and logins. The older three
+dashboard requests, fired together, can be added as dashboard_legacy in
+--mix. After a warm-up, every request
+is timed; the report has throughput, errors and p50/p95/p99 per endpoint and
+is saved as <label>.json. --compare checks runs against the first (the
+baseline) and exits with status 1 when an endpoint's p95 or the throughput
+got worse by more than --threshold percent.
+
+    cd hospital_claims_backend
+    python benchmarks/api_load.py --size 100000 --users 16 --duration 60 --label main
+    python benchmarks/api_load.py --size 100000 --users 16 --duration 60 --label branch
+    python benchmarks/api_load.py --compare main.json branch.json --threshold 15
+
+The dataset goes into a SQLite file in the temp directory unless
+--database-url is given; it is reused while it holds the requested size.
+SQLite takes one writer at a time, so concurrent PATCHes there can fail with
+"database is locked"; use PostgreSQL for numbers comparable to production.
+--base-url skips seeding and booting and loads a server that is already
+running, logging in as --username.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+
+import requests
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hospital_claims')
+SEED = 20240
+# Fixed, so a dataset of a given size is the same claims on every machine
+DATASET_END = date(2025, 12, 31)
+PASSWORD = 'load-test-password'
+USERS = {
+    'manager': 'loadtest-manager',
+    'dataentry': 'loadtest-entry',
+}
+DASHBOARD_PATH = '/api/claims/dashboard/?sections=summary,monthwise,companywise'
+# The per-section endpoints the dashboard called before the combined one
+LEGACY_DASHBOARD_PATHS = {
+    'dashboard summary': '/api/claims/dashboard/summary/',
+    'dashboard monthwise': '/api/claims/dashboard/monthwise/',
+    'dashboard companywise': '/api/claims/dashboard/companywise/',
+}
+# The three legacy requests together, timed as one page load; not counted as a request
+LEGACY_DASHBOARD_PAGE = 'dashboard legacy page'
+# Patient surnames and first names of the synthetic dataset, plus claim id and UHID prefixes
+SEARCH_TERMS = ['Kumar', 'Sharma', 'Devi', 'Gupta', 'Priya', 'Singh', 'Verma', 'Rekha', f'SYN{SEED}-0000012', 'UHID12']
+DEFAULT_MIX = 'list=30,search=15,detail=20,patch=10,dashboard=15,login=10'
+
+
+def seed(args):
+    """Migrate, load the synthetic dataset unless it is there already, and create the load-test users"""
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_claims.settings')
+    sys.path.append(APP_DIR)
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from authentication.models import CustomUser
+    from claims.synthetic import load, remove, synthetic_claims
+
+    call_command('migrate', verbosity=0)
+    existing = synthetic_claims(SEED).count()
+    if existing != args.size:
+        if existing:
+            remove(SEED)
+        started = time.perf_counter()
+        load(args.size, SEED, end=DATASET_END)
+        print(f'Seeded {args.size} claims in {time.perf_counter() - started:.1f}s')
+    else:
+        print(f'Reusing the {existing} seeded claims')
+
+    for role, username in USERS.items():
+        user, created = CustomUser.objects.get_or_create(
+            username=username, defaults={'email': f'{username}@example.com', 'role': role}
+        )
+        if created:
+            user.set_password(PASSWORD)
+            user.save()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def boot(args):
+    """Start gunicorn on the seeded database; returns (process, base URL)"""
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=args.database_url, DEBUG='False')
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn', 'hospital_claims.wsgi:application',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers), '--threads', str(args.threads),
+            '--timeout', '120', '--log-level', 'warning',
+        ],
+        cwd=APP_DIR, env=env,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit('gunicorn exited during startup')
+        try:
+            requests.get(f'{base_url}/api/claims/', timeout=2)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit('gunicorn did not start within 60s')
+
+
+def login(base_url, username, password):
+    response = requests.post(f'{base_url}/api/auth/login/', json={'username': username, 'password': password})
+    response.raise_for_status()
+    return response.json()['access']
+
+
+def claim_ids(session, base_url, pages=10):
+    """Ids for detail and PATCH requests, from the first list pages"""
+    ids = []
+    for page in range(1, pages + 1):
+        response = session.get(f'{base_url}/api/claims/?page={page}')
+        if response.status_code != 200:
+            break
+        data = response.json()
+        ids.extend(claim['id'] for claim in data['results'])
+        if not data.get('next'):
+            break
+    if not ids:
+        raise SystemExit('The claims list is empty; nothing to load test')
+    return ids
+
+
+class Recorder:
+    """Latencies and errors per endpoint, kept once the warm-up is over"""
+
+    def __init__(self, record_after):
+        self.record_after = record_after
+        self.latencies = defaultdict(list)
+        # Failed requests per endpoint, by status code (or exception name)
+        self.errors = defaultdict(Counter)
+        self.lock = threading.Lock()
+
+    def add(self, endpoint, started, elapsed, error=None):
+        if started < self.record_after:
+            return
+        with self.lock:
+            self.latencies[endpoint].append(elapsed)
+            if error is not None:
+                self.errors[endpoint][str(error)] += 1
+
+
+def timed(recorder, endpoint, request, *args, **kwargs):
+    started = time.monotonic()
+    start = time.perf_counter()
+    try:
+        response = request(*args, timeout=120, **kwargs)
+        error = response.status_code if response.status_code >= 400 else None
+    except requests.RequestException as e:
+        error = type(e).__name__
+    recorder.add(endpoint, started, time.perf_counter() - start, error)
+
+
+def virtual_user(number, args, base_url, tokens, ids, mix, recorder, stop_at):
+    rng = random.Random(args.seed * 1000 + number)
+    operations, weights = zip(*mix.items())
+    manager = requests.Session()
+    manager.headers['Authorization'] = f'Bearer {tokens["manager"]}'
+    entry = requests.Session()
+    entry.headers['Authorization'] = f'Bearer {tokens["dataentry"]}'
+    trio = ThreadPoolExecutor(max_workers=len(LEGACY_DASHBOARD_PATHS))
+    try:
+        while time.monotonic() < stop_at:
+            operation = rng.choices(operations, weights)[0]
+            if operation == 'list':
+                page = rng.randint(1, 50)
+                timed(recorder, 'list', entry.get, f'{base_url}/api/claims/?page={page}')
+            elif operation == 'search':
+                term = rng.choice(SEARCH_TERMS)
+                timed(recorder, 'search', entry.get, f'{base_url}/api/claims/?search={term}')
+            elif operation == 'detail':
+                timed(recorder, 'detail', entry.get, f'{base_url}/api/claims/{rng.choice(ids)}/')
+            elif operation == 'patch':
+                timed(
+                    recorder, 'patch', entry.patch, f'{base_url}/api/claims/{rng.choice(ids)}/',
+                    json={'reason_less_settlement': f'Load test {rng.randrange(10 ** 6)}'},
+                )
+            elif operation == 'dashboard':
+                timed(recorder, 'dashboard', manager.get, base_url + DASHBOARD_PATH)
+            elif operation == 'dashboard_legacy':
+                started = time.monotonic()
+                start = time.perf_counter()
+                futures = [
+                    trio.submit(timed, recorder, name, manager.get, base_url + path)
+                    for name, path in LEGACY_DASHBOARD_PATHS.items()
+                ]
+                for future in futures:
+                    future.result()
+                recorder.add(LEGACY_DASHBOARD_PAGE, started, time.perf_counter() - start)
+            else:
+                timed(
+                    recorder, 'login', requests.post, f'{base_url}/api/auth/login/',
+                    json={'username': args.username or USERS['dataentry'], 'password': args.password},
+                )
+    finally:
+        trio.shutdown()
+
+
+def summarize(latencies, errors, seconds):
+    ordered = sorted(latencies)
+    if len(ordered) > 1:
+        cuts = statistics.quantiles(ordered, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = ordered[0] if ordered else 0.0
+    return {
+        'requests': len(ordered),
+        'errors': sum(errors.values()),
+        'error_statuses': dict(errors),
+        'throughput_rps': round(len(ordered) / seconds, 2),
+        'p50_ms': round(p50 * 1000, 2),
+        'p95_ms': round(p95 * 1000, 2),
+        'p99_ms': round(p99 * 1000, 2),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 2) if ordered else 0.0,
+        'max_ms': round(ordered[-1] * 1000, 2) if ordered else 0.0,
+    }
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=APP_DIR, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain'], capture_output=True, text=True, cwd=APP_DIR).stdout
+        return revision + ('-dirty' if dirty.strip() else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name not in ('list', 'search', 'detail', 'patch', 'dashboard', 'dashboard_legacy', 'login'):
+            raise SystemExit(f'Unknown operation in --mix: {name}')
+        mix[name] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    process = None
+    if args.base_url:
+        base_url = args.base_url.rstrip('/')
+    else:
+        seed(args)
+        process, base_url = boot(args)
+    try:
+        if args.base_url and args.username:
+            tokens = dict.fromkeys(USERS, login(base_url, args.username, args.password))
+        else:
+            args.password = PASSWORD
+            tokens = {role: login(base_url, username, PASSWORD) for role, username in USERS.items()}
+        session = requests.Session()
+        session.headers['Authorization'] = f'Bearer {tokens["dataentry"]}'
+        ids = claim_ids(session, base_url)
+
+        started = time.monotonic()
+        recorder = Recorder(record_after=started + args.warmup)
+        stop_at = started + args.warmup + args.duration
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            users = [
+                pool.submit(virtual_user, number, args, base_url, tokens, ids, mix, recorder, stop_at)
+                for number in range(args.users)
+            ]
+            for user in users:
+                user.result()
+        measured = time.monotonic() - recorder.record_after
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    endpoints = {
+        name: summarize(values, recorder.errors[name], measured)
+        for name, values in sorted(recorder.latencies.items())
+    }
+    total = sum(stats['requests'] for name, stats in endpoints.items() if name != LEGACY_DASHBOARD_PAGE)
+    report = {
+        'label': args.label,
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'dataset': None if args.base_url else {'size': args.size, 'seed': SEED, 'end': DATASET_END.isoformat()},
+        'database': None if args.base_url else args.database_url.split(':', 1)[0],
+        'server': {'base_url': args.base_url} if args.base_url else {'workers': args.workers, 'threads': args.threads},
+        'users': args.users,
+        'mix': mix,
+        'warmup_s': args.warmup,
+        'duration_s': round(measured, 2),
+        'machine': {'python': platform.python_version(), 'cpus': os.cpu_count(), 'platform': platform.platform()},
+        'requests': total,
+        'errors': sum(stats['errors'] for stats in endpoints.values()),
+        'throughput_rps': round(total / measured, 2),
+        'endpoints': endpoints,
+    }
+
+    print(f"{args.label}: {report['throughput_rps']} req/s over {measured:.0f}s, {report['errors']} errors")
+    print(f'  {"endpoint":<24}{"req/s":>9}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}')
+    for name, stats in endpoints.items():
+        print(f"  {name:<24}{stats['throughput_rps']:>9.1f}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+              f"{stats['p99_ms']:>10.1f}{stats['errors']:>8}")
+
+    output = args.output or f'{args.label}.json'
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Saved {output}')
+
+
+def compare(paths, threshold):
+    reports = []
+    for path in paths:
+        with open(path) as f:
+            reports.append(json.load(f))
+    baseline = reports[0]
+    regressions = []
+    for report in reports[1:]:
+        change = (report['throughput_rps'] / baseline['throughput_rps'] - 1) * 100 if baseline['throughput_rps'] else 0
+        print(f"{report['label']} vs {baseline['label']}: {report['throughput_rps']:.1f} req/s ({change:+.1f}%)")
+        if change < -threshold:
+            regressions.append(f"{report['label']}: throughput {change:+.1f}%")
+        print(f'  {"endpoint":<24}{"p95 before":>12}{"p95 after":>12}{"change":>9}')
+        for name, before in baseline['endpoints'].items():
+            after = report['endpoints'].get(name)
+            if after is None or not before['p95_ms']:
+                continue
+            change = (after['p95_ms'] / before['p95_ms'] - 1) * 100
+            flag = '  <-- slower' if change > threshold else ''
+            print(f"  {name:<24}{before['p95_ms']:>12.1f}{after['p95_ms']:>12.1f}{change:>+8.1f}%{flag}")
+            if flag:
+                regressions.append(f"{report['label']}: {name} p95 {change:+.1f}%")
+
+    if regressions:
+        print(f'Regressions beyond {threshold}%:')
+        for regression in regressions:
+            print(f'  {regression}')
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=10000, help='Synthetic claims in the dataset (e.g. 10000, 100000, 1000000)')
+    parser.add_argument('--database-url', help='Database to seed and serve; defaults to a SQLite file per size')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--base-url', help='Load an already running server instead of booting one')
+    parser.add_argument('--username', help='With --base-url: user to log in as for every request')
+    parser.add_argument('--password', default='', help='With --base-url: password of --username')
+    parser.add_argument('--users', type=int, default=8, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds of load before measuring')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Operation weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the virtual users\' choices')
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--output', help='Report path (default: <label>.json)')
+    parser.add_argument('--compare', nargs='+', metavar='REPORT', help='Compare saved reports with the first')
+    parser.add_argument('--threshold', type=float, default=10, help='Percent slowdown --compare fails on')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare, args.threshold)
+        return
+    if not args.database_url:
+        args.database_url = 'sqlite:///' + os.path.join(tempfile.gettempdir(), f'claims-load-{args.size}.sqlite3')
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Write-path overhead of the claim change history
+
+Creates synthetic claims in a scratch database, then times the same edits
+(two settlement figures per claim) with the history paused, written per
+save, and buffered per simulated request as audited_writes does. A
+queryset update of every claim is timed with and without the history too.
+Uses an in-memory SQLite database unless DATABASE_URL is set.
+
+    cd hospital_claims_backend
+    python benchmarks/audit_overhead.py --claims 5000 --saves-per-request 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'hospital_claims'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_claims.settings')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from claims.audit import capture, paused  # noqa: E402
+from claims.models import Claim, ClaimChange  # noqa: E402
+
+
+def create_claims(count, rng):
+    first_day = date.today() - timedelta(days=720)
+    claims = []
+    for i in range(count):
+        discharged = first_day + timedelta(days=rng.randrange(700))
+        claims.append(Claim(
+            claim_id=f'BENCH-{i}', uhid_ip_no=f'U{i}', patient_name=f'Patient {i}',
+            date_of_admission=discharged - timedelta(days=3), date_of_discharge=discharged,
+            month=discharged.strftime('%Y-%m'), bill_amount=Decimal(rng.randrange(5000, 300000)),
+            approved_amount=Decimal(rng.randrange(4000, 250000)),
+        ))
+    Claim.objects.bulk_create(claims, batch_size=1000)
+
+
+def edit_claims(claims, rng, saves_per_request, mode):
+    """Save every claim with new settlement figures; returns (seconds, history INSERTs)"""
+    inserts = 0
+
+    def count_history_inserts(execute, sql, params, many, context):
+        nonlocal inserts
+        if sql.startswith('INSERT') and ClaimChange._meta.db_table in sql:
+            inserts += 1
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    with connection.execute_wrapper(count_history_inserts):
+        for start in range(0, len(claims), saves_per_request):
+            with transaction.atomic():
+                if mode == 'paused':
+                    context = paused()
+                elif mode == 'buffered':
+                    context = capture(source='benchmark')
+                else:
+                    context = transaction.atomic()
+                with context:
+                    for claim in claims[start:start + saves_per_request]:
+                        claim.total_settled_amount = Decimal(rng.randrange(1000, 200000))
+                        claim.tds = Decimal(rng.randrange(0, 5000))
+                        claim.save()
+    return time.perf_counter() - started, inserts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--claims', type=int, default=5000)
+    parser.add_argument('--saves-per-request', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    call_command('migrate', verbosity=0)
+    rng = random.Random(args.seed)
+    with paused():
+        create_claims(args.claims, rng)
+
+    started = time.perf_counter()
+    claims = list(Claim.objects.filter(claim_id__startswith='BENCH-').order_by('id'))
+    load_us = (time.perf_counter() - started) / len(claims) * 1e6
+    print(f'Loaded {len(claims)} claims ({load_us:.1f} us/claim including the history snapshot)')
+
+    print(f'{"mode":<34}{"us/save":>10}{"history INSERTs":>18}')
+    baseline = None
+    for mode, label in (
+        ('paused', 'history off'),
+        ('immediate', 'history, one INSERT per save'),
+        ('buffered', f'history, buffered per {args.saves_per_request} saves'),
+    ):
+        elapsed, inserts = edit_claims(claims, rng, args.saves_per_request, mode)
+        per_save = elapsed / len(claims) * 1e6
+        baseline = baseline or per_save
+        print(f'{label:<34}{per_save:>10.1f}{inserts:>18}   (+{(per_save / baseline - 1) * 100:.0f}%)')
+
+    for mode in ('paused', 'audited'):
+        queryset = Claim.objects.filter(claim_id__startswith='BENCH-')
+        started = time.perf_counter()
+        if mode == 'paused':
+            with paused():
+                queryset.update(co_pay=Decimal(rng.randrange(1, 500)))
+        else:
+            with capture(source='benchmark'):
+                queryset.update(co_pay=Decimal(rng.randrange(1, 500)))
+        elapsed = time.perf_counter() - started
+        print(f'queryset update, history {"off" if mode == "paused" else "on":<8}{elapsed * 1000:>10.1f} ms '
+              f'for {len(claims)} claims')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Dashboard concurrency benchmark: sync WSGI workers vs async ASGI workers
+
+Start the backend with a single worker in each mode and run this script
+against it. Each simulated manager loads the dashboard (the three dashboard
+requests in parallel, as Dashboard.tsx does) while data-entry users page
+through the claims list, so the dashboard competes with ordinary traffic.
+
+    # WSGI, one sync worker
+    gunicorn hospital_claims.wsgi:application --workers 1 --threads 4
+    python benchmarks/dashboard_concurrency.py --label wsgi
+
+    # ASGI, one uvicorn worker with the async dashboard views
+    SERVER_MODE=asgi gunicorn hospital_claims.asgi:application --workers 1 \\
+        -k uvicorn.workers.UvicornWorker
+    python benchmarks/dashboard_concurrency.py --label asgi
+
+    python benchmarks/dashboard_concurrency.py --compare wsgi.json asgi.json
+"""
+
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DASHBOARD_PATHS = [
+    '/api/claims/dashboard/summary/',
+    '/api/claims/dashboard/monthwise/',
+    '/api/claims/dashboard/companywise/',
+]
+LIST_PATH = '/api/claims/?page={page}'
+
+
+def login(base_url, username, password):
+    response = requests.post(f'{base_url}/api/auth/login/', json={
+        'username': username,
+        'password': password,
+    })
+    response.raise_for_status()
+    return response.json()['access']
+
+
+def timed_get(session, url):
+    start = time.perf_counter()
+    response = session.get(url)
+    return response.status_code, time.perf_counter() - start
+
+
+def dashboard_load(base_url, token, pool):
+    """One dashboard page load: the three requests fired together"""
+    session = requests.Session()
+    session.headers['Authorization'] = f'Bearer {token}'
+    futures = [(path, pool.submit(timed_get, session, base_url + path)) for path in DASHBOARD_PATHS]
+    start = time.perf_counter()
+    results = [(path, future.result()) for path, future in futures]
+    return results, time.perf_counter() - start
+
+
+def list_load(base_url, token, page):
+    session = requests.Session()
+    session.headers['Authorization'] = f'Bearer {token}'
+    return timed_get(session, base_url + LIST_PATH.format(page=page))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies):
+    return {
+        'count': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def run(args):
+    token = login(args.base_url, args.username, args.password)
+    latencies = {path: [] for path in DASHBOARD_PATHS + ['list', 'dashboard_page']}
+    errors = 0
+
+    # Inner pool serves the parallel trio of each dashboard load
+    with ThreadPoolExecutor(max_workers=args.managers * len(DASHBOARD_PATHS)) as trio_pool, \
+            ThreadPoolExecutor(max_workers=args.managers + args.data_entry) as pool:
+        start = time.perf_counter()
+        futures = []
+        for i in range(args.rounds):
+            for _ in range(args.managers):
+                futures.append(('dashboard', pool.submit(dashboard_load, args.base_url, token, trio_pool)))
+            for j in range(args.data_entry):
+                futures.append(('list', pool.submit(list_load, args.base_url, token, 1 + (i + j) % 5)))
+
+        for kind, future in futures:
+            if kind == 'dashboard':
+                results, page_time = future.result()
+                latencies['dashboard_page'].append(page_time)
+                for path, (status_code, elapsed) in results:
+                    errors += status_code >= 400
+                    latencies[path].append(elapsed)
+            else:
+                status_code, elapsed = future.result()
+                errors += status_code >= 400
+                latencies['list'].append(elapsed)
+        wall_time = time.perf_counter() - start
+
+    total_requests = sum(len(v) for k, v in latencies.items() if k != 'dashboard_page')
+    report = {
+        'label': args.label,
+        'managers': args.managers,
+        'data_entry': args.data_entry,
+        'rounds': args.rounds,
+        'wall_time_s': round(wall_time, 3),
+        'requests': total_requests,
+        'errors': errors,
+        'throughput_rps': round(total_requests / wall_time, 2),
+        'endpoints': {name: summarize(values) for name, values in latencies.items()},
+    }
+
+    print(f"{args.label}: {report['throughput_rps']} req/s, {errors} errors")
+    for name, stats in report['endpoints'].items():
+        print(f"  {name:40s} p50 {stats['p50_ms']:8.1f} ms   p95 {stats['p95_ms']:8.1f} ms")
+
+    with open(f'{args.label}.json', 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def compare(paths):
+    reports = []
+    for path in paths:
+        with open(path) as f:
+            reports.append(json.load(f))
+    baseline = reports[0]
+    for report in reports:
+        ratio = report['throughput_rps'] / baseline['throughput_rps'] if baseline['throughput_rps'] else 0
+        page = report['endpoints']['dashboard_page']
+        print(f"{report['label']:10s} {report['throughput_rps']:8.1f} req/s ({ratio:.2f}x)   "
+              f"dashboard page p50 {page['p50_ms']:.1f} ms, p95 {page['p95_ms']:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123456')
+    parser.add_argument('--managers', type=int, default=8, help='Concurrent dashboard loads per round')
+    parser.add_argument('--data-entry', type=int, default=8, help='Concurrent list requests per round')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--compare', nargs='+', metavar='REPORT', help='Compare saved JSON reports')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Scaling of duplicate detection with the number of claims
+
+Generates synthetic claim rows (no database) with a known share of
+re-imported and re-typed duplicates, then times the blocking + scoring pass
+at doubling sizes. Claims arrive at a fixed rate per month, so a bigger table
+means a longer history, as it does in production. Time per claim should stay
+roughly flat.
+
+    cd hospital_claims_backend
+    python benchmarks/dedupe_scaling.py --start 25000 --steps 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'hospital_claims'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_claims.settings')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import django  # noqa: E402
+
+django.setup()
+
+from claims.dedupe import find_pairs  # noqa: E402
+
+FIRST_NAMES = ['Ramesh', 'Sunita', 'Anil', 'Priya', 'Vijay', 'Meena', 'Suresh', 'Kavita', 'Rahul', 'Anjali']
+LAST_NAMES = ['Kumar', 'Sharma', 'Patel', 'Singh', 'Reddy', 'Gupta', 'Nair', 'Das', 'Iyer', 'Joshi']
+SYLLABLES = ['ra', 'vi', 'an', 'ku', 'sh', 'ma', 'de', 'pr', 'ya', 'la', 'ni', 'ta', 'go', 'ha', 'bi', 'su']
+TPA_COUNT = 40
+
+
+def synthetic_name(rng):
+    middle = ''.join(rng.choice(SYLLABLES) for _ in range(3))
+    return f'{rng.choice(FIRST_NAMES)} {middle} {rng.choice(LAST_NAMES)}'
+
+
+def synthetic_claims(count, duplicate_share, per_month, rng):
+    rows = []
+    days = max(count * 30 // per_month, 1)
+    first_day = date.today() - timedelta(days=days)
+    for i in range(1, count + 1):
+        if rows and rng.random() < duplicate_share:
+            original = rng.choice(rows)
+            row = dict(original, id=i, claim_id=f'CLM{i:08d}')
+            if rng.random() < 0.5:
+                row['patient_name'] = original['patient_name'].upper().replace(' ', '  ')
+        else:
+            discharge = first_day + timedelta(days=rng.randrange(days))
+            row = {
+                'id': i,
+                'claim_id': f'CLM{i:08d}',
+                'uhid_ip_no': f'UH{rng.randrange(10 ** 7):07d}',
+                'patient_name': synthetic_name(rng),
+                'tpa_id': rng.randrange(1, TPA_COUNT + 1),
+                'date_of_admission': discharge - timedelta(days=rng.randrange(1, 10)),
+                'date_of_discharge': discharge,
+                'month': discharge.strftime('%Y-%m'),
+                'bill_amount': Decimal(rng.randrange(20_000, 500_000)),
+            }
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--start', type=int, default=25_000, help='Claims in the first step')
+    parser.add_argument('--steps', type=int, default=5, help='Number of doublings')
+    parser.add_argument('--duplicates', type=float, default=0.02, help='Share of rows that are duplicates')
+    parser.add_argument('--per-month', type=int, default=2_000, help='Claims discharged per month')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f'{"claims":>10} {"pairs":>8} {"seconds":>8} {"us/claim":>9}')
+    for step in range(args.steps):
+        count = args.start * 2 ** step
+        rows = synthetic_claims(count, args.duplicates, args.per_month, random.Random(args.seed))
+        start = time.perf_counter()
+        pairs = find_pairs(rows)
+        seconds = time.perf_counter() - start
+        print(f'{count:>10,} {len(pairs):>8,} {seconds:>8.2f} {seconds / count * 1e6:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the claims hot paths, with a regression gate
+
+Times, in process, the per-claim cost of ClaimSerializer validation (create
+and partial update) and representation, Claim.save() with its derived fields
+and signal handlers, and import_csv_claims' parse_decimal and parse_date, plus
+whole build_dashboard() calls. Each size loads that many synthetic claims
+(the generate_claims loader, fixed seed) and the per-claim cases run over all
+of them, so table growth shows up too. Every case is run --rounds times and
+the best round is what gets compared: it is the one least disturbed by the
+rest of the machine.
+
+--save keeps the results as a baseline; --baseline compares against one and
+exits with status 1 when a case got slower than --threshold percent. Uses an
+in-memory SQLite database unless DATABASE_URL is set (the claims already in
+that database count towards the dashboard cases).
+
+    cd hospital_claims_backend
+    python benchmarks/hot_paths.py --sizes 100 1000 10000 --save baseline.json
+    python benchmarks/hot_paths.py --sizes 100 1000 10000 --baseline baseline.json --threshold 20
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'hospital_claims'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_claims.settings')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from claims.management.commands.import_csv_claims import Command as ImportCommand  # noqa: E402
+from claims.models import Claim  # noqa: E402
+from claims.serializers import ClaimSerializer  # noqa: E402
+from claims.synthetic import load, remove  # noqa: E402
+from claims.views import build_dashboard  # noqa: E402
+
+SEED = 5050
+DATASET_END = date(2025, 12, 31)
+# Shapes seen in the hospital's spreadsheet exports
+DECIMAL_VALUES = [
+    '53,394.30', '"1,20,000"', '12000', '4500.5', '-250.50', '', '   ', '....', 'NIL',
+    '4500 (NOT DEPOSITE)', '7,800*', "'9150'",
+]
+DATE_VALUES = ['23/02/2024', '29-03-2023', '23/02/24', '29-03-23', '', 'N/A', ' 01/12/2025 ']
+READ_ONLY = ('id', 'month', 'difference_amount', 'status', 'created_at', 'updated_at')
+
+
+def create_payloads(claims):
+    payloads = ClaimSerializer(claims, many=True).data
+    return [{key: value for key, value in payload.items() if key not in READ_ONLY} for payload in payloads]
+
+
+def validate_creates(payloads):
+    for payload in payloads:
+        ClaimSerializer(data=payload).is_valid(raise_exception=True)
+
+
+def validate_updates(claims):
+    for claim in claims:
+        serializer = ClaimSerializer(claim, data={'tds': '125.00', 'reason_less_settlement': 'Short paid'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+
+
+def represent(claims):
+    return ClaimSerializer(claims, many=True).data
+
+
+def save_claims(claims):
+    # Rolled back, so every round saves the same claims from the same state
+    with transaction.atomic():
+        for claim in claims:
+            claim.total_settled_amount = (claim.total_settled_amount or 0) + 1
+            claim.save()
+        transaction.set_rollback(True)
+    for claim in claims:
+        claim.total_settled_amount -= 1
+
+
+def parse_all(parse, values):
+    for value in values:
+        parse(value)
+
+
+def cases(size, rng):
+    """(name, function, items it handles) for one dataset size"""
+    claims = list(Claim.objects.select_related('tpa', 'insurer').order_by('id'))
+    payloads = create_payloads(claims)
+    importer = ImportCommand()
+    decimals = [rng.choice(DECIMAL_VALUES) for _ in range(size)]
+    dates = [rng.choice(DATE_VALUES) for _ in range(size)]
+    return [
+        ('serializer validate create', lambda: validate_creates(payloads), len(payloads)),
+        ('serializer validate update', lambda: validate_updates(claims), len(claims)),
+        ('serializer representation', lambda: represent(claims), len(claims)),
+        ('Claim.save', lambda: save_claims(claims), len(claims)),
+        ('parse_decimal', lambda: parse_all(importer.parse_decimal, decimals), size),
+        ('parse_date', lambda: parse_all(importer.parse_date, dates), size),
+        ('dashboard summary', lambda: build_dashboard({'summary'}), 1),
+        ('dashboard all sections', lambda: build_dashboard({'summary', 'monthwise', 'companywise'}), 1),
+    ]
+
+
+def time_rounds(function, rounds):
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    call_command('migrate', verbosity=0)
+    rng = random.Random(args.seed)
+    results = {}
+    print(f'{"case":<28}{"size":>8}{"best us/item":>14}{"median us/item":>16}')
+    for size in args.sizes:
+        remove(SEED)
+        load(size, SEED, end=DATASET_END)
+        for name, function, items in cases(size, rng):
+            if args.cases and name not in args.cases:
+                continue
+            function()  # warm-up: imports, cached querysets and the like
+            times = time_rounds(function, args.rounds)
+            best = min(times) / items * 1e6
+            median = statistics.median(times) / items * 1e6
+            results.setdefault(name, {})[str(size)] = {
+                'items': items, 'best_us': round(best, 3), 'median_us': round(median, 3),
+            }
+            print(f'{name:<28}{size:>8}{best:>14.2f}{median:>16.2f}')
+    remove(SEED)
+
+    return {
+        'revision': git_revision(),
+        'database': connection.vendor,
+        'rounds': args.rounds,
+        'machine': {'python': platform.python_version(), 'cpus': os.cpu_count(), 'platform': platform.platform()},
+        'results': results,
+    }
+
+
+def regressions(report, baseline, threshold):
+    """Cases slower than the baseline by more than ``threshold`` percent"""
+    slower = []
+    print(f'{"case":<28}{"size":>8}{"baseline us":>14}{"now us":>10}{"change":>9}')
+    for name, sizes in report['results'].items():
+        for size, now in sizes.items():
+            before = baseline['results'].get(name, {}).get(size)
+            if before is None or not before['best_us']:
+                continue
+            change = (now['best_us'] / before['best_us'] - 1) * 100
+            flag = '  <-- slower' if change > threshold else ''
+            print(f"{name:<28}{size:>8}{before['best_us']:>14.2f}{now['best_us']:>10.2f}{change:>+8.1f}%{flag}")
+            if flag:
+                slower.append(f'{name} at {size}: {change:+.1f}%')
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='Claims in the dataset')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--cases', nargs='+', metavar='CASE', help='Only these cases (names as printed)')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the parse_decimal/parse_date inputs')
+    parser.add_argument('--save', metavar='PATH', help='Write the results here, for use as a baseline')
+    parser.add_argument('--baseline', metavar='PATH', help='Fail when slower than these results')
+    parser.add_argument('--threshold', type=float, default=20, help='Percent slowdown that fails the run')
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Saved {args.save}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = regressions(report, baseline, args.threshold)
+        if slower:
+            print(f'Slower than {args.baseline} by more than {args.threshold}%:')
+            for case in slower:
+                print(f'  {case}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Month-scoped query cost on a plain vs a range-partitioned claims table
+
+Builds two scratch tables with the same synthetic multi-year claims (one
+plain, one partitioned by discharge month like ``partition_claims
+--convert``), indexes both the way the claims table is indexed, and times
+the queries the dashboard and lag statistics run for a single month. Needs
+PostgreSQL; the scratch tables are dropped afterwards.
+
+    cd hospital_claims_backend
+    DATABASE_URL=postgres://... python benchmarks/partition_pruning.py --rows 2000000 --years 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'hospital_claims'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hospital_claims.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+from claims.partitioning import month_range, next_interval  # noqa: E402
+
+PLAIN = 'bench_claims_plain'
+PARTITIONED = 'bench_claims_partitioned'
+COLUMNS = """
+    id bigint NOT NULL,
+    tpa_id bigint,
+    date_of_discharge date,
+    month varchar(7),
+    settlement_date date,
+    bill_amount numeric(12, 2),
+    total_settled_amount numeric(15, 2)
+"""
+QUERIES = {
+    'month totals': (
+        'SELECT COUNT(*), SUM(bill_amount), SUM(total_settled_amount) FROM {table} '
+        'WHERE month = %(month)s AND date_of_discharge >= %(start)s AND date_of_discharge < %(end)s'
+    ),
+    'month per TPA': (
+        'SELECT tpa_id, COUNT(*), SUM(bill_amount) FROM {table} '
+        'WHERE month = %(month)s AND date_of_discharge >= %(start)s AND date_of_discharge < %(end)s '
+        'GROUP BY tpa_id'
+    ),
+    'month lag p90': (
+        'SELECT percentile_cont(0.9) WITHIN GROUP (ORDER BY settlement_date - date_of_discharge) FROM {table} '
+        'WHERE settlement_date IS NOT NULL AND month = %(month)s '
+        'AND date_of_discharge >= %(start)s AND date_of_discharge < %(end)s'
+    ),
+}
+
+
+def build(rows, years, seed):
+    first = date(date.today().year - years + 1, 1, 1)
+    days = (date(date.today().year + 1, 1, 1) - first).days
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {PLAIN}, {PARTITIONED}')
+        cursor.execute(f'CREATE TABLE {PLAIN} ({COLUMNS})')
+        cursor.execute(f'CREATE TABLE {PARTITIONED} ({COLUMNS}) PARTITION BY RANGE (date_of_discharge)')
+        cursor.execute(f'CREATE TABLE {PARTITIONED}_default PARTITION OF {PARTITIONED} DEFAULT')
+        lower = first
+        while lower.year <= date.today().year:
+            upper = next_interval(lower, 'month')
+            cursor.execute(
+                f'CREATE TABLE {PARTITIONED}_{lower:%Y_%m} PARTITION OF {PARTITIONED} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [lower, upper],
+            )
+            lower = upper
+
+        cursor.execute('SELECT setseed(%s)', [seed])
+        cursor.execute(
+            f"""
+            INSERT INTO {PLAIN}
+            SELECT n, 1 + (random() * 40)::int, d, to_char(d, 'YYYY-MM'),
+                   CASE WHEN random() < 0.8 THEN d + (random() * 120)::int END,
+                   round((5000 + random() * 300000)::numeric, 2),
+                   round((4000 + random() * 250000)::numeric, 2)
+            FROM (
+                SELECT n, %s::date + (random() * %s)::int AS d FROM generate_series(1, %s) n
+            ) s
+            """,
+            [first, days - 1, rows],
+        )
+        cursor.execute(f'INSERT INTO {PARTITIONED} SELECT * FROM {PLAIN}')
+        for table in (PLAIN, PARTITIONED):
+            cursor.execute(f'CREATE INDEX ON {table} (month)')
+            cursor.execute(f'CREATE INDEX ON {table} (date_of_discharge)')
+            cursor.execute(f'CREATE INDEX ON {table} (tpa_id)')
+            cursor.execute(f'ANALYZE {table}')
+
+
+def time_query(sql, params, repeat):
+    timings = []
+    with connection.cursor() as cursor:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=float, default=0.42)
+    args = parser.parse_args()
+
+    if connection.vendor != 'postgresql':
+        sys.exit('Partitioning benchmark needs PostgreSQL (set DATABASE_URL)')
+
+    print(f'Building {args.rows} claims over {args.years} years...')
+    started = time.perf_counter()
+    build(args.rows, args.years, args.seed)
+    print(f'  built in {time.perf_counter() - started:.1f}s')
+
+    today = date.today()
+    months = [f'{today.year - 1}-{m:02d}' for m in (1, 6, 12)]
+    try:
+        print(f'{"query":<16}{"month":>9}{"plain ms":>11}{"partitioned ms":>16}{"speedup":>9}')
+        for label, sql in QUERIES.items():
+            for month in months:
+                start, end = month_range(month)
+                params = {'month': month, 'start': start, 'end': end}
+                plain = time_query(sql.format(table=PLAIN), params, args.repeat)
+                partitioned = time_query(sql.format(table=PARTITIONED), params, args.repeat)
+                print(f'{label:<16}{month:>9}{plain:>11.2f}{partitioned:>16.2f}{plain / partitioned:>8.1f}x')
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {PLAIN}, {PARTITIONED}')
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,9 @@ cd hospital_claims
 echo "Running Django migrations..."
 python manage.py migrate
 
+# Create the cache table when CACHE_URL=db://... (no-op otherwise)
+python manage.py createcachetable
+
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
@@ -1,17 +1,22 @@
 from django.contrib import admin
-from .models import Claim
+from .audit import capture
+from .models import (
+    AnomalyScan, Claim, ClaimAnomaly, ClaimArchive, ClaimArchiveTotal, ClaimChange, ClaimDocument, DocumentPreview,
+    DocumentUpload, DuplicateCandidate, DuplicateScan, Insurer, InsurerAlias, MonthSnapshot, Tpa, TpaAlias
+)
 
 @admin.register(Claim)
 class ClaimAdmin(admin.ModelAdmin):
     list_display = [
-        'claim_id', 'patient_name', 'tpa_name', 'date_of_discharge', 
+        'claim_id', 'patient_name', 'tpa', 'date_of_discharge', 
         'bill_amount', 'approved_amount', 'total_settled_amount', 'settlement_date'
     ]
-    list_filter = ['tpa_name', 'parent_insurance', 'month', 'physical_file_dispatch', 'settlement_date']
+    list_filter = ['tpa', 'insurer', 'month', 'physical_file_dispatch', 'settlement_date']
     search_fields = ['claim_id', 'patient_name', 'uhid_ip_no']
     readonly_fields = ['month', 'difference_amount', 'created_at', 'updated_at']
     date_hierarchy = 'date_of_discharge'
     ordering = ['-created_at']
+    list_select_related = ['tpa']
     
     fieldsets = (
         ('Basic Information', {
@@ -21,7 +26,7 @@ class ClaimAdmin(admin.ModelAdmin):
             'fields': ('date_of_admission', 'date_of_discharge', 'query_reply_date', 'settlement_date')
         }),
         ('Insurance Details', {
-            'fields': ('tpa_name', 'parent_insurance')
+            'fields': ('tpa', 'insurer')
         }),
         ('Financial Information', {
             'fields': (
@@ -45,3 +50,132 @@ class ClaimAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def save_model(self, request, obj, form, change):
+        # The admin is where settlements and bank verifications are corrected, so any
+        # status move is allowed here; the change history records who made it
+        with capture(user=request.user, source='admin'):
+            obj.save(reopen=True)
+
+
+class TpaAliasInline(admin.TabularInline):
+    model = TpaAlias
+    extra = 1
+
+
+@admin.register(Tpa)
+class TpaAdmin(admin.ModelAdmin):
+    list_display = ['name']
+    search_fields = ['name', 'aliases__key']
+    inlines = [TpaAliasInline]
+
+
+class InsurerAliasInline(admin.TabularInline):
+    model = InsurerAlias
+    extra = 1
+
+
+@admin.register(Insurer)
+class InsurerAdmin(admin.ModelAdmin):
+    list_display = ['name']
+    search_fields = ['name', 'aliases__key']
+    inlines = [InsurerAliasInline]
+
+
+@admin.register(ClaimAnomaly)
+class ClaimAnomalyAdmin(admin.ModelAdmin):
+    list_display = ['claim', 'kind', 'severity', 'status', 'actual_amount', 'detected_at', 'resolved_at']
+    list_filter = ['kind', 'severity', 'status']
+    search_fields = ['claim__claim_id', 'claim__patient_name']
+    raw_id_fields = ['claim']
+
+
+@admin.register(AnomalyScan)
+class AnomalyScanAdmin(admin.ModelAdmin):
+    list_display = ['started_at', 'finished_at', 'full_scan', 'claims_scanned', 'anomalies_open', 'anomalies_resolved']
+
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(admin.ModelAdmin):
+    list_display = ['claim_a', 'claim_b', 'score', 'reasons', 'status', 'detected_at']
+    list_filter = ['status']
+    search_fields = ['claim_a__claim_id', 'claim_a__patient_name', 'claim_b__claim_id', 'claim_b__patient_name']
+    raw_id_fields = ['claim_a', 'claim_b']
+
+
+@admin.register(DuplicateScan)
+class DuplicateScanAdmin(admin.ModelAdmin):
+    list_display = ['started_at', 'finished_at', 'full_scan', 'claims_scanned', 'pairs_found', 'pairs_removed']
+
+
+class ClaimArchiveTotalInline(admin.TabularInline):
+    model = ClaimArchiveTotal
+    extra = 0
+    can_delete = False
+    readonly_fields = [
+        'insurer', 'claim_count', 'bill_amount', 'approved_amount', 'total_settled_amount',
+        'tds', 'consumable_deduction', 'paid_by_patient', 'deductions'
+    ]
+
+
+@admin.register(ClaimArchive)
+class ClaimArchiveAdmin(admin.ModelAdmin):
+    list_display = ['month', 'row_count', 'size_bytes', 'archived_before', 'created_at', 'path']
+    search_fields = ['month', 'path']
+    readonly_fields = [
+        'month', 'path', 'row_count', 'size_bytes', 'sha256', 'archived_before',
+        'first_claim_id', 'last_claim_id', 'created_at'
+    ]
+    inlines = [ClaimArchiveTotalInline]
+
+
+@admin.register(ClaimChange)
+class ClaimChangeAdmin(admin.ModelAdmin):
+    list_display = ['claim_id', 'action', 'user', 'source', 'changed_at']
+    list_filter = ['action']
+    search_fields = ['=claim_id', 'user__username', 'source']
+    readonly_fields = ['claim_id', 'action', 'changes', 'user', 'source', 'changed_at']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ClaimDocument)
+class ClaimDocumentAdmin(admin.ModelAdmin):
+    list_display = ['claim', 'kind', 'original_name', 'size', 'uploaded_by', 'uploaded_at']
+    list_filter = ['kind']
+    search_fields = ['=claim__id', 'claim__claim_id', 'original_name', '=sha256']
+    readonly_fields = ['claim', 'kind', 'original_name', 'content_type', 'size', 'sha256', 'uploaded_by', 'uploaded_at']
+
+
+@admin.register(DocumentUpload)
+class DocumentUploadAdmin(admin.ModelAdmin):
+    list_display = ['original_name', 'claim', 'kind', 'offset', 'size', 'created_by', 'updated_at']
+    readonly_fields = [
+        'claim', 'kind', 'original_name', 'content_type', 'size', 'offset', 'sha256', 'created_by',
+        'created_at', 'updated_at'
+    ]
+
+
+@admin.register(DocumentPreview)
+class DocumentPreviewAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'status', 'source_type', 'wait_ms', 'render_ms', 'queued_at', 'finished_at']
+    list_filter = ['status', 'source_type']
+    search_fields = ['=sha256']
+    readonly_fields = [
+        'sha256', 'status', 'source_type', 'width', 'height', 'queued_at', 'started_at', 'finished_at',
+        'wait_ms', 'render_ms', 'error'
+    ]
+
+
+@admin.register(MonthSnapshot)
+class MonthSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['month', 'claim_count', 'stale', 'generations', 'generation_ms', 'closed_by', 'generated_at']
+    list_filter = ['stale']
+    readonly_fields = [
+        'month', 'content_hash', 'claim_count', 'summary', 'tpa_breakdown', 'csv_size', 'xlsx_size', 'stale',
+        'closed_by', 'closed_at', 'generated_at', 'generation_ms', 'generations'
+    ]
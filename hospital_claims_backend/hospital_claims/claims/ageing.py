@@ -0,0 +1,141 @@
+"""
+Receivables ageing for unsettled claims.
+
+Unsettled claims (``settlement_date IS NULL``) are bucketed by days since
+``date_of_discharge`` with a SQL ``CASE`` over discharge-date thresholds, so
+the work is a range read of the ``claim_unsettled_discharge_idx`` partial
+index and scales with the number of pending claims, not the whole history.
+Claims discharged after the as-of date (typing errors, or an as-of date in
+the past) belong to no bucket; they are counted apart like undated ones.
+"""
+from datetime import timedelta
+
+from django.db.models import Case, CharField, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Claim, Insurer, Tpa
+
+# (label, maximum age in days); the last bucket is open-ended
+AGEING_BUCKETS = (
+    ('0-30', 30),
+    ('31-60', 60),
+    ('61-90', 90),
+    ('90+', None),
+)
+AGEING_BUCKET_LABELS = tuple(label for label, _ in AGEING_BUCKETS)
+
+
+def unsettled_claims(queryset=None):
+    queryset = Claim.objects.all() if queryset is None else queryset
+    return queryset.filter(settlement_date__isnull=True)
+
+
+def bucket_bounds(label, as_of):
+    """Inclusive discharge-date range (oldest, newest) covered by a bucket"""
+    newest = as_of
+    for bucket_label, max_days in AGEING_BUCKETS:
+        oldest = as_of - timedelta(days=max_days) if max_days is not None else None
+        if bucket_label == label:
+            return oldest, newest
+        newest = oldest - timedelta(days=1)
+    raise ValueError(f'Unknown ageing bucket: {label}')
+
+
+def ageing_bucket(as_of):
+    """CASE expression labelling a claim with its ageing bucket"""
+    whens = [
+        When(date_of_discharge__gte=as_of - timedelta(days=max_days), then=Value(label))
+        for label, max_days in AGEING_BUCKETS if max_days is not None
+    ]
+    return Case(*whens, default=Value(AGEING_BUCKETS[-1][0]), output_field=CharField())
+
+
+def _empty_row(name):
+    return {
+        'name': name,
+        'claim_count': 0,
+        'outstanding_amount': 0.0,
+        'buckets': {label: 0.0 for label in AGEING_BUCKET_LABELS},
+    }
+
+
+def _rounded(row):
+    row['outstanding_amount'] = round(row['outstanding_amount'], 2)
+    if 'buckets' in row:
+        row['buckets'] = {label: round(amount, 2) for label, amount in row['buckets'].items()}
+    return row
+
+
+def _sorted_rows(rows):
+    return sorted(
+        (_rounded(row) for row in rows.values()),
+        key=lambda row: row['outstanding_amount'], reverse=True,
+    )
+
+
+def ageing_report(queryset, as_of, oldest=10):
+    """
+    Outstanding approved amounts per ageing bucket, per TPA and per insurer,
+    plus the ``oldest`` longest-pending claims in each bucket.
+    """
+    pending = unsettled_claims(queryset)
+
+    # One grouped read; TPA and insurer breakdowns are rolled up from it
+    rows = (
+        pending
+        .filter(date_of_discharge__lte=as_of)
+        .annotate(bucket=ageing_bucket(as_of))
+        .values('bucket', 'tpa', 'insurer')
+        .annotate(claim_count=Count('id'), outstanding=Sum('approved_amount'))
+        .order_by()
+    )
+
+    totals = {label: {'bucket': label, 'claim_count': 0, 'outstanding_amount': 0.0}
+              for label in AGEING_BUCKET_LABELS}
+    by_tpa = {}
+    by_insurer = {}
+    tpa_names = Tpa.objects.names()
+    insurer_names = Insurer.objects.names()
+    for row in rows:
+        amount = float(row['outstanding'] or 0)
+        totals[row['bucket']]['claim_count'] += row['claim_count']
+        totals[row['bucket']]['outstanding_amount'] += amount
+        for breakdown, name in ((by_tpa, tpa_names.get(row['tpa'])), (by_insurer, insurer_names.get(row['insurer']))):
+            entry = breakdown.setdefault(name or '', _empty_row(name or ''))
+            entry['claim_count'] += row['claim_count']
+            entry['outstanding_amount'] += amount
+            entry['buckets'][row['bucket']] += amount
+
+    oldest_claims = {}
+    if oldest:
+        for label in AGEING_BUCKET_LABELS:
+            start, end = bucket_bounds(label, as_of)
+            bucket_filter = Q(date_of_discharge__lte=end)
+            if start is not None:
+                bucket_filter &= Q(date_of_discharge__gte=start)
+            claims = (
+                pending.filter(bucket_filter)
+                .order_by('date_of_discharge', 'id')
+                .values('id', 'claim_id', 'patient_name', 'date_of_discharge', 'approved_amount',
+                        tpa_name=Coalesce(F('tpa__name'), Value('')),
+                        parent_insurance=Coalesce(F('insurer__name'), Value('')))[:oldest]
+            )
+            oldest_claims[label] = [
+                {
+                    **claim,
+                    'approved_amount': float(claim['approved_amount'] or 0),
+                    'age_days': (as_of - claim['date_of_discharge']).days,
+                }
+                for claim in claims
+            ]
+
+    return {
+        'as_of': as_of.isoformat(),
+        'buckets': list(AGEING_BUCKET_LABELS),
+        'totals': [_rounded(row) for row in totals.values()],
+        'undated_claims': pending.filter(date_of_discharge__isnull=True).count(),
+        'future_dated_claims': pending.filter(date_of_discharge__gt=as_of).count(),
+        'by_tpa': _sorted_rows(by_tpa),
+        'by_insurer': _sorted_rows(by_insurer),
+        'oldest': oldest_claims,
+    }
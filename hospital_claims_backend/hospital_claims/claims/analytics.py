@@ -0,0 +1,292 @@
+"""
+In-memory columnar analytics snapshot of the claims table.
+
+The numeric ``Claim`` columns are held in NumPy arrays: amounts as integer
+paise, discharge dates as day offsets, and TPA/insurer as integer codes. Two
+grids (TPA x day x measure and insurer x day x measure) keep per-day totals,
+and their prefix sums along the day axis answer any date range in O(1) per
+TPA or insurer, without a database query.
+
+``refresh()`` applies changes incrementally. Rows whose ``updated_at`` is
+past the watermark replace their old contribution, and deleted rows are
+dropped when the row count no longer matches. The snapshot is optional:
+it needs NumPy and is enabled with the ``ANALYTICS_SNAPSHOT`` setting.
+"""
+import threading
+import time
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from django.conf import settings
+
+from .models import WATERMARK_OVERLAP, Claim
+
+MEASURES = (
+    'bill_amount', 'approved_amount', 'total_settled_amount',
+    'tds', 'consumable_deduction', 'paid_by_patient',
+)
+# Column 0 of every grid is the claim count; the rest follow MEASURES
+VALUE_COLUMNS = ('claim_count',) + MEASURES
+NO_DAY = -1
+# Days of headroom past the latest discharge date before a full rebuild
+FUTURE_DAYS = 400
+LOAD_FIELDS = ('id', 'date_of_discharge', 'tpa__name', 'insurer__name') + MEASURES + ('updated_at',)
+
+
+def numpy_available():
+    return np is not None
+
+
+class Codes:
+    """Dictionary encoding of a string column"""
+
+    def __init__(self):
+        self.names = []
+        self.index = {}
+
+    def code(self, name):
+        name = name or ''
+        code = self.index.get(name)
+        if code is None:
+            code = self.index[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def lookup(self, name):
+        return self.index.get(name or '')
+
+
+class ClaimsSnapshot:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.loaded_at = 0.0
+        self.watermark = None
+        self.last_refresh_seconds = 0.0
+        self.tpa_codes = Codes()
+        self.insurer_codes = Codes()
+
+    # -- building ---------------------------------------------------------
+
+    def _encode(self, rows):
+        """Turn LOAD_FIELDS tuples into column arrays"""
+        ids, days, tpas, insurers, values = [], [], [], [], []
+        watermark = self.watermark
+        for row in rows:
+            claim_id, discharged, tpa_name, insurer = row[:4]
+            ids.append(claim_id)
+            days.append(discharged.toordinal() if discharged else NO_DAY)
+            tpas.append(self.tpa_codes.code(tpa_name))
+            insurers.append(self.insurer_codes.code(insurer))
+            values.append([1] + [int(round((amount or 0) * 100)) for amount in row[4:-1]])
+            if watermark is None or row[-1] > watermark:
+                watermark = row[-1]
+        self.watermark = watermark
+        return (
+            np.array(ids, dtype=np.int64),
+            np.array(days, dtype=np.int64),
+            np.array(tpas, dtype=np.int32),
+            np.array(insurers, dtype=np.int32),
+            np.array(values, dtype=np.int64).reshape(-1, len(VALUE_COLUMNS)),
+        )
+
+    def from_arrays(self, ids, day_ordinals, tpas, insurers, values, tpa_names, insurer_names):
+        """Build from pre-encoded columns (used by benchmarks and bulk loads)"""
+        for name in tpa_names:
+            self.tpa_codes.code(name)
+        for name in insurer_names:
+            self.insurer_codes.code(name)
+        self._build(ids, day_ordinals, tpas, insurers, values)
+        return self
+
+    def _build(self, ids, day_ordinals, tpas, insurers, values):
+        self.ids = ids
+        self.tpas = tpas
+        self.insurers = insurers
+        self.values = values
+        dated = day_ordinals[day_ordinals != NO_DAY]
+        self.base_day = int(dated.min()) if len(dated) else date.today().toordinal()
+        last_day = int(dated.max()) if len(dated) else self.base_day
+        self.n_days = last_day - self.base_day + 1 + FUTURE_DAYS
+        self.days = np.where(day_ordinals == NO_DAY, NO_DAY, day_ordinals - self.base_day)
+        self.grids = {
+            'tpa': np.zeros((len(self.tpa_codes.names), self.n_days, len(VALUE_COLUMNS)), dtype=np.int64),
+            'insurer': np.zeros((len(self.insurer_codes.names), self.n_days, len(VALUE_COLUMNS)), dtype=np.int64),
+        }
+        self._accumulate(self.days, self.tpas, self.insurers, self.values, 1)
+        self._rebuild_prefix()
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+
+    def _accumulate(self, days, tpas, insurers, values, sign):
+        mask = days != NO_DAY
+        for dimension, codes in (('tpa', tpas), ('insurer', insurers)):
+            np.add.at(self.grids[dimension], (codes[mask], days[mask]), sign * values[mask])
+
+    def _rebuild_prefix(self):
+        self.prefix = {
+            dimension: np.concatenate(
+                [np.zeros((grid.shape[0], 1, grid.shape[2]), dtype=np.int64), np.cumsum(grid, axis=1)],
+                axis=1,
+            )
+            for dimension, grid in self.grids.items()
+        }
+
+    def _grow_codes(self):
+        for dimension, codes in (('tpa', self.tpa_codes), ('insurer', self.insurer_codes)):
+            grid = self.grids[dimension]
+            missing = len(codes.names) - grid.shape[0]
+            if missing > 0:
+                self.grids[dimension] = np.concatenate(
+                    [grid, np.zeros((missing,) + grid.shape[1:], dtype=np.int64)]
+                )
+
+    def load(self):
+        """Full load of the claims table"""
+        started = time.perf_counter()
+        self.tpa_codes = Codes()
+        self.insurer_codes = Codes()
+        self.watermark = None
+        rows = Claim.objects.order_by('id').values_list(*LOAD_FIELDS).iterator(chunk_size=5000)
+        ids, day_ordinals, tpas, insurers, values = self._encode(rows)
+        self._build(ids, day_ordinals, tpas, insurers, values)
+        self.last_refresh_seconds = time.perf_counter() - started
+
+    def refresh(self):
+        """Apply rows changed since the watermark, and drop deleted rows"""
+        if not self.loaded or not len(self.ids):
+            self.load()
+            return
+        started = time.perf_counter()
+        changed = Claim.objects.order_by('id').values_list(*LOAD_FIELDS)
+        if self.watermark is not None:
+            # Re-applying a row replaces its contribution, so the overlap is harmless
+            changed = changed.filter(updated_at__gte=self.watermark - WATERMARK_OVERLAP)
+        ids, day_ordinals, tpas, insurers, values = self._encode(changed.iterator(chunk_size=5000))
+        self._grow_codes()
+
+        days = np.where(day_ordinals == NO_DAY, NO_DAY, day_ordinals - self.base_day)
+        if ((days != NO_DAY) & ((days < 0) | (days >= self.n_days))).any():
+            # A discharge date outside the grid: rebuild rather than reshape
+            self.load()
+            return
+
+        positions = np.searchsorted(self.ids, ids)
+        exists = (positions < len(self.ids)) & (self.ids[np.minimum(positions, len(self.ids) - 1)] == ids)
+        appended = ~exists
+        if appended.any() and len(self.ids) and ids[appended].min() <= self.ids[-1]:
+            # New rows must sort after existing ids to keep the id column ordered
+            self.load()
+            return
+
+        old = positions[exists]
+        self._accumulate(self.days[old], self.tpas[old], self.insurers[old], self.values[old], -1)
+        self.days[old] = days[exists]
+        self.tpas[old] = tpas[exists]
+        self.insurers[old] = insurers[exists]
+        self.values[old] = values[exists]
+        self._accumulate(days, tpas, insurers, values, 1)
+        if appended.any():
+            self.ids = np.concatenate([self.ids, ids[appended]])
+            self.days = np.concatenate([self.days, days[appended]])
+            self.tpas = np.concatenate([self.tpas, tpas[appended]])
+            self.insurers = np.concatenate([self.insurers, insurers[appended]])
+            self.values = np.concatenate([self.values, values[appended]])
+
+        if Claim.objects.count() != len(self.ids):
+            live_ids = np.fromiter(Claim.objects.values_list('id', flat=True).order_by(), dtype=np.int64)
+            removed = ~np.isin(self.ids, live_ids)
+            self._accumulate(self.days[removed], self.tpas[removed], self.insurers[removed],
+                             self.values[removed], -1)
+            keep = ~removed
+            self.ids, self.days, self.tpas = self.ids[keep], self.days[keep], self.tpas[keep]
+            self.insurers, self.values = self.insurers[keep], self.values[keep]
+
+        self._rebuild_prefix()
+        self.loaded_at = time.monotonic()
+        self.last_refresh_seconds = time.perf_counter() - started
+
+    def ensure_fresh(self, max_age):
+        with self.lock:
+            if not self.loaded:
+                self.load()
+            elif time.monotonic() - self.loaded_at > max_age:
+                self.refresh()
+
+    # -- queries ----------------------------------------------------------
+
+    def _day_index(self, day, default):
+        if day is None:
+            return default
+        return min(max(day.toordinal() - self.base_day, 0), self.n_days)
+
+    def _range_totals(self, dimension, start, end):
+        """Per-code totals for discharge dates in [start, end], shape (codes, values)"""
+        prefix = self.prefix[dimension]
+        first = self._day_index(start, 0)
+        last = self._day_index(end + timedelta(days=1) if end else None, self.n_days)
+        if last <= first:
+            return np.zeros((prefix.shape[0], len(VALUE_COLUMNS)), dtype=np.int64)
+        return prefix[:, last] - prefix[:, first]
+
+    @staticmethod
+    def _format(row):
+        return {
+            name: int(value) if name == 'claim_count' else round(int(value) / 100, 2)
+            for name, value in zip(VALUE_COLUMNS, row)
+        }
+
+    def range_summary(self, start=None, end=None, by='tpa', name=None):
+        """Totals for a discharge-date range, optionally for one TPA/insurer, plus a breakdown"""
+        codes = self.tpa_codes if by == 'tpa' else self.insurer_codes
+        totals = self._range_totals(by, start, end)
+        if name is not None:
+            code = codes.lookup(name)
+            selected = totals[code] if code is not None else np.zeros(len(VALUE_COLUMNS), dtype=np.int64)
+        else:
+            selected = totals.sum(axis=0)
+        breakdown = [
+            {'name': codes.names[code], **self._format(totals[code])}
+            for code in np.argsort(-totals[:, VALUE_COLUMNS.index('approved_amount')])
+            if totals[code, 0]
+        ]
+        return {
+            'start': start.isoformat() if start else None,
+            'end': end.isoformat() if end else None,
+            'by': by,
+            'name': name,
+            'totals': self._format(selected),
+            'breakdown': breakdown,
+            'snapshot': self.stats(),
+        }
+
+    def memory_bytes(self):
+        arrays = [self.ids, self.days, self.tpas, self.insurers, self.values]
+        arrays += list(self.grids.values()) + list(self.prefix.values())
+        return int(sum(array.nbytes for array in arrays))
+
+    def stats(self):
+        return {
+            'rows': int(len(self.ids)),
+            'memory_bytes': self.memory_bytes(),
+            'last_refresh_seconds': round(self.last_refresh_seconds, 4),
+            'watermark': self.watermark.isoformat() if self.watermark else None,
+        }
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """The per-process snapshot, refreshed if older than ANALYTICS_SNAPSHOT_MAX_AGE"""
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None:
+            _snapshot = ClaimsSnapshot()
+    _snapshot.ensure_fresh(settings.ANALYTICS_SNAPSHOT_MAX_AGE)
+    return _snapshot
@@ -0,0 +1,147 @@
+"""
+Settlement anomaly scanner.
+
+Each run re-evaluates only claims whose ``updated_at`` is at or past the
+watermark of the last completed scan, less ``WATERMARK_OVERLAP`` for saves
+that committed late. Claims are processed in chunks. For each
+chunk, findings are upserted into ``ClaimAnomaly`` with one bulk statement,
+and findings that no longer apply are resolved with one UPDATE, so the cost
+scales with the number of changed claims, not the table size.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import WATERMARK_OVERLAP, AnomalyScan, Claim, ClaimAnomaly
+from .trends import DEDUCTION_FIELDS
+
+SCAN_FIELDS = (
+    'id', 'settlement_date', 'bill_amount', 'approved_amount', 'tds', 'difference_amount',
+) + DEDUCTION_FIELDS
+CHUNK_SIZE = 2000
+# Differences below this many rupees are rounding, not short/over settlement
+SETTLEMENT_TOLERANCE = Decimal('1.00')
+
+
+def tds_band(tpa_name):
+    """Expected TDS as a (min, max) percentage of the approved amount"""
+    bands = getattr(settings, 'ANOMALY_TDS_BANDS', {})
+    return bands.get(tpa_name, settings.ANOMALY_TDS_BAND)
+
+
+def _severity_for_ratio(ratio):
+    if ratio >= Decimal('0.10'):
+        return ClaimAnomaly.SEVERITY_HIGH
+    if ratio >= Decimal('0.02'):
+        return ClaimAnomaly.SEVERITY_MEDIUM
+    return ClaimAnomaly.SEVERITY_LOW
+
+
+def evaluate_claim(claim):
+    """Findings for one claim row (a dict of SCAN_FIELDS) as (kind, severity, expected, actual, message)"""
+    findings = []
+    approved = claim['approved_amount'] or Decimal('0')
+    bill = claim['bill_amount'] or Decimal('0')
+
+    if claim['settlement_date'] is not None:
+        difference = claim['difference_amount'] or Decimal('0')
+        if abs(difference) >= SETTLEMENT_TOLERANCE:
+            kind = 'short_settlement' if difference > 0 else 'over_settlement'
+            ratio = abs(difference) / bill if bill else Decimal('1')
+            findings.append((
+                kind, _severity_for_ratio(ratio), Decimal('0'), difference,
+                f'Settled {"short" if difference > 0 else "over"} by {abs(difference):.2f}',
+            ))
+
+        if approved > 0:
+            low, high = tds_band(claim['tpa_name'])
+            tds = claim['tds'] or Decimal('0')
+            tds_pct = tds / approved * 100
+            if not Decimal(str(low)) <= tds_pct <= Decimal(str(high)):
+                expected = approved * Decimal(str(low if tds_pct < low else high)) / 100
+                findings.append((
+                    'tds_out_of_band', ClaimAnomaly.SEVERITY_MEDIUM, expected.quantize(Decimal('0.01')), tds,
+                    f'TDS is {tds_pct:.2f}% of approved, expected {low}-{high}%',
+                ))
+
+    deductions = sum((claim[field] or Decimal('0') for field in DEDUCTION_FIELDS), Decimal('0'))
+    if deductions > approved and (approved > 0 or claim['settlement_date'] is not None):
+        findings.append((
+            'deductions_exceed_approved', ClaimAnomaly.SEVERITY_HIGH, approved, deductions,
+            f'Deductions {deductions:.2f} exceed approved amount {approved:.2f}',
+        ))
+    return findings
+
+
+def _process_chunk(rows, now):
+    claim_ids = [row['id'] for row in rows]
+    anomalies = []
+    for row in rows:
+        for kind, severity, expected, actual, message in evaluate_claim(row):
+            anomalies.append(ClaimAnomaly(
+                claim_id=row['id'], kind=kind, severity=severity, status='open',
+                expected_amount=expected, actual_amount=actual, message=message[:255],
+                detected_at=now, resolved_at=None,
+            ))
+
+    with transaction.atomic():
+        current = {(anomaly.claim_id, anomaly.kind) for anomaly in anomalies}
+        resolved_before = ClaimAnomaly.objects.filter(claim_id__in=claim_ids, status='resolved').values_list(
+            'pk', 'claim_id', 'kind'
+        )
+        reopened = [pk for pk, claim_id, kind in resolved_before if (claim_id, kind) in current]
+        # Findings that still hold keep their original detected_at
+        ClaimAnomaly.objects.bulk_create(
+            anomalies,
+            update_conflicts=True,
+            unique_fields=['claim', 'kind'],
+            update_fields=['severity', 'status', 'expected_amount', 'actual_amount', 'message', 'resolved_at'],
+        )
+        # ...while one found again after it was resolved is a new occurrence
+        if reopened:
+            ClaimAnomaly.objects.filter(pk__in=reopened).update(detected_at=now)
+        stale = [
+            pk for pk, claim_id, kind in ClaimAnomaly.objects.filter(
+                claim_id__in=claim_ids, status='open'
+            ).values_list('pk', 'claim_id', 'kind')
+            if (claim_id, kind) not in current
+        ]
+        resolved = ClaimAnomaly.objects.filter(pk__in=stale).update(status='resolved', resolved_at=now)
+    return len(anomalies), resolved
+
+
+def run_scan(full=False, stdout=None):
+    """Re-evaluate claims changed since the last scan (or all claims if full)"""
+    started_at = timezone.now()
+    last_scan = AnomalyScan.objects.filter(finished_at__isnull=False).first()
+    scan = AnomalyScan.objects.create(
+        started_at=started_at, watermark=started_at, full_scan=full or last_scan is None,
+    )
+
+    claims = Claim.objects.order_by('id').values(*SCAN_FIELDS, tpa_name=F('tpa__name'))
+    if not scan.full_scan:
+        claims = claims.filter(updated_at__gte=last_scan.watermark - WATERMARK_OVERLAP)
+
+    chunk = []
+    for row in claims.iterator(chunk_size=CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            opened, resolved = _process_chunk(chunk, started_at)
+            scan.claims_scanned += len(chunk)
+            scan.anomalies_open += opened
+            scan.anomalies_resolved += resolved
+            chunk = []
+            if stdout:
+                stdout.write(f'Scanned {scan.claims_scanned} claims...')
+    if chunk:
+        opened, resolved = _process_chunk(chunk, started_at)
+        scan.claims_scanned += len(chunk)
+        scan.anomalies_open += opened
+        scan.anomalies_resolved += resolved
+
+    scan.finished_at = timezone.now()
+    scan.save()
+    return scan
@@ -0,0 +1,271 @@
+"""
+Cold archive of old, bank-verified claims in Parquet files.
+
+``archive_claims`` moves claims that were verified against the bank and
+settled before a cutoff out of the claims table, one discharge month at a
+time. Each month is written to a zstd-compressed Parquet file under
+``CLAIMS_ARCHIVE_DIR`` (``month=YYYY-MM/claims-<timestamp>.parquet``), and the
+claims are deleted in the same transaction that records the file in the
+``ClaimArchive`` manifest.
+
+Alongside the file, ``ClaimArchiveTotal`` keeps its totals per insurer. The
+dashboards add those rows when asked to include the archive, so they never
+open the files. ``read_archive`` reads the files back for history lookups,
+``read_archive_page`` one page of a month for the archived claims list, and
+``archive_batches`` streams them into exports a row group at a time. Writing
+and reading files needs pyarrow, which is optional.
+"""
+import hashlib
+import os
+from collections import defaultdict
+from decimal import Decimal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pq = None
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .audit import paused
+from .models import Claim, ClaimArchive, ClaimArchiveTotal
+from .trends import DEDUCTION_FIELDS
+
+# Claims are locked, read and deleted in chunks of ids (below SQLite's variable limit)
+CHUNK_SIZE = 900
+TOTAL_FIELDS = (
+    'bill_amount', 'approved_amount', 'total_settled_amount', 'tds',
+    'consumable_deduction', 'paid_by_patient',
+)
+# Columns the archived claims list searches
+SEARCH_FIELDS = ('claim_id', 'patient_name', 'uhid_ip_no')
+
+
+class ArchiveError(RuntimeError):
+    pass
+
+
+def pyarrow_available():
+    return pa is not None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ArchiveError('The claims archive needs pyarrow (pip install pyarrow)')
+
+
+def _arrow_type(field):
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.IntegerField):
+        return pa.int64()
+    return pa.string()
+
+
+def archive_columns():
+    """(column name, values() argument) of each archived column; TPA and insurer are kept by name"""
+    columns = [(field.attname, field.attname) for field in Claim._meta.concrete_fields if not field.is_relation]
+    return columns + [('tpa_name', F('tpa__name')), ('parent_insurance', F('insurer__name'))]
+
+
+def archive_schema():
+    _require_pyarrow()
+    fields = [
+        pa.field(field.attname, _arrow_type(field))
+        for field in Claim._meta.concrete_fields if not field.is_relation
+    ]
+    return pa.schema(fields + [pa.field('tpa_name', pa.string()), pa.field('parent_insurance', pa.string())])
+
+
+def archive_path(archive):
+    return os.path.join(settings.CLAIMS_ARCHIVE_DIR, archive.path)
+
+
+def archivable_claims(before):
+    """Claims settled and verified against the bank before the cutoff date"""
+    return Claim.objects.filter(
+        receipt_verified_bank=True,
+        settlement_date__lt=before,
+        date_of_discharge__lt=before,
+        month__isnull=False,
+    )
+
+
+def archivable_months(before):
+    """[(month, claim count)] that archive_claims would move"""
+    return list(
+        archivable_claims(before).values_list('month').annotate(count=models.Count('id')).order_by('month')
+    )
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _archive_month(month, before):
+    """Write one month's archivable claims to a new file and delete them; returns the manifest row"""
+    relative = os.path.join(f'month={month}', f'claims-{timezone.now():%Y%m%dT%H%M%S%f}.parquet')
+    path = os.path.join(settings.CLAIMS_ARCHIVE_DIR, relative)
+    temporary = f'{path}.tmp'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    columns = archive_columns()
+    schema = archive_schema()
+    plain = [value for name, value in columns if isinstance(value, str)]
+    named = {name: value for name, value in columns if not isinstance(value, str)}
+
+    try:
+        with transaction.atomic():
+            # Lock the month's claims so nothing edits them between the copy and the delete
+            ids = list(
+                archivable_claims(before).filter(month=month)
+                .select_for_update().order_by('id').values_list('id', flat=True)
+            )
+            if not ids:
+                return None
+
+            totals = defaultdict(lambda: defaultdict(Decimal))
+            with pq.ParquetWriter(temporary, schema, compression='zstd') as writer:
+                for i in range(0, len(ids), CHUNK_SIZE):
+                    rows = list(
+                        Claim.objects.filter(id__in=ids[i:i + CHUNK_SIZE]).order_by('id')
+                        .values('insurer_id', *plain, **named)
+                    )
+                    for row in rows:
+                        insurer_totals = totals[row.pop('insurer_id')]
+                        insurer_totals['claim_count'] += 1
+                        for field in TOTAL_FIELDS:
+                            insurer_totals[field] += row[field] or 0
+                        insurer_totals['deductions'] += sum(row[field] or 0 for field in DEDUCTION_FIELDS)
+                    writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            with open(temporary, 'rb+') as f:
+                os.fsync(f.fileno())
+            os.replace(temporary, path)
+
+            archive = ClaimArchive.objects.create(
+                month=month,
+                path=relative,
+                row_count=len(ids),
+                size_bytes=os.path.getsize(path),
+                sha256=_sha256(path),
+                archived_before=before,
+                first_claim_id=ids[0],
+                last_claim_id=ids[-1],
+            )
+            ClaimArchiveTotal.objects.bulk_create([
+                ClaimArchiveTotal(archive=archive, insurer_id=insurer_id, **values)
+                for insurer_id, values in totals.items()
+            ])
+            # A move, not an edit: the claims stay readable from the file, so no delete history
+            with paused():
+                for i in range(0, len(ids), CHUNK_SIZE):
+                    Claim.objects.filter(id__in=ids[i:i + CHUNK_SIZE]).delete()
+        return archive
+    except BaseException:
+        # The transaction rolled back, so the file must not outlive it
+        for leftover in (temporary, path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+
+
+def archive_claims(before, dry_run=False, stdout=None):
+    """Archive every month with claims settled and verified before the cutoff; returns manifest rows"""
+    _require_pyarrow()
+    archives = []
+    for month, count in archivable_months(before):
+        if dry_run:
+            if stdout:
+                stdout.write(f'{month}: {count} claims')
+            continue
+        archive = _archive_month(month, before)
+        if archive is None:
+            continue
+        archives.append(archive)
+        if stdout:
+            stdout.write(f'{month}: archived {archive.row_count} claims ({archive.size_bytes / 1024:.0f} KiB)')
+    return archives
+
+
+def read_archive(months=None, columns=None):
+    """Archived claims as one pyarrow Table, optionally only some months and columns"""
+    _require_pyarrow()
+    archives = ClaimArchive.objects.all()
+    if months:
+        archives = archives.filter(month__in=months)
+    tables = [pq.read_table(archive_path(archive), columns=columns) for archive in archives]
+    if not tables:
+        schema = archive_schema()
+        if columns:
+            schema = pa.schema([schema.field(name) for name in columns])
+        return schema.empty_table()
+    return pa.concat_tables(tables)
+
+
+def archive_batches(months=None, columns=None):
+    """Archived claims as pyarrow record batches, one row group at a time, optionally only some months"""
+    _require_pyarrow()
+    archives = ClaimArchive.objects.all()
+    if months:
+        archives = archives.filter(month__in=months)
+    for archive in archives:
+        parquet = pq.ParquetFile(archive_path(archive))
+        for group in range(parquet.num_row_groups):
+            yield from parquet.read_row_group(group, columns=columns).to_batches()
+
+
+def read_archive_page(month, offset, limit, search=''):
+    """
+    (matching claims, rows) for a page of one archived month, optionally only
+    claims whose id, patient name or UHID contains ``search``. Only the row
+    groups holding the page are read in full.
+    """
+    _require_pyarrow()
+    search = search.strip().lower()
+    count = 0
+    rows = []
+    for archive in ClaimArchive.objects.filter(month=month):
+        parquet = pq.ParquetFile(archive_path(archive))
+        for group in range(parquet.num_row_groups):
+            if search:
+                keys = parquet.read_row_group(group, columns=list(SEARCH_FIELDS)).to_pylist()
+                matches = [
+                    i for i, row in enumerate(keys)
+                    if any(search in (row[field] or '').lower() for field in SEARCH_FIELDS)
+                ]
+            else:
+                matches = range(parquet.metadata.row_group(group).num_rows)
+            wanted = list(matches[max(offset - count, 0):max(offset + limit - count, 0)])
+            if wanted:
+                rows.extend(parquet.read_row_group(group).take(wanted).to_pylist())
+            count += len(matches)
+    return count, rows
+
+
+def archived_totals(*group_fields):
+    """Archived totals named like the dashboard aggregates, grouped by e.g. 'insurer'"""
+    aggregates = {
+        'claim_count': Sum('claim_count'),
+        'total_bill_amount': Sum('bill_amount'),
+        'total_approved_amount': Sum('approved_amount'),
+        'total_tds': Sum('tds'),
+        'total_consumable_deduction': Sum('consumable_deduction'),
+        'total_paid_by_patient': Sum('paid_by_patient'),
+        'total_settled': Sum('total_settled_amount'),
+    }
+    if group_fields:
+        return list(ClaimArchiveTotal.objects.values(*group_fields).annotate(**aggregates).order_by())
+    return [ClaimArchiveTotal.objects.aggregate(**aggregates)]
@@ -0,0 +1,115 @@
+"""
+Native async versions of the dashboard endpoints.
+
+These are plain Django async views rather than DRF views (DRF does not
+support ``async def`` handlers), so JWT authentication and the manager
+permission are applied by ``async_manager_view``. They are wired in place of
+the sync dashboard views when ``ASYNC_DASHBOARD`` is enabled, which is the
+default when the app is served over ASGI (``SERVER_MODE=asgi``).
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Q
+from django.http import JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from authentication.permissions import IsManager
+from hospital_claims.db_routers import areplica_reads
+from .models import Claim
+from .views import (
+    build_dashboard,
+    company_queryset,
+    format_company_chart,
+    format_monthwise,
+    format_summary,
+    summary_aggregates,
+    wants_archive,
+)
+from .trends import monthwise_trends
+
+_jwt_authentication = JWTAuthentication()
+
+
+def async_manager_view(view_func):
+    """Authenticate the JWT, require a manager and read from the replica"""
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return JsonResponse(
+                {'detail': f'Method "{request.method}" not allowed.'}, status=405
+            )
+
+        try:
+            result = await sync_to_async(_jwt_authentication.authenticate)(request)
+        except (InvalidToken, AuthenticationFailed) as e:
+            # Match DRF's body: simplejwt errors already carry a detail dict
+            detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+            return JsonResponse(detail, status=401)
+        if result is None:
+            return JsonResponse(
+                {'detail': 'Authentication credentials were not provided.'}, status=401
+            )
+
+        request.user, request.auth = result
+        if not IsManager().has_permission(request, None):
+            return JsonResponse(
+                {'detail': 'You do not have permission to perform this action.'}, status=403
+            )
+
+        async with areplica_reads(request):
+            return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+@async_manager_view
+async def dashboard_summary(request):
+    """Dashboard summary with key metrics"""
+    try:
+        if wants_archive(request.GET):
+            data = await sync_to_async(build_dashboard)(['summary'], include_archive=True)
+            return JsonResponse(data['summary'])
+
+        # One query: the async ORM runs queries one at a time in a single thread anyway
+        totals = await Claim.objects.aaggregate(
+            pending_claims=Count('id', filter=Q(settlement_date__isnull=True)),
+            **summary_aggregates(),
+        )
+
+        return JsonResponse(format_summary(totals, totals['pending_claims']))
+
+    except Exception as e:
+        return JsonResponse({'error': f'Error generating summary: {str(e)}'}, status=500)
+
+
+@async_manager_view
+async def dashboard_monthwise(request):
+    """Monthly statistics for charts"""
+    try:
+        # The windowed trends query is raw SQL, so it runs through sync_to_async
+        monthly_data = await sync_to_async(monthwise_trends)(include_archive=wants_archive(request.GET))
+
+        return JsonResponse(format_monthwise(monthly_data), safe=False)
+
+    except Exception as e:
+        return JsonResponse({'error': f'Error generating monthly data: {str(e)}'}, status=500)
+
+
+@async_manager_view
+async def dashboard_companywise(request):
+    """Company/TPA wise statistics for pie charts"""
+    try:
+        if wants_archive(request.GET):
+            data = await sync_to_async(build_dashboard)(['companywise'], include_archive=True)
+            return JsonResponse(data['companywise'], safe=False)
+
+        # Only the insurance breakdown is returned to the frontend
+        insurance_data = [item async for item in company_queryset('insurer')]
+
+        insurance_chart = format_company_chart(insurance_data, 'insurer__name', 'Unknown Insurance')
+        return JsonResponse(insurance_chart, safe=False)
+
+    except Exception as e:
+        return JsonResponse({'error': f'Error generating company data: {str(e)}'}, status=500)
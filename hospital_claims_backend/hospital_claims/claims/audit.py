@@ -0,0 +1,193 @@
+"""
+Field-level change history of claims.
+
+Every claim save, queryset update and delete becomes a ``ClaimChange`` row
+holding ``{field: [old, new]}`` for the fields that changed. For saves the
+old values come from the snapshot ``Claim.from_db`` takes when the row is
+loaded, so recording costs no extra query. Queryset updates (``bulk_update``
+included) read the affected rows before and after instead.
+
+Changes are buffered in a context variable and written with one
+``bulk_create`` when the buffer is flushed. Views that write claims are
+wrapped in ``audited_writes`` (function views) or ``AuditedWritesMixin``
+(class-based views): a write request runs in a transaction that flushes at
+the end, so it adds a single INSERT, its history commits or rolls back
+together with the change, and a 4xx/5xx response rolls back whatever the
+view wrote. Other requests (logins, document uploads) hold no transaction.
+Management commands open their own buffer with ``capture()``. Without a
+buffer each change is written straight away.
+"""
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from .models import CLAIM_AUDIT_FIELDS, Claim, ClaimChange
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# A long-running capture() writes out its buffer once it holds this many changes
+FLUSH_SIZE = 5000
+# Rows read per query around a queryset update (below SQLite's variable limit)
+CHUNK_SIZE = 900
+
+_buffer = ContextVar('claim_audit_buffer', default=None)
+_paused = ContextVar('claim_audit_paused', default=False)
+
+
+class _Buffer:
+    def __init__(self, request=None, user=None, source=''):
+        self.request = request
+        self.user = user
+        self.source = source
+        self.changes = []
+
+    def flush(self):
+        if not self.changes:
+            return
+        # Read the user late: DRF authenticates inside the view, after the buffer opened
+        user = self.user or getattr(self.request, 'user', None)
+        user_id = user.pk if user is not None and user.is_authenticated else None
+        for change in self.changes:
+            change.user_id = user_id
+            change.source = self.source
+        ClaimChange.objects.bulk_create(self.changes)
+        self.changes = []
+
+
+@contextmanager
+def capture(request=None, user=None, source=''):
+    """Buffer claim changes made in this block and write them in one batch at the end"""
+    buffer = _Buffer(request=request, user=user, source=source[:200])
+    token = _buffer.set(buffer)
+    try:
+        yield buffer
+        buffer.flush()
+    finally:
+        _buffer.reset(token)
+
+
+@contextmanager
+def paused():
+    """Record nothing in this block (for moves such as archiving, not edits)"""
+    token = _paused.set(True)
+    try:
+        yield
+    finally:
+        _paused.reset(token)
+
+
+def _same(old, new):
+    if old in (None, '') and new in (None, ''):
+        return True
+    return old == new
+
+
+def diff(old, new):
+    """{field: [old, new]} for the fields that differ between two value dicts"""
+    return {
+        name: [old.get(name), new.get(name)]
+        for name in new
+        if not _same(old.get(name), new.get(name))
+    }
+
+
+def _write(changes):
+    buffer = _buffer.get()
+    if buffer is None:
+        ClaimChange.objects.bulk_create(changes)
+        return
+    buffer.changes.extend(changes)
+    if len(buffer.changes) >= FLUSH_SIZE:
+        buffer.flush()
+
+
+def record_changes(rows, action='update'):
+    """Record [(claim id, old values, new values)], skipping rows where nothing changed"""
+    if _paused.get():
+        return
+    now = timezone.now()
+    changes = [
+        ClaimChange(claim_id=claim_id, action=action, changes=changed, changed_at=now)
+        for claim_id, old, new in rows
+        for changed in [diff(old, new)]
+        if changed
+    ]
+    if changes:
+        _write(changes)
+
+
+def _current_values(instance):
+    return {name: instance.__dict__[name] for name in CLAIM_AUDIT_FIELDS if name in instance.__dict__}
+
+
+def record_save(instance, created):
+    current = _current_values(instance)
+    old = {} if created else getattr(instance, '_audit_snapshot', None)
+    if old is None:
+        # Built in memory rather than loaded, so the old values are unknown
+        old = {name: None for name in current}
+    # Normalise values assigned as strings so they compare equal to the loaded ones
+    for name, value in current.items():
+        if not _same(old.get(name), value) and type(old.get(name)) is not type(value):
+            current[name] = Claim._meta.get_field(name).to_python(value)
+    record_changes([(instance.pk, old, current)], action='create' if created else 'update')
+    instance._audit_snapshot = current
+
+
+def record_delete(instance):
+    old = getattr(instance, '_audit_snapshot', None) or _current_values(instance)
+    record_changes([(instance.pk, old, {name: None for name in old})], action='delete')
+
+
+def audited_update(queryset, values, update):
+    """Run a queryset update and record the fields it changed"""
+    fields = [queryset.model._meta.get_field(name).attname for name in values]
+    fields = [name for name in fields if name in CLAIM_AUDIT_FIELDS]
+    if not fields or _paused.get():
+        return update()
+
+    using = queryset._db or router.db_for_write(queryset.model)
+    with transaction.atomic(using=using):
+        before = {row.pop('pk'): row for row in queryset.using(using).values('pk', *fields)}
+        count = update()
+        ids = list(before)
+        rows = []
+        for start in range(0, len(ids), CHUNK_SIZE):
+            after = queryset.model.objects.using(using).filter(pk__in=ids[start:start + CHUNK_SIZE])
+            for row in after.values('pk', *fields):
+                pk = row.pop('pk')
+                rows.append((pk, before[pk], row))
+        record_changes(rows)
+    return count
+
+
+def _run_audited(request, view):
+    with transaction.atomic(using=router.db_for_write(Claim)):
+        with capture(request=request, source=f'{request.method} {request.path}') as buffer:
+            response = view()
+            if response.status_code >= 400:
+                # Views that catch their own errors return them; keep nothing they wrote
+                buffer.changes = []
+                transaction.set_rollback(True)
+    return response
+
+
+def audited_writes(view_func):
+    """Run a claim-writing view's write requests in a transaction with buffered history (place it under @api_view)"""
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return view_func(request, *args, **kwargs)
+        return _run_audited(request, lambda: view_func(request, *args, **kwargs))
+    return wrapper
+
+
+class AuditedWritesMixin:
+    """audited_writes for class-based views"""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        return _run_audited(request, lambda: super(AuditedWritesMixin, self).dispatch(request, *args, **kwargs))
@@ -0,0 +1,279 @@
+"""
+Bank statement reconciliation against claim UTR numbers.
+
+The statement (CSV of UTR, amount, date) is streamed once into hash maps
+(the build side). Unverified or unsettled claims are then streamed from the database in
+chunks and probed against those maps (the probe side). Matching falls back
+through three levels:
+
+1. exact UTR, after normalising case, spaces and punctuation
+2. fuzzy UTR, where the last ``UTR_SUFFIX_LENGTH`` characters are unique on
+   both sides (banks often truncate or prefix references)
+3. amount only, for claims with no UTR recorded, when exactly one statement
+   line and one claim agree within the tolerance
+
+A match marks the receipt verified and records the amount and UTR. The
+statement date only fills an empty settlement date; a different date
+already on the claim is kept and listed under ``settlement_date_conflicts``.
+
+Matched claims are written as one ``UPDATE ... FROM (VALUES ...)`` join per
+batch on PostgreSQL (``bulk_update`` elsewhere), so a large statement costs a
+few set-based statements instead of one save() per claim.
+"""
+import csv
+import re
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .audit import paused, record_changes
+from .lag_stats import bump_month_version
+from .month_close import mark_stale
+from .models import Claim
+
+UTR_SUFFIX_LENGTH = 10
+UPDATE_BATCH_SIZE = 5000
+CLAIM_CHUNK_SIZE = 5000
+# Claim fields a match writes, in the order of the (verified, amount, date, utr) values
+MATCH_FIELDS = ('receipt_verified_bank', 'amount_settled_in_ac', 'settlement_date', 'utr_number')
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%d-%m-%y')
+HEADER_ALIASES = {
+    'utr': ('utr', 'utr_number', 'utr no', 'reference', 'ref no'),
+    'amount': ('amount', 'credit', 'credit amount', 'deposit'),
+    'date': ('date', 'value date', 'value_date', 'txn date', 'transaction date'),
+}
+
+
+class StatementError(ValueError):
+    """The statement file is missing a required column"""
+
+
+def normalise_utr(utr):
+    return re.sub(r'[^0-9A-Z]', '', (utr or '').upper())
+
+
+def _parse_amount(value):
+    try:
+        return Decimal((value or '').replace(',', '').strip())
+    except InvalidOperation:
+        return None
+
+
+def _parse_date(value):
+    value = (value or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _column_indexes(header):
+    normalised = [column.strip().lower() for column in header]
+    indexes = {}
+    for field, aliases in HEADER_ALIASES.items():
+        for alias in aliases:
+            if alias in normalised:
+                indexes[field] = normalised.index(alias)
+                break
+        else:
+            raise StatementError(f'Statement has no {field} column (expected one of: {", ".join(aliases)})')
+    return indexes
+
+
+def read_statement(lines):
+    """Stream statement rows as dicts of line number, UTR, amount and date"""
+    reader = csv.reader(lines)
+    indexes = _column_indexes(next(reader, []))
+    for line_no, row in enumerate(reader, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            utr = row[indexes['utr']].strip()
+            amount = _parse_amount(row[indexes['amount']])
+            value_date = _parse_date(row[indexes['date']])
+        except IndexError:
+            utr, amount, value_date = '', None, None
+        yield {'line': line_no, 'utr': utr, 'amount': amount, 'date': value_date}
+
+
+def _expected_amount(claim):
+    for field in ('amount_settled_in_ac', 'total_settled_amount', 'approved_amount'):
+        if claim[field]:
+            return claim[field]
+    return None
+
+
+def _within(claim, line, tolerance):
+    expected = _expected_amount(claim)
+    return expected is None or abs(expected - line['amount']) <= tolerance
+
+
+def _apply_matches(rows, now):
+    """Write (claim id, amount, date, utr) rows in batches of joined UPDATEs"""
+    connection = connections[router.db_for_write(Claim)]
+    if connection.vendor != 'postgresql':
+        updates = [
+            Claim(id=claim_id, receipt_verified_bank=True, amount_settled_in_ac=amount,
+                  settlement_date=settled_on, utr_number=utr, updated_at=now)
+            for claim_id, amount, settled_on, utr in rows
+        ]
+        Claim.objects.bulk_update(
+            updates,
+            ['receipt_verified_bank', 'amount_settled_in_ac', 'settlement_date', 'utr_number', 'updated_at'],
+            batch_size=UPDATE_BATCH_SIZE,
+        )
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(Claim._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPDATE_BATCH_SIZE):
+            batch = rows[start:start + UPDATE_BATCH_SIZE]
+            values = ', '.join(['(%s::bigint, %s::numeric, %s::date, %s::varchar)'] * len(batch))
+            cursor.execute(
+                f'UPDATE {table} SET {qn("receipt_verified_bank")} = TRUE, '
+                f'{qn("amount_settled_in_ac")} = v.amount, {qn("settlement_date")} = v.settled_on, '
+                f'{qn("utr_number")} = v.utr, {qn("status")} = %s, {qn("updated_at")} = %s '
+                f'FROM (VALUES {values}) AS v(id, amount, settled_on, utr) '
+                f'WHERE {table}.{qn("id")} = v.id',
+                ['closed', now] + [value for row in batch for value in row],
+            )
+
+
+def reconcile_statement(lines, tolerance=Decimal('1.00'), dry_run=False, unmatched_limit=None):
+    """Match statement lines to unverified claims and mark the matches verified"""
+    report = {
+        'statement_lines': 0,
+        'invalid_lines': [],
+        'duplicate_utrs': [],
+        'matched': {'exact_utr': 0, 'fuzzy_utr': 0, 'amount': 0},
+        'amount_mismatches': [],
+        'settlement_date_conflicts': [],
+        'unmatched_lines': [],
+        'claims_updated': 0,
+        'dry_run': dry_run,
+    }
+
+    # Build side: statement lines keyed by normalised UTR
+    by_utr = {}
+    for line in read_statement(lines):
+        report['statement_lines'] += 1
+        key = normalise_utr(line['utr'])
+        if line['amount'] is None or line['date'] is None:
+            report['invalid_lines'].append(line)
+        elif key and key in by_utr:
+            report['duplicate_utrs'].append(line)
+        else:
+            by_utr[key or f'#line{line["line"]}'] = line
+
+    matches = {}  # claim id -> (claim, statement line, method)
+    used_lines = set()
+    claim_fields = (
+        'id', 'utr_number', 'month', 'amount_settled_in_ac', 'total_settled_amount', 'approved_amount',
+        'settlement_date', 'receipt_verified_bank', 'status',
+    )
+    unverified = (
+        Claim.objects
+        .filter(Q(receipt_verified_bank=False) | Q(settlement_date__isnull=True))
+        .order_by()
+        .values(*claim_fields)
+    )
+
+    # Probe 1: exact UTR; keep the rest for the fuzzy pass
+    suffix_claims = defaultdict(list)
+    for claim in unverified.exclude(Q(utr_number__isnull=True) | Q(utr_number='')).iterator(chunk_size=CLAIM_CHUNK_SIZE):
+        key = normalise_utr(claim['utr_number'])
+        line = by_utr.get(key)
+        if line is not None and line['line'] not in used_lines:
+            if _within(claim, line, tolerance):
+                matches[claim['id']] = (claim, line, 'exact_utr')
+                used_lines.add(line['line'])
+            else:
+                report['amount_mismatches'].append({
+                    'line': line['line'], 'utr': line['utr'], 'amount': line['amount'], 'date': line['date'],
+                    'claim': claim['id'], 'expected_amount': _expected_amount(claim),
+                })
+                used_lines.add(line['line'])
+        elif len(key) >= UTR_SUFFIX_LENGTH:
+            suffix_claims[key[-UTR_SUFFIX_LENGTH:]].append(claim)
+
+    # Probe 2: fuzzy UTR on unique suffixes
+    suffix_lines = defaultdict(list)
+    for key, line in by_utr.items():
+        if line['line'] not in used_lines and len(key) >= UTR_SUFFIX_LENGTH and not key.startswith('#'):
+            suffix_lines[key[-UTR_SUFFIX_LENGTH:]].append(line)
+    for suffix, claims in suffix_claims.items():
+        lines_for_suffix = suffix_lines.get(suffix, [])
+        if len(claims) == 1 and len(lines_for_suffix) == 1 and _within(claims[0], lines_for_suffix[0], tolerance):
+            matches[claims[0]['id']] = (claims[0], lines_for_suffix[0], 'fuzzy_utr')
+            used_lines.add(lines_for_suffix[0]['line'])
+
+    # Probe 3: amount only, for claims with no UTR, when unique on both sides
+    by_amount = defaultdict(list)
+    for line in by_utr.values():
+        if line['line'] not in used_lines:
+            by_amount[int(line['amount'])].append(line)
+    if by_amount:
+        amount_claims = defaultdict(list)
+        no_utr = unverified.filter(Q(utr_number__isnull=True) | Q(utr_number=''))
+        for claim in no_utr.iterator(chunk_size=CLAIM_CHUNK_SIZE):
+            expected = _expected_amount(claim)
+            if expected is None:
+                continue
+            for bucket in range(int(expected - tolerance), int(expected + tolerance) + 1):
+                for line in by_amount.get(bucket, ()):
+                    if abs(line['amount'] - expected) <= tolerance:
+                        amount_claims[line['line']].append(claim)
+        claims_per_line = {line_no: claims for line_no, claims in amount_claims.items() if len(claims) == 1}
+        lines_per_claim = defaultdict(int)
+        for claims in claims_per_line.values():
+            lines_per_claim[claims[0]['id']] += 1
+        lines_by_no = {line['line']: line for lines in by_amount.values() for line in lines}
+        for line_no, (claim,) in claims_per_line.items():
+            if lines_per_claim[claim['id']] == 1:
+                matches[claim['id']] = (claim, lines_by_no[line_no], 'amount')
+                used_lines.add(line_no)
+
+    for claim, line, method in matches.values():
+        report['matched'][method] += 1
+        if claim['settlement_date'] is not None and claim['settlement_date'] != line['date']:
+            # The recorded settlement date is kept; a person decides which one is right
+            report['settlement_date_conflicts'].append({
+                'line': line['line'], 'utr': line['utr'], 'date': line['date'],
+                'claim': claim['id'], 'settlement_date': claim['settlement_date'],
+            })
+    unmatched = [line for line in by_utr.values() if line['line'] not in used_lines]
+    report['unmatched_count'] = len(unmatched)
+    report['unmatched_lines'] = unmatched[:unmatched_limit] if unmatched_limit else unmatched
+
+    if not dry_run and matches:
+        months = {claim['month'] for claim, line, method in matches.values()}
+        rows = [
+            (claim['id'], line['amount'], claim['settlement_date'] or line['date'], claim['utr_number'] or line['utr'])
+            for claim, line, method in matches.values()
+        ]
+        with transaction.atomic(using=router.db_for_write(Claim)):
+            # Recorded from the matches already in memory rather than re-read around the update
+            with paused():
+                _apply_matches(rows, timezone.now())
+            record_changes([
+                (
+                    claim_id,
+                    {field: claim[field] for field in MATCH_FIELDS + ('status',)},
+                    {**dict(zip(MATCH_FIELDS, (True, amount, settled_on, utr))), 'status': 'closed'},
+                )
+                for (claim, line, method), (claim_id, amount, settled_on, utr) in zip(matches.values(), rows)
+            ])
+        # These updates skip save() signals, so invalidate cached month stats and snapshots here
+        for month in months:
+            bump_month_version(month)
+        mark_stale(*months)
+        report['claims_updated'] = len(rows)
+
+    return report
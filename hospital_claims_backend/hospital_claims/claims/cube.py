@@ -0,0 +1,159 @@
+"""
+Multi-dimensional roll-ups of the claims table.
+
+``run_cube`` computes every requested grouping (a ROLLUP or a full CUBE of the
+chosen dimensions) in one ``GROUPING SETS`` query on PostgreSQL. Other
+backends get the same result from a ``UNION ALL`` of one ``GROUP BY`` per
+grouping set. The result is columnar: one list per dimension and measure, plus
+a ``grouping`` bitmask per row using PostgreSQL's ``GROUPING()`` convention
+(bit set = dimension rolled up, first dimension is the most significant bit).
+TPA and insurer are grouped on their integer keys and named afterwards.
+"""
+from decimal import Decimal
+from itertools import combinations
+
+from django.db import connections, router
+from django.db.models import BooleanField, ExpressionWrapper, F, Q
+
+from .models import Claim, Insurer, Tpa
+
+# Whitelisted dimensions; 'settled' is derived from settlement_date
+CUBE_DIMENSIONS = ('tpa_name', 'parent_insurance', 'month', 'physical_file_dispatch', 'settled')
+# Name dimensions -> (foreign key grouped on, model holding the names)
+NAMED_DIMENSIONS = {'tpa_name': ('tpa', Tpa), 'parent_insurance': ('insurer', Insurer)}
+
+CUBE_SUM_FIELDS = (
+    'bill_amount', 'approved_amount', 'mou_discount', 'co_pay', 'consumable_deduction',
+    'hospital_discount', 'paid_by_patient', 'other_deductions', 'tds',
+    'amount_settled_in_ac', 'total_settled_amount', 'difference_amount',
+)
+
+# Measure names follow Django's default aggregate aliases
+CUBE_MEASURES = {'id__count': ('COUNT', 'id')}
+for _field in CUBE_SUM_FIELDS:
+    CUBE_MEASURES[f'{_field}__sum'] = ('SUM', _field)
+    CUBE_MEASURES[f'{_field}__count'] = ('COUNT', _field)
+
+MAX_CUBE_DIMENSIONS = 4
+DEFAULT_MEASURES = ('id__count', 'bill_amount__sum', 'approved_amount__sum', 'total_settled_amount__sum')
+
+
+class CubeError(ValueError):
+    """Invalid cube request (unknown dimension/measure or too many rows)"""
+
+
+def grouping_sets(dimensions, mode):
+    """Grouping sets for ROLLUP (prefixes) or CUBE (all subsets), largest first"""
+    if mode == 'rollup':
+        return [tuple(dimensions[:n]) for n in range(len(dimensions), -1, -1)]
+    return [
+        combo
+        for n in range(len(dimensions), -1, -1)
+        for combo in combinations(dimensions, n)
+    ]
+
+
+def _grouping_id(dimensions, grouping_set):
+    gid = 0
+    for dimension in dimensions:
+        gid = (gid << 1) | (dimension not in grouping_set)
+    return gid
+
+
+def _base_query(queryset, dimensions, measures):
+    """SQL and params for the filtered rows with only the columns we need"""
+    columns = {dim for dim in dimensions if dim != 'settled'}
+    queryset = queryset.annotate(**{
+        dim: F(NAMED_DIMENSIONS[dim][0]) for dim in dimensions if dim in NAMED_DIMENSIONS
+    })
+    columns.update(field for _, field in (CUBE_MEASURES[m] for m in measures))
+    if 'settled' in dimensions:
+        queryset = queryset.annotate(settled=ExpressionWrapper(
+            Q(settlement_date__isnull=False), output_field=BooleanField()
+        ))
+        columns.add('settled')
+    return queryset.order_by().values(*sorted(columns)).query.sql_with_params()
+
+
+def run_cube(queryset, dimensions, measures=DEFAULT_MEASURES, mode='cube', max_rows=5000):
+    dimensions = list(dict.fromkeys(dimensions))
+    measures = list(dict.fromkeys(measures))
+    unknown = [d for d in dimensions if d not in CUBE_DIMENSIONS]
+    if unknown:
+        raise CubeError(f'Unknown dimensions: {", ".join(unknown)}')
+    unknown = [m for m in measures if m not in CUBE_MEASURES]
+    if unknown:
+        raise CubeError(f'Unknown measures: {", ".join(unknown)}')
+    if not dimensions or not measures:
+        raise CubeError('At least one dimension and one measure are required')
+    if len(dimensions) > MAX_CUBE_DIMENSIONS:
+        raise CubeError(f'At most {MAX_CUBE_DIMENSIONS} dimensions are allowed')
+    if mode not in ('cube', 'rollup'):
+        raise CubeError('mode must be "cube" or "rollup"')
+
+    connection = connections[router.db_for_read(Claim)]
+    qn = connection.ops.quote_name
+    base_sql, base_params = _base_query(queryset, dimensions, measures)
+    sets = grouping_sets(dimensions, mode)
+    measure_sql = ', '.join(
+        f'{func}(c.{qn(field)}) AS {qn(name)}'
+        for name, (func, field) in ((m, CUBE_MEASURES[m]) for m in measures)
+    )
+    dim_sql = ', '.join(f'c.{qn(d)}' for d in dimensions)
+    # Detail rows first, then each roll-up level
+    order_sql = 'ORDER BY ' + ', '.join(str(i) for i in [len(dimensions) + 1, *range(1, len(dimensions) + 1)])
+
+    if connection.vendor == 'postgresql':
+        sets_sql = ', '.join('(' + ', '.join(f'c.{qn(d)}' for d in s) + ')' for s in sets)
+        sql = (
+            f'SELECT {dim_sql}, GROUPING({dim_sql}) AS {qn("grouping")}, {measure_sql} '
+            f'FROM ({base_sql}) c GROUP BY GROUPING SETS ({sets_sql}) {order_sql} LIMIT %s'
+        )
+        params = list(base_params) + [max_rows + 1]
+    else:
+        arms = []
+        params = []
+        for grouping_set in sets:
+            select_dims = ', '.join(
+                f'c.{qn(d)}' if d in grouping_set else f'NULL AS {qn(d)}' for d in dimensions
+            )
+            group_by = ' GROUP BY ' + ', '.join(f'c.{qn(d)}' for d in grouping_set) if grouping_set else ''
+            arms.append(
+                f'SELECT {select_dims}, {_grouping_id(dimensions, grouping_set)} AS {qn("grouping")}, '
+                f'{measure_sql} FROM ({base_sql}) c{group_by}'
+            )
+            params.extend(base_params)
+        sql = ' UNION ALL '.join(arms) + f' {order_sql} LIMIT %s'
+        params.append(max_rows + 1)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    if len(rows) > max_rows:
+        raise CubeError(
+            f'Result exceeds {max_rows} rows; use fewer dimensions, rollup mode or filters'
+        )
+
+    names = dimensions + ['grouping'] + measures
+    columns = {name: [] for name in names}
+    labels = {dim: NAMED_DIMENSIONS[dim][1].objects.names() for dim in dimensions if dim in NAMED_DIMENSIONS}
+    for row in rows:
+        grouping = row[len(dimensions)]
+        for position, (name, value) in enumerate(zip(names, row)):
+            if name in labels:
+                rolled_up = grouping >> (len(dimensions) - 1 - position) & 1
+                value = None if rolled_up else labels[name].get(value, '')
+            elif isinstance(value, (Decimal, float)):
+                value = round(float(value), 2)
+            elif name == 'settled' and value is not None:
+                value = bool(value)
+            columns[name].append(value)
+
+    return {
+        'dimensions': dimensions,
+        'measures': measures,
+        'mode': mode,
+        'row_count': len(rows),
+        'columns': columns,
+    }
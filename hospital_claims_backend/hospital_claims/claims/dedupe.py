@@ -0,0 +1,227 @@
+"""
+Duplicate claim detection with blocking keys.
+
+Every claim gets up to three blocking keys:
+
+- UHID/IP number plus discharge date
+- normalised patient name plus discharge month
+- bill amount plus discharge month
+
+Each key is hashed to a 64-bit integer and stored in ``ClaimBlockKey``. Pairs
+are only scored within a block, and blocks larger than ``MAX_BLOCK_SIZE``
+(a common bill amount, say) are skipped. The work per claim is therefore
+bounded and a scan grows linearly with the number of claims, not
+quadratically.
+
+A scan re-keys only claims updated since the last scan's watermark. It then
+scores each of those claims against the rest of its blocks and upserts the
+pairs into ``DuplicateCandidate``. Pairs that were dismissed or confirmed
+keep their status.
+"""
+import hashlib
+import re
+from collections import defaultdict
+from decimal import Decimal
+from difflib import SequenceMatcher
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import WATERMARK_OVERLAP, Claim, ClaimBlockKey, DuplicateCandidate, DuplicateScan
+
+DEDUPE_FIELDS = (
+    'id', 'claim_id', 'uhid_ip_no', 'patient_name', 'tpa_id',
+    'date_of_admission', 'date_of_discharge', 'month', 'bill_amount',
+)
+# Weight of each agreeing field in the 0-1 pair score
+WEIGHTS = {
+    'uhid': Decimal('0.30'),
+    'discharge_date': Decimal('0.20'),
+    'name': Decimal('0.20'),
+    'admission_date': Decimal('0.10'),
+    'bill_amount': Decimal('0.10'),
+    'claim_id': Decimal('0.05'),
+    'tpa': Decimal('0.05'),
+}
+# Blocks bigger than this are too unselective to compare pairwise
+MAX_BLOCK_SIZE = 100
+CHUNK_SIZE = 2000
+NAME_TITLES = {'mr', 'mrs', 'ms', 'miss', 'dr', 'smt', 'shri', 'sri', 'master', 'baby', 'late'}
+
+
+def normalise_name(name):
+    """Lowercase name tokens without titles or punctuation, in sorted order"""
+    tokens = re.sub(r'[^a-z ]', ' ', (name or '').lower()).split()
+    return ' '.join(sorted(token for token in tokens if token not in NAME_TITLES))
+
+
+def normalise_uhid(uhid):
+    return re.sub(r'[^0-9A-Z]', '', (uhid or '').upper()).lstrip('0')
+
+
+def hash_key(*parts):
+    """Signed 64-bit hash of a blocking key, to fit a BigIntegerField"""
+    digest = hashlib.blake2b('|'.join(str(part) for part in parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def blocking_keys(claim):
+    """Hashed blocking keys for one claim row (a dict of DEDUPE_FIELDS)"""
+    keys = []
+    uhid = normalise_uhid(claim['uhid_ip_no'])
+    if uhid and claim['date_of_discharge']:
+        keys.append(hash_key('uhid', uhid, claim['date_of_discharge']))
+    name = normalise_name(claim['patient_name'])
+    if name and claim['month']:
+        keys.append(hash_key('name', name, claim['month']))
+    if claim['bill_amount'] and claim['month']:
+        keys.append(hash_key('bill', claim['bill_amount'], claim['month']))
+    return keys
+
+
+def score_pair(a, b):
+    """(score, reasons) for two claim rows"""
+    reasons = []
+    score = Decimal('0')
+
+    def agree(reason, matched, weight=None):
+        nonlocal score
+        if matched:
+            reasons.append(reason)
+            score += WEIGHTS[reason] if weight is None else weight
+
+    agree('uhid', normalise_uhid(a['uhid_ip_no']) and normalise_uhid(a['uhid_ip_no']) == normalise_uhid(b['uhid_ip_no']))
+    agree('discharge_date', a['date_of_discharge'] and a['date_of_discharge'] == b['date_of_discharge'])
+    agree('admission_date', a['date_of_admission'] and a['date_of_admission'] == b['date_of_admission'])
+    agree('bill_amount', a['bill_amount'] and a['bill_amount'] == b['bill_amount'])
+    agree('claim_id', a['claim_id'] and a['claim_id'].strip().upper() == (b['claim_id'] or '').strip().upper())
+    agree('tpa', a['tpa_id'] and a['tpa_id'] == b['tpa_id'])
+
+    name_a, name_b = normalise_name(a['patient_name']), normalise_name(b['patient_name'])
+    if name_a and name_b:
+        similarity = 1.0 if name_a == name_b else SequenceMatcher(None, name_a, name_b).ratio()
+        if similarity >= 0.8:
+            agree('name', True, (WEIGHTS['name'] * Decimal(str(round(similarity, 3)))).quantize(Decimal('0.001')))
+    return score, reasons
+
+
+def find_pairs(rows, changed_ids=None, min_score=None):
+    """
+    Candidate pairs among in-memory claim rows as {(id_a, id_b): (score, reasons)}.
+    With changed_ids, only pairs involving at least one of those claims are scored.
+    """
+    min_score = Decimal(str(settings.DUPLICATE_MIN_SCORE if min_score is None else min_score))
+    blocks = defaultdict(list)
+    for row in rows:
+        for key in blocking_keys(row):
+            blocks[key].append(row)
+
+    pairs = {}
+    for members in blocks.values():
+        if len(members) < 2 or len(members) > MAX_BLOCK_SIZE:
+            continue
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if a['id'] == b['id']:
+                    continue
+                pair = (a['id'], b['id']) if a['id'] < b['id'] else (b['id'], a['id'])
+                if pair in pairs:
+                    continue
+                if changed_ids is not None and a['id'] not in changed_ids and b['id'] not in changed_ids:
+                    continue
+                score, reasons = score_pair(a, b)
+                if score >= min_score:
+                    pairs[pair] = (score, reasons)
+    return pairs
+
+
+def _rekey(rows):
+    """Replace the stored blocking keys of these claims; returns the keys"""
+    claim_ids = [row['id'] for row in rows]
+    keys = [ClaimBlockKey(claim_id=row['id'], key=key) for row in rows for key in blocking_keys(row)]
+    ClaimBlockKey.objects.filter(claim_id__in=claim_ids).delete()
+    ClaimBlockKey.objects.bulk_create(keys, batch_size=CHUNK_SIZE)
+    return {block_key.key for block_key in keys}
+
+
+def _process_chunk(rows, now):
+    """Score a chunk of re-keyed claims against their blocks; returns (found, removed)"""
+    claim_ids = {row['id'] for row in rows}
+    keys = {key for row in rows for key in blocking_keys(row)}
+
+    # Neighbours: every claim sharing a block key with the chunk, except oversized blocks
+    members = defaultdict(set)
+    for key, claim_id in ClaimBlockKey.objects.filter(key__in=keys).values_list('key', 'claim_id'):
+        members[key].add(claim_id)
+    neighbour_ids = {
+        claim_id for block in members.values() if len(block) <= MAX_BLOCK_SIZE for claim_id in block
+    } - claim_ids
+    neighbours = list(Claim.objects.filter(id__in=neighbour_ids).order_by().values(*DEDUPE_FIELDS))
+
+    pairs = find_pairs(list(rows) + neighbours, changed_ids=claim_ids)
+    candidates = [
+        DuplicateCandidate(
+            claim_a_id=a, claim_b_id=b, score=score, reasons=','.join(reasons),
+            status='open', detected_at=now,
+        )
+        for (a, b), (score, reasons) in pairs.items()
+    ]
+
+    with transaction.atomic():
+        # Reviewed pairs keep their status; only the score and reasons are refreshed
+        DuplicateCandidate.objects.bulk_create(
+            candidates,
+            update_conflicts=True,
+            unique_fields=['claim_a', 'claim_b'],
+            update_fields=['score', 'reasons'],
+            batch_size=CHUNK_SIZE,
+        )
+        stale = [
+            pk for pk, a, b in DuplicateCandidate.objects.filter(
+                Q(claim_a_id__in=claim_ids) | Q(claim_b_id__in=claim_ids), status='open'
+            ).values_list('pk', 'claim_a_id', 'claim_b_id')
+            if (a, b) not in pairs
+        ]
+        removed, _ = DuplicateCandidate.objects.filter(pk__in=stale).delete()
+    return len(candidates), removed
+
+
+def run_scan(full=False, stdout=None):
+    """Re-key claims changed since the last scan (or all claims if full) and refresh their pairs"""
+    started_at = timezone.now()
+    last_scan = DuplicateScan.objects.filter(finished_at__isnull=False).first()
+    scan = DuplicateScan.objects.create(
+        started_at=started_at, watermark=started_at, full_scan=full or last_scan is None,
+    )
+
+    claims = Claim.objects.order_by('id').values(*DEDUPE_FIELDS)
+    if not scan.full_scan:
+        claims = claims.filter(updated_at__gte=last_scan.watermark - WATERMARK_OVERLAP)
+
+    # Re-key everything first so pairs between two changed claims in different chunks are seen
+    chunks = []
+    chunk = []
+    for row in claims.iterator(chunk_size=CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            _rekey(chunk)
+            chunks.append([row['id'] for row in chunk])
+            chunk = []
+    if chunk:
+        _rekey(chunk)
+        chunks.append([row['id'] for row in chunk])
+
+    for claim_ids in chunks:
+        rows = list(Claim.objects.filter(id__in=claim_ids).order_by().values(*DEDUPE_FIELDS))
+        found, removed = _process_chunk(rows, started_at)
+        scan.claims_scanned += len(rows)
+        scan.pairs_found += found
+        scan.pairs_removed += removed
+        if stdout:
+            stdout.write(f'Checked {scan.claims_scanned} claims...')
+
+    scan.finished_at = timezone.now()
+    scan.save()
+    return scan
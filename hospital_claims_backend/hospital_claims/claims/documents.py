@@ -0,0 +1,493 @@
+"""
+Claim document storage.
+
+Files are stored once per content under ``CLAIM_DOCUMENTS_DIR``, named by
+their SHA-256 (``ab/cd/abcd...``), so the same scan attached to several claims
+takes the space of one. ``ClaimDocument`` rows point at the hash; a file only
+moves into the store once it is complete and hashed, so the store never holds
+a partial file.
+
+Uploads never sit in memory. A multipart upload is streamed by
+``DocumentUploadHandler`` to a temporary file next to the store, hashing each
+chunk as it arrives. Large scans can instead be sent as a resumable upload:
+``start_upload`` opens a ``DocumentUpload``, ``append_chunk`` receives each
+chunk into a file of its own and then adds it at its offset to a part file,
+and the last chunk completes it. A
+client that loses its connection asks for the offset and carries on from
+there.
+
+A new document sets the matching ``*_uploaded`` flag of its claim, and
+deleting the last document of a kind clears it.
+
+``document_response`` serves a stored file. With ``CLAIM_DOCUMENTS_SENDFILE``
+set it only answers with an ``X-Accel-Redirect``/``X-Sendfile`` header and the
+front server sends the bytes; otherwise a ``FileResponse`` sends them, one
+byte range if asked for. Stored files never change, so the hash is a strong
+ETag and clients may cache them for good.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, parse_etags
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DOCUMENT_KIND_FLAGS, Claim, ClaimDocument, DocumentPreview, DocumentUpload
+
+# Bytes read from the request or a file at a time
+BLOCK_SIZE = 64 * 1024
+SENDFILE_HEADERS = {
+    'x-accel-redirect': 'X-Accel-Redirect',
+    'x-sendfile': 'X-Sendfile',
+}
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class DocumentError(ValueError):
+    pass
+
+
+class UploadOffsetMismatch(DocumentError):
+    """A chunk was sent for an offset other than where the upload stands"""
+
+
+def blob_path(sha256):
+    return os.path.join(settings.CLAIM_DOCUMENTS_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def incoming_dir():
+    path = os.path.join(settings.CLAIM_DOCUMENTS_DIR, 'incoming')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def part_path(upload):
+    return os.path.join(incoming_dir(), f'{upload.pk}.part')
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def store_file(path, sha256):
+    """Move a complete file into the store under its hash, or drop it if that content is stored already"""
+    target = blob_path(sha256)
+    if os.path.exists(target):
+        os.remove(path)
+        # Reused content counts as recent, so pruning leaves it alone
+        os.utime(target)
+        return target
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(path, target)
+    return target
+
+
+def check_kind(kind):
+    if kind not in DOCUMENT_KIND_FLAGS:
+        raise DocumentError(f'kind must be one of: {", ".join(DOCUMENT_KIND_FLAGS)}')
+
+
+def check_size(size):
+    if size > settings.CLAIM_DOCUMENT_MAX_SIZE:
+        raise DocumentError(f'Documents may be at most {settings.CLAIM_DOCUMENT_MAX_SIZE // (1024 * 1024)} MB')
+
+
+def _set_flag(claim_id, kind, value):
+    flag = DOCUMENT_KIND_FLAGS[kind]
+    if flag is None:
+        return
+    claim = Claim.objects.select_for_update().filter(pk=claim_id).first()
+    if claim is not None and getattr(claim, flag) != value:
+        # Saved like an edit, so the status, history and cached statistics follow
+        setattr(claim, flag, value)
+        claim.save()
+
+
+def attach_document(claim, kind, path, sha256, size, name, content_type='', user=None):
+    """Store a complete file and record it as a document of the claim"""
+    check_kind(kind)
+    store_file(path, sha256)
+    with transaction.atomic():
+        document = ClaimDocument.objects.create(
+            claim_id=claim.pk,
+            kind=kind,
+            original_name=os.path.basename(name)[:255] or 'document',
+            content_type=(content_type or '')[:100],
+            size=size,
+            sha256=sha256,
+            uploaded_by=user,
+        )
+        _set_flag(claim.pk, kind, True)
+        # Thumbnails are rendered in the background once the document is committed
+        from .previews import enqueue
+        transaction.on_commit(partial(enqueue, sha256), robust=True)
+    return document
+
+
+def delete_document(document):
+    """Remove a document; its file stays until prune_stored_files finds it unreferenced"""
+    with transaction.atomic():
+        document.delete()
+        if not ClaimDocument.objects.filter(claim_id=document.claim_id, kind=document.kind).exists():
+            _set_flag(document.claim_id, document.kind, False)
+
+
+class IncomingDocument(UploadedFile):
+    """A multipart upload being written to a temporary file in the store's incoming directory"""
+
+    def __init__(self, name, content_type, charset, content_type_extra):
+        file = tempfile.NamedTemporaryFile(dir=incoming_dir(), suffix='.upload', delete=False)
+        super().__init__(file, name, content_type, 0, charset, content_type_extra)
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        self.file.write(data)
+        self.size += len(data)
+
+    @property
+    def sha256(self):
+        return self.digest.hexdigest()
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.file.name):
+            os.remove(self.file.name)
+
+
+class DocumentUploadHandler(FileUploadHandler):
+    """Streams multipart files to disk chunk by chunk, hashing them on the way
+
+    A file larger than CLAIM_DOCUMENT_MAX_SIZE is dropped as soon as it
+    passes the limit and its name is kept in ``too_large``.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.files = []
+        self.too_large = []
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = IncomingDocument(self.file_name, self.content_type, self.charset, self.content_type_extra)
+        self.files.append(self.file)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.CLAIM_DOCUMENT_MAX_SIZE:
+            self.file.discard()
+            self.too_large.append(self.file_name)
+            raise SkipFile()
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.file.flush()
+        self.file.seek(0)
+        return self.file
+
+    def upload_interrupted(self):
+        self.cleanup()
+
+    def cleanup(self):
+        """Remove temporary files that were not moved into the store"""
+        for file in self.files:
+            file.discard()
+
+
+def start_upload(claim, kind, name, size, content_type='', sha256='', user=None):
+    check_kind(kind)
+    if size <= 0:
+        raise DocumentError('size must be a positive number of bytes')
+    check_size(size)
+    upload = DocumentUpload.objects.create(
+        claim_id=claim.pk,
+        kind=kind,
+        original_name=os.path.basename(name)[:255] or 'document',
+        content_type=(content_type or '')[:100],
+        size=size,
+        sha256=(sha256 or '').lower(),
+        created_by=user,
+    )
+    open(part_path(upload), 'wb').close()
+    return upload
+
+
+def append_chunk(upload_id, offset, stream):
+    """Write a chunk at ``offset``; returns the upload, or the document once the last byte arrived
+
+    The request body is read into a chunk file with no lock held, so a slow
+    client holds up nobody; the row is only locked to check the offset, add
+    the chunk to the part file and advance the offset.
+    """
+    upload = DocumentUpload.objects.get(pk=upload_id)
+    current = current_offset(upload)
+    if offset != current:
+        raise UploadOffsetMismatch(f'Upload is at offset {current}, not {offset}')
+    chunk_path = _receive_chunk(upload, offset, stream)
+    try:
+        with transaction.atomic():
+            upload = DocumentUpload.objects.select_for_update().filter(pk=upload_id).first()
+            if upload is None:
+                raise DocumentError('The upload was cancelled')
+            path = part_path(upload)
+            stored = current_offset(upload)
+            if stored < upload.offset:
+                # Acknowledged bytes went missing from the part file; carry on from what is there
+                upload.offset = stored
+                upload.save(update_fields=['offset', 'updated_at'])
+            accepted = offset == upload.offset
+            if accepted:
+                _append_chunk(upload, path, chunk_path)
+    finally:
+        os.remove(chunk_path)
+    if not accepted:
+        raise UploadOffsetMismatch(f'Upload is at offset {upload.offset}, not {offset}')
+    if upload.offset < upload.size:
+        return upload
+    return _finish_upload(upload, path)
+
+
+def current_offset(upload):
+    """The offset to resume from: the recorded one, or less if acknowledged bytes went missing from the part file"""
+    path = part_path(upload)
+    stored = os.path.getsize(path) if os.path.exists(path) else 0
+    return min(upload.offset, stored)
+
+
+def _receive_chunk(upload, offset, stream):
+    """Read a chunk for ``offset`` from the request into a file of its own; returns its path"""
+    remaining = upload.size - offset
+    file = tempfile.NamedTemporaryFile(dir=incoming_dir(), prefix=f'{upload.pk}.', suffix='.chunk', delete=False)
+    try:
+        with file:
+            while stream is not None:
+                block = stream.read(min(BLOCK_SIZE, remaining + 1))
+                if not block:
+                    break
+                if len(block) > remaining:
+                    raise DocumentError(f'Upload is larger than the {upload.size} bytes declared')
+                file.write(block)
+                remaining -= len(block)
+    except BaseException:
+        os.remove(file.name)
+        raise
+    return file.name
+
+
+def _append_chunk(upload, path, chunk_path):
+    chunk_size = os.path.getsize(chunk_path)
+    if upload.offset + chunk_size > upload.size:
+        raise DocumentError(f'Upload is larger than the {upload.size} bytes declared')
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as f, open(chunk_path, 'rb') as chunk:
+        # Bytes past the recorded offset are from a chunk that never finished
+        f.seek(upload.offset)
+        f.truncate()
+        for block in iter(lambda: chunk.read(BLOCK_SIZE), b''):
+            f.write(block)
+        f.flush()
+        os.fsync(f.fileno())
+    upload.offset += chunk_size
+    upload.save(update_fields=['offset', 'updated_at'])
+
+
+def _finish_upload(upload, path):
+    sha256 = hash_file(path)
+    if upload.sha256 and upload.sha256 != sha256:
+        cancel_upload(upload)
+        raise DocumentError(f'SHA-256 of the received file is {sha256}, expected {upload.sha256}; start a new upload')
+    claim = Claim.objects.filter(pk=upload.claim_id).first()
+    if claim is None:
+        cancel_upload(upload)
+        raise DocumentError(f'Claim {upload.claim_id} no longer exists')
+    document = attach_document(
+        claim, upload.kind, path, sha256, upload.size, upload.original_name,
+        content_type=upload.content_type, user=upload.created_by,
+    )
+    upload.delete()
+    return document
+
+
+def cancel_upload(upload):
+    path = part_path(upload)
+    if os.path.exists(path):
+        os.remove(path)
+    upload.delete()
+
+
+def prune_uploads(hours=None, dry_run=False):
+    """Cancel resumable uploads idle for longer than CLAIM_DOCUMENT_UPLOAD_EXPIRY_HOURS; returns how many"""
+    hours = settings.CLAIM_DOCUMENT_UPLOAD_EXPIRY_HOURS if hours is None else hours
+    stale = list(DocumentUpload.objects.filter(updated_at__lt=timezone.now() - timedelta(hours=hours)))
+    if not dry_run:
+        for upload in stale:
+            cancel_upload(upload)
+    return len(stale)
+
+
+def prune_stored_files(grace_hours=1, dry_run=False):
+    """Remove stored files and previews no document refers to, and incoming leftovers; returns (files, bytes)
+
+    Files touched within ``grace_hours`` are kept, as an upload may be about to
+    record a document for them.
+    """
+    root = settings.CLAIM_DOCUMENTS_DIR
+    if not os.path.isdir(root):
+        return 0, 0
+    cutoff = timezone.now().timestamp() - grace_hours * 3600
+    live_parts = {f'{pk}.part' for pk in DocumentUpload.objects.values_list('pk', flat=True)}
+    candidates = {}
+    for directory, _, names in os.walk(root):
+        section = os.path.relpath(directory, root).split(os.sep)[0]
+        if section == 'snapshots':
+            # Month-close snapshots are replaced and removed by claims.month_close
+            continue
+        for name in names:
+            path = os.path.join(directory, name)
+            if section == 'incoming' and name in live_parts:
+                continue
+            if os.path.getmtime(path) < cutoff:
+                # Incoming leftovers belong to nothing; previews are named <hash>-<variant>.jpg
+                candidates[path] = None if section == 'incoming' else name[:64]
+    hashes = {name for name in candidates.values() if name}
+    referenced = set()
+    hash_list = list(hashes)
+    for start in range(0, len(hash_list), 900):
+        referenced.update(
+            ClaimDocument.objects.filter(sha256__in=hash_list[start:start + 900]).values_list('sha256', flat=True)
+        )
+    removed = removed_bytes = 0
+    for path, name in candidates.items():
+        if name in referenced:
+            continue
+        removed += 1
+        removed_bytes += os.path.getsize(path)
+        if not dry_run:
+            os.remove(path)
+    if not dry_run:
+        unreferenced = list(hashes - referenced)
+        for start in range(0, len(unreferenced), 900):
+            DocumentPreview.objects.filter(sha256__in=unreferenced[start:start + 900]).delete()
+    return removed, removed_bytes
+
+
+class FileRange:
+    """Bytes [start, start + length) of an open file, read no further than the range
+
+    Keeps ``fileno()``, so a WSGI server with ``wsgi.file_wrapper`` (gunicorn)
+    still sendfile()s the range from the current position, capped by the
+    response's Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """(start, length) of a single 'bytes=' range, None to send the whole file, or raise ValueError if unsatisfiable"""
+    match = RANGE_RE.match(header.replace(' ', ''))
+    # Several ranges (or other units) are answered with the whole file, which HTTP allows
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        if int(last) == 0 or size == 0:
+            raise ValueError(header)
+        return max(size - int(last), 0), min(int(last), size)
+    start = int(first)
+    # A last byte before the first is invalid syntax, so the header is ignored (RFC 7233 3.1)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end - start + 1
+
+
+def document_response(request, document):
+    """Download response for a document, honouring If-None-Match, Range and If-Range"""
+    return stored_file_response(
+        request, blob_path(document.sha256), f'"{document.sha256}"', document.content_type, document.original_name
+    )
+
+
+def stored_file_response(request, path, etag, content_type='', filename=''):
+    """Response for a file under CLAIM_DOCUMENTS_DIR: sendfile header, FileResponse or 304"""
+    content_type = content_type or 'application/octet-stream'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        response = not_modified
+    elif settings.CLAIM_DOCUMENTS_SENDFILE:
+        # The front server sends the file (and handles ranges); Django only checked permissions
+        response = HttpResponse(content_type=content_type)
+        header = SENDFILE_HEADERS[settings.CLAIM_DOCUMENTS_SENDFILE.lower()]
+        if header == 'X-Accel-Redirect':
+            relative = os.path.relpath(path, settings.CLAIM_DOCUMENTS_DIR)
+            response[header] = settings.CLAIM_DOCUMENTS_ACCEL_PREFIX.rstrip('/') + '/' + relative.replace(os.sep, '/')
+        else:
+            response[header] = path
+    else:
+        response = _file_response(request, path, etag, content_type)
+
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    if filename and response.status_code != 304:
+        response['Content-Disposition'] = content_disposition_header(False, filename)
+    return response
+
+
+def _file_response(request, path, etag, content_type):
+    size = os.path.getsize(path)
+    byte_range = None
+    header = request.META.get('HTTP_RANGE', '')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if header and (if_range is None or etag in parse_etags(if_range)):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, length = byte_range
+        response = FileResponse(FileRange(file, start, length), status=206, content_type=content_type)
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{start + length - 1}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
@@ -0,0 +1,322 @@
+"""
+Excel, CSV, Parquet and Arrow export of claims.
+
+``write_claims_xlsx`` writes a claims queryset to an .xlsx workbook with typed
+cells: amounts are numbers and dates are dates, so the sheet can be summed and
+filtered in Excel as is. XlsxWriter runs in ``constant_memory`` mode, where
+each row goes to a temporary file as soon as the next one starts. The claims
+are read through ``iterator()``, which uses a server-side cursor on
+PostgreSQL, so memory stays flat however many rows are exported. A sheet
+that reaches Excel's row limit continues on the next one. XlsxWriter is
+optional; ``write_claims_csv`` writes the same columns as text.
+
+``write_claims_parquet`` and ``write_claims_arrow`` are for analytics tools:
+every column of the claims table, typed as in the cold archive (decimal128
+amounts, date32 dates), with the TPA and insurer names dictionary-encoded
+against the small dimension tables. Rows are read in cursor chunks and
+written one record batch (a Parquet row group) at a time, zstd-compressed.
+With ``include_archive`` the archived claims follow, read back from the cold
+archive a row group at a time. They need pyarrow, which is optional as well.
+"""
+import csv
+import io
+
+try:
+    import xlsxwriter
+except ImportError:  # pragma: no cover - optional dependency
+    xlsxwriter = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pc = pq = None
+
+from .archive import archive_batches, archive_schema
+from .models import CLAIM_STATUS_LABELS, Claim, Insurer, Tpa
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+PARQUET_CONTENT_TYPE = 'application/vnd.apache.parquet'
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.file'
+# Rows fetched from the database at a time
+CHUNK_SIZE = 2000
+# Excel's limit is 1,048,576 rows including the header
+SHEET_ROWS = 1048575
+# Rows per Arrow record batch and Parquet row group
+ROW_GROUP_SIZE = 65536
+DISPATCH_LABELS = dict(Claim.PHYSICAL_FILE_DISPATCH_CHOICES)
+# Dictionary-encoded name columns: (column, foreign key, dimension model)
+DIMENSION_COLUMNS = (
+    ('tpa_name', 'tpa_id', Tpa),
+    ('parent_insurance', 'insurer_id', Insurer),
+)
+
+# (header, values() field, cell type, column width)
+COLUMNS = [
+    ('Claim ID', 'claim_id', 'text', 18),
+    ('Month', 'month', 'text', 9),
+    ('Status', 'status', 'status', 28),
+    ('Date of Admission', 'date_of_admission', 'date', 12),
+    ('Date of Discharge', 'date_of_discharge', 'date', 12),
+    ('TPA Name', 'tpa__name', 'text', 28),
+    ('Parent Insurance', 'insurer__name', 'text', 28),
+    ('UHID/IP No', 'uhid_ip_no', 'text', 14),
+    ('Patient Name', 'patient_name', 'text', 24),
+    ('Bill Amount', 'bill_amount', 'amount', 14),
+    ('Approved Amount', 'approved_amount', 'amount', 14),
+    ('MOU Discount', 'mou_discount', 'amount', 12),
+    ('Co-pay', 'co_pay', 'amount', 12),
+    ('Consumable Deduction', 'consumable_deduction', 'amount', 12),
+    ('Hospital Discount', 'hospital_discount', 'amount', 12),
+    ('Paid by Patient', 'paid_by_patient', 'amount', 12),
+    ('Hospital Discount Authority', 'hospital_discount_authority', 'text', 18),
+    ('Other Deductions', 'other_deductions', 'amount', 12),
+    ('Physical File Dispatch', 'physical_file_dispatch', 'dispatch', 12),
+    ('Query Reply Date', 'query_reply_date', 'date', 12),
+    ('Settlement Date', 'settlement_date', 'date', 12),
+    ('UTR Number', 'utr_number', 'text', 18),
+    ('TDS', 'tds', 'amount', 12),
+    ('Amount Settled in A/C', 'amount_settled_in_ac', 'amount', 14),
+    ('Total Settled Amount', 'total_settled_amount', 'amount', 14),
+    ('Difference between Approved & Settled Amount', 'difference_amount', 'amount', 14),
+    ('Reason for Less Settlement', 'reason_less_settlement', 'text', 30),
+    ('Claim Settled on Software', 'claim_settled_software', 'bool', 10),
+    ('Receipt Amount Verification', 'receipt_verified_bank', 'bool', 10),
+]
+
+
+class ExportError(RuntimeError):
+    pass
+
+
+def xlsxwriter_available():
+    return xlsxwriter is not None
+
+
+def _require_xlsxwriter():
+    if xlsxwriter is None:
+        raise ExportError('Excel export needs XlsxWriter (pip install XlsxWriter)')
+
+
+def pyarrow_available():
+    return pa is not None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ExportError('Parquet and Arrow export need pyarrow (pip install pyarrow)')
+
+
+def _add_sheet(workbook, number, header_format, formats):
+    sheet = workbook.add_worksheet('Claims' if number == 1 else f'Claims {number}')
+    for col, (header, _, kind, width) in enumerate(COLUMNS):
+        sheet.set_column(col, col, width, formats.get(kind))
+        sheet.write_string(0, col, header, header_format)
+    sheet.freeze_panes(1, 0)
+    # (method, format, converter) per column, so the row loop does no type dispatch
+    writers = []
+    for _, _, kind, _ in COLUMNS:
+        if kind == 'amount':
+            writers.append((sheet.write_number, formats['amount'], float))
+        elif kind == 'date':
+            writers.append((sheet.write_datetime, formats['date'], None))
+        elif kind == 'bool':
+            writers.append((sheet.write_string, None, lambda value: 'Yes' if value else 'No'))
+        elif kind == 'status':
+            writers.append((sheet.write_string, None, lambda value: CLAIM_STATUS_LABELS.get(value, value)))
+        elif kind == 'dispatch':
+            writers.append((sheet.write_string, None, lambda value: DISPATCH_LABELS.get(value, value)))
+        else:
+            writers.append((sheet.write_string, None, str))
+    return sheet, writers
+
+
+def write_claims_xlsx(queryset, output, chunk_size=CHUNK_SIZE):
+    """Write the queryset's claims to ``output`` (a path or a binary file); returns the number of rows"""
+    _require_xlsxwriter()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'strings_to_numbers': False})
+    header_format = workbook.add_format({'bold': True, 'bg_color': '#DDEBF7', 'text_wrap': True, 'valign': 'top'})
+    formats = {
+        'amount': workbook.add_format({'num_format': '#,##0.00'}),
+        'date': workbook.add_format({'num_format': 'yyyy-mm-dd'}),
+    }
+
+    fields = [field for _, field, _, _ in COLUMNS]
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    sheets = []
+    sheet = writers = None
+    count = row = 0
+    for values in rows:
+        if sheet is None or row == SHEET_ROWS:
+            sheet, writers = _add_sheet(workbook, len(sheets) + 1, header_format, formats)
+            sheets.append(sheet)
+            row = 0
+        row += 1
+        for col, value in enumerate(values):
+            if value is None or value == '':
+                continue
+            write, cell_format, convert = writers[col]
+            write(row, col, convert(value) if convert else value, cell_format)
+        count += 1
+
+    if sheet is None:
+        sheet, _ = _add_sheet(workbook, 1, header_format, formats)
+    # Filter buttons over each sheet's rows
+    for number, filtered in enumerate(sheets):
+        last_row = SHEET_ROWS if number < len(sheets) - 1 else row
+        filtered.autofilter(0, 0, last_row, len(COLUMNS) - 1)
+    workbook.close()
+    return count
+
+
+def _csv_text(kind):
+    if kind == 'bool':
+        return lambda value: 'Yes' if value else 'No'
+    if kind == 'status':
+        return lambda value: CLAIM_STATUS_LABELS.get(value, value)
+    if kind == 'dispatch':
+        return lambda value: DISPATCH_LABELS.get(value, value)
+    if kind == 'date':
+        return lambda value: value.isoformat()
+    return str
+
+
+def write_claims_csv(queryset, output, chunk_size=CHUNK_SIZE):
+    """Write the queryset's claims as UTF-8 CSV to a binary file; returns the number of rows"""
+    converters = [_csv_text(kind) for _, _, kind, _ in COLUMNS]
+    text = io.TextIOWrapper(output, encoding='utf-8', newline='', write_through=True)
+    try:
+        writer = csv.writer(text)
+        writer.writerow([header for header, _, _, _ in COLUMNS])
+        count = 0
+        fields = [field for _, field, _, _ in COLUMNS]
+        for values in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+            writer.writerow([
+                '' if value is None else convert(value)
+                for convert, value in zip(converters, values)
+            ])
+            count += 1
+    finally:
+        # Leave the caller's file open
+        text.detach()
+    return count
+
+
+def arrow_schema():
+    """The archive schema with the TPA and insurer names dictionary-encoded"""
+    _require_pyarrow()
+    schema = archive_schema()
+    for column, _, _ in DIMENSION_COLUMNS:
+        schema = schema.set(schema.get_field_index(column), pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+    return schema
+
+
+def _dimensions(archive_names):
+    """(position by id, position by name, dictionary) per name column, shared by every batch of an export"""
+    dimensions = []
+    for (column, _, model), archived in zip(DIMENSION_COLUMNS, archive_names):
+        names = model.objects.names()
+        ids = sorted(names, key=lambda pk: (names[pk], pk))
+        values = [names[pk] for pk in ids]
+        by_name = {}
+        for i, name in enumerate(values):
+            by_name.setdefault(name, i)
+        # Archived claims keep the name they had; names since renamed or merged are added at the end
+        for name in sorted(archived - set(by_name)):
+            by_name[name] = len(values)
+            values.append(name)
+        dimensions.append(({pk: i for i, pk in enumerate(ids)}, by_name, pa.array(values, pa.string())))
+    return dimensions
+
+
+def _record_batches(queryset, schema, dimensions, chunk_size, row_group_size):
+    plain = [name for name in schema.names if name not in {column for column, _, _ in DIMENSION_COLUMNS}]
+    types = [schema.field(name).type for name in plain]
+    keys = [key for _, key, _ in DIMENSION_COLUMNS]
+
+    def batch(rows):
+        columns = list(zip(*rows))
+        arrays = [pa.array(values, type=type_) for values, type_ in zip(columns, types)]
+        for (positions, _, dictionary), values in zip(dimensions, columns[len(plain):]):
+            indices = pa.array([positions.get(pk) for pk in values], pa.int32())
+            arrays.append(pa.DictionaryArray.from_arrays(indices, dictionary))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    rows = []
+    for values in queryset.values_list(*plain, *keys).iterator(chunk_size=chunk_size):
+        rows.append(values)
+        if len(rows) == row_group_size:
+            yield batch(rows)
+            rows = []
+    if rows:
+        yield batch(rows)
+
+
+def _archive_record_batches(months, schema, dimensions):
+    """Archived claims in the export schema; columns a file predates are left null"""
+    encoded = {column: dimension for (column, _, _), dimension in zip(DIMENSION_COLUMNS, dimensions)}
+    for archived in archive_batches(months=months):
+        arrays = []
+        for field in schema:
+            present = field.name in archived.schema.names
+            if field.name in encoded:
+                _, by_name, dictionary = encoded[field.name]
+                names = archived.column(field.name).to_pylist() if present else [None] * archived.num_rows
+                indices = pa.array([by_name.get(name) for name in names], pa.int32())
+                arrays.append(pa.DictionaryArray.from_arrays(indices, dictionary))
+            elif present:
+                arrays.append(archived.column(field.name).cast(field.type))
+            else:
+                arrays.append(pa.nulls(archived.num_rows, field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _archive_names(months):
+    """The TPA and insurer names found in the archive, per name column"""
+    names = tuple(set() for _ in DIMENSION_COLUMNS)
+    columns = [column for column, _, _ in DIMENSION_COLUMNS]
+    for archived in archive_batches(months=months, columns=columns):
+        for found, column in zip(names, columns):
+            found.update(name for name in pc.unique(archived.column(column)).to_pylist() if name is not None)
+    return names
+
+
+def _write_batches(writer, queryset, schema, chunk_size, row_group_size, include_archive, months):
+    dimensions = _dimensions(_archive_names(months) if include_archive else tuple(set() for _ in DIMENSION_COLUMNS))
+    count = 0
+    with writer:
+        for record_batch in _record_batches(queryset, schema, dimensions, chunk_size, row_group_size):
+            writer.write_batch(record_batch)
+            count += record_batch.num_rows
+        if include_archive:
+            for record_batch in _archive_record_batches(months, schema, dimensions):
+                writer.write_batch(record_batch)
+                count += record_batch.num_rows
+    return count
+
+
+def write_claims_parquet(
+    queryset, output, chunk_size=CHUNK_SIZE, row_group_size=ROW_GROUP_SIZE, include_archive=False, months=None
+):
+    """Write the queryset's claims (then archived ones, if asked) to a Parquet file; returns the number of rows"""
+    schema = arrow_schema()
+    writer = pq.ParquetWriter(output, schema, compression='zstd')
+    return _write_batches(writer, queryset, schema, chunk_size, row_group_size, include_archive, months)
+
+
+def write_claims_arrow(
+    queryset, output, chunk_size=CHUNK_SIZE, row_group_size=ROW_GROUP_SIZE, include_archive=False, months=None
+):
+    """Write the queryset's claims (then archived ones, if asked) to an Arrow IPC file; returns the number of rows"""
+    schema = arrow_schema()
+    writer = pa.ipc.new_file(output, schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+    return _write_batches(writer, queryset, schema, chunk_size, row_group_size, include_archive, months)
+
+
+# Export URL suffix: (content type, writer, availability check, what it needs)
+EXPORT_FORMATS = {
+    'xlsx': (XLSX_CONTENT_TYPE, write_claims_xlsx, xlsxwriter_available, 'XlsxWriter'),
+    'parquet': (PARQUET_CONTENT_TYPE, write_claims_parquet, pyarrow_available, 'pyarrow'),
+    'arrow': (ARROW_CONTENT_TYPE, write_claims_arrow, pyarrow_available, 'pyarrow'),
+}
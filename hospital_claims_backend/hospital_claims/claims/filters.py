@@ -1,7 +1,10 @@
 import django_filters
-from .models import Claim
+from .models import Claim, Insurer, Tpa
+from .partitioning import month_range
 
 class ClaimFilter(django_filters.FilterSet):
+    date_of_admission_from = django_filters.DateFilter(field_name='date_of_admission', lookup_expr='gte')
+    date_of_admission_to = django_filters.DateFilter(field_name='date_of_admission', lookup_expr='lte')
     date_of_discharge_from = django_filters.DateFilter(field_name='date_of_discharge', lookup_expr='gte')
     date_of_discharge_to = django_filters.DateFilter(field_name='date_of_discharge', lookup_expr='lte')
     settlement_date_from = django_filters.DateFilter(field_name='settlement_date', lookup_expr='gte')
@@ -11,16 +14,38 @@ class ClaimFilter(django_filters.FilterSet):
     approved_amount_min = django_filters.NumberFilter(field_name='approved_amount', lookup_expr='gte')
     approved_amount_max = django_filters.NumberFilter(field_name='approved_amount', lookup_expr='lte')
     has_settlement_date = django_filters.BooleanFilter(field_name='settlement_date', lookup_expr='isnull', exclude=True)
+    # Exact names go through the alias table, so any known spelling matches
+    tpa_name = django_filters.CharFilter(method='filter_dimension', field_name='tpa')
+    tpa_name__icontains = django_filters.CharFilter(field_name='tpa__name', lookup_expr='icontains')
+    parent_insurance = django_filters.CharFilter(method='filter_dimension', field_name='insurer')
+    parent_insurance__icontains = django_filters.CharFilter(field_name='insurer__name', lookup_expr='icontains')
+    month = django_filters.CharFilter(method='filter_month')
     
     class Meta:
         model = Claim
         fields = {
-            'tpa_name': ['exact', 'icontains'],
-            'parent_insurance': ['exact', 'icontains'],
+            'tpa': ['exact'],
+            'insurer': ['exact'],
             'claim_id': ['exact', 'icontains'],
             'patient_name': ['icontains'],
-            'month': ['exact'],
+            'status': ['exact'],
             'physical_file_dispatch': ['exact'],
             'claim_settled_software': ['exact'],
             'receipt_verified_bank': ['exact'],
-        }
\ No newline at end of file
+        }
+    
+    def filter_dimension(self, queryset, name, value):
+        model = Tpa if name == 'tpa' else Insurer
+        target = model.objects.find(value)
+        if target is None:
+            return queryset.none()
+        return queryset.filter(**{f'{name}_id': target.pk})
+    
+    def filter_month(self, queryset, name, value):
+        queryset = queryset.filter(month=value)
+        try:
+            start, end = month_range(value)
+        except ValueError:
+            return queryset
+        # Discharge date bounds let a partitioned claims table skip other months
+        return queryset.filter(date_of_discharge__gte=start, date_of_discharge__lt=end)
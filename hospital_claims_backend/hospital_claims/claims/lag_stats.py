@@ -0,0 +1,198 @@
+"""
+Settlement-lag and query-reply-lag percentiles per TPA and insurer.
+
+On PostgreSQL every group is computed in one pass with ``percentile_cont``
+over ``GROUPING SETS``. Other backends stream the rows once into per-group
+``LagSketch`` histograms. Lags are whole days, so a day histogram is a compact
+sketch that gives the same interpolated percentiles as ``percentile_cont``.
+
+Results are cached per discharge month. Each month's cache entry is keyed
+by a version that ``bump_month_version`` increments whenever a claim in that
+month is saved, deleted or queryset-updated, so closed months are reused
+until their claims change. The versions live in the default cache, which
+only every worker sees when ``CACHE_URL`` names a shared one, so entries
+also expire after ``LAG_STATS_CACHE_SECONDS``. The current month is always
+computed live.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Claim, Insurer, Tpa
+from .partitioning import month_range
+
+PERCENTILES = (0.5, 0.75, 0.9, 0.99)
+LAG_FIELDS = {
+    'settlement_lag': 'settlement_date',
+    'query_reply_lag': 'query_reply_date',
+}
+CACHE_PREFIX = 'lag-stats:v1'
+ALL_MONTHS = 'all'
+
+
+class LagSketch:
+    """Histogram of whole-day lags supporting percentile_cont-style quantiles"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.total = 0
+
+    def add(self, days):
+        self.counts[days] += 1
+        self.total += 1
+
+    def _value_at(self, rank, ordered):
+        seen = 0
+        for value in ordered:
+            seen += self.counts[value]
+            if rank < seen:
+                return value
+        return ordered[-1]
+
+    def quantile(self, q):
+        if not self.total:
+            return None
+        ordered = sorted(self.counts)
+        position = q * (self.total - 1)
+        lower_rank = int(position)
+        lower = self._value_at(lower_rank, ordered)
+        upper = self._value_at(min(lower_rank + 1, self.total - 1), ordered)
+        return lower + (upper - lower) * (position - lower_rank)
+
+
+def _month_version_key(month):
+    return f'claims-month-version:{month}'
+
+
+def month_version(month):
+    return cache.get_or_set(_month_version_key(month), 1, None)
+
+
+def bump_month_version(*months):
+    """Invalidate cached statistics for discharge months (and all-time)"""
+    for key in {*months, ALL_MONTHS}:
+        if key is None:
+            continue
+        try:
+            cache.incr(_month_version_key(key))
+        except ValueError:
+            cache.set(_month_version_key(key), 2, None)
+
+
+def _format_lags(count, values):
+    stats = {'count': count}
+    for q, value in zip(PERCENTILES, values or [None] * len(PERCENTILES)):
+        stats[f'p{int(q * 100)}'] = round(value, 2) if value is not None else None
+    return stats
+
+
+def _postgres_stats(queryset, connection):
+    qn = connection.ops.quote_name
+    base_sql, base_params = (
+        queryset.order_by()
+        .values('tpa', 'insurer', 'date_of_discharge', *LAG_FIELDS.values())
+        .query.sql_with_params()
+    )
+    percentile_array = 'ARRAY[' + ', '.join(str(q) for q in PERCENTILES) + ']'
+    lag_columns = []
+    for field in LAG_FIELDS.values():
+        lag = f'(c.{qn(field)} - c.{qn("date_of_discharge")})'
+        valid = f'{lag} >= 0'
+        lag_columns.append(f'COUNT(*) FILTER (WHERE {valid})')
+        lag_columns.append(
+            f'percentile_cont({percentile_array}) WITHIN GROUP (ORDER BY {lag}) FILTER (WHERE {valid})'
+        )
+    sql = (
+        f'SELECT c.{qn("tpa_id")}, c.{qn("insurer_id")}, '
+        f'GROUPING(c.{qn("tpa_id")}, c.{qn("insurer_id")}), {", ".join(lag_columns)} '
+        f'FROM ({base_sql}) c '
+        f'GROUP BY GROUPING SETS ((c.{qn("tpa_id")}), (c.{qn("insurer_id")}), ())'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, base_params)
+        for tpa, insurer, grouping, *lags in cursor.fetchall():
+            if grouping == 3:
+                group = ('overall', None)
+            elif grouping == 1:
+                group = ('tpa', tpa)
+            else:
+                group = ('insurer', insurer)
+            yield group, {
+                name: _format_lags(lags[2 * i], lags[2 * i + 1])
+                for i, name in enumerate(LAG_FIELDS)
+            }
+
+
+def _sketch_stats(queryset):
+    sketches = {}
+    rows = (
+        queryset.values_list('tpa', 'insurer', 'date_of_discharge', *LAG_FIELDS.values())
+        .order_by()
+        .iterator(chunk_size=2000)
+    )
+    for tpa, insurer, discharged, *lag_dates in rows:
+        for group in (('overall', None), ('tpa', tpa), ('insurer', insurer)):
+            group_sketches = sketches.get(group)
+            if group_sketches is None:
+                group_sketches = sketches[group] = {name: LagSketch() for name in LAG_FIELDS}
+            for name, lag_date in zip(LAG_FIELDS, lag_dates):
+                if lag_date is not None and (days := (lag_date - discharged).days) >= 0:
+                    group_sketches[name].add(days)
+    for group, group_sketches in sketches.items():
+        yield group, {
+            name: _format_lags(sketch.total, [sketch.quantile(q) for q in PERCENTILES])
+            for name, sketch in group_sketches.items()
+        }
+
+
+def compute_lag_stats(month=None):
+    queryset = Claim.objects.filter(date_of_discharge__isnull=False).filter(
+        Q(settlement_date__isnull=False) | Q(query_reply_date__isnull=False)
+    )
+    if month:
+        start, end = month_range(month)
+        queryset = queryset.filter(month=month, date_of_discharge__gte=start, date_of_discharge__lt=end)
+
+    connection = connections[router.db_for_read(Claim)]
+    if connection.vendor == 'postgresql':
+        groups = _postgres_stats(queryset, connection)
+    else:
+        groups = _sketch_stats(queryset)
+
+    empty = {name: _format_lags(0, None) for name in LAG_FIELDS}
+    result = {
+        'month': month,
+        'percentiles': [int(q * 100) for q in PERCENTILES],
+        'overall': empty,
+        'by_tpa': [],
+        'by_insurer': [],
+    }
+    # Groups are keyed by TPA/insurer id
+    names = {'tpa': Tpa.objects.names(), 'insurer': Insurer.objects.names()}
+    for (kind, key), stats in groups:
+        if kind == 'overall':
+            result['overall'] = stats
+        else:
+            result[f'by_{kind}'].append({'name': names[kind].get(key, ''), **stats})
+    for key in ('by_tpa', 'by_insurer'):
+        result[key].sort(key=lambda row: row['settlement_lag']['count'], reverse=True)
+    return result
+
+
+def lag_stats(month=None):
+    """Cached lag statistics for a discharge month (YYYY-MM) or all history"""
+    if month and month >= timezone.localdate().strftime('%Y-%m'):
+        return {**compute_lag_stats(month), 'cached': False}
+
+    month_key = month or ALL_MONTHS
+    cache_key = f'{CACHE_PREFIX}:{month_key}:{month_version(month_key)}'
+    result = cache.get(cache_key)
+    if result is not None:
+        return {**result, 'cached': True}
+    result = compute_lag_stats(month)
+    cache.set(cache_key, result, settings.LAG_STATS_CACHE_SECONDS)
+    return {**result, 'cached': False}
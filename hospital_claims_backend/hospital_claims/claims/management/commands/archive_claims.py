@@ -0,0 +1,47 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from claims.archive import ArchiveError, archive_claims
+
+
+class Command(BaseCommand):
+    help = 'Move old bank-verified, settled claims into compressed Parquet files, one per discharge month'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            type=str,
+            help='Archive claims settled and discharged before this date (YYYY-MM-DD); '
+                 'defaults to CLAIMS_ARCHIVE_AFTER_DAYS days ago'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the months and claim counts that would be archived'
+        )
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                before = date.fromisoformat(options['before'])
+            except ValueError:
+                raise CommandError('--before must be YYYY-MM-DD')
+        else:
+            before = timezone.localdate() - timedelta(days=settings.CLAIMS_ARCHIVE_AFTER_DAYS)
+
+        self.stdout.write(f'Archiving claims settled before {before} to {settings.CLAIMS_ARCHIVE_DIR}')
+        try:
+            archives = archive_claims(before, dry_run=options['dry_run'], stdout=self.stdout)
+        except ArchiveError as e:
+            raise CommandError(str(e))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run: nothing was archived'))
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Archived {sum(a.row_count for a in archives)} claims into {len(archives)} files'
+            )
+        )
@@ -0,0 +1,46 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from claims.month_close import SnapshotError, build, refresh_stale
+
+
+class Command(BaseCommand):
+    help = "Freeze closed months' claims reports into snapshots (summary, per-TPA breakdown, CSV and XLSX)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'months',
+            nargs='*',
+            help='Discharge months to close (YYYY-MM); defaults to last month'
+        )
+        parser.add_argument(
+            '--stale',
+            action='store_true',
+            help='Instead, regenerate the snapshots of closed months whose claims changed'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rewrite the files even when the content is unchanged'
+        )
+
+    def handle(self, *args, **options):
+        if options['stale']:
+            changed = refresh_stale(stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS(f'Regenerated {len(changed)} snapshots'))
+            return
+
+        months = options['months']
+        if not months:
+            first_of_month = date.today().replace(day=1)
+            months = [f'{date.fromordinal(first_of_month.toordinal() - 1):%Y-%m}']
+        for month in months:
+            try:
+                snapshot, written = build(month, force=options['force'])
+            except SnapshotError as e:
+                raise CommandError(str(e))
+            state = f'written in {snapshot.generation_ms} ms' if written else 'unchanged'
+            self.stdout.write(
+                f'{month}: {snapshot.claim_count} claims, {snapshot.content_hash[:12]} ({state})'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Closed {len(months)} months'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from claims.dedupe import run_scan
+from claims.models import DuplicateCandidate
+
+
+class Command(BaseCommand):
+    help = 'Find possible duplicate claims among claims changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Re-key and compare every claim instead of only those changed since the last scan'
+        )
+
+    def handle(self, *args, **options):
+        scan = run_scan(full=options['full'], stdout=self.stdout)
+        elapsed = (scan.finished_at - scan.started_at).total_seconds()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Checked {scan.claims_scanned} claims in {elapsed:.2f}s '
+                f'({"full" if scan.full_scan else "incremental"} scan)'
+            )
+        )
+        self.stdout.write(f'Candidate pairs written: {scan.pairs_found}')
+        self.stdout.write(f'Pairs no longer matching: {scan.pairs_removed}')
+        self.stdout.write(f'Total open pairs: {DuplicateCandidate.objects.filter(status="open").count()}')
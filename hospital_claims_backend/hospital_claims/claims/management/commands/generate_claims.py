@@ -0,0 +1,93 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from claims.synthetic import SyntheticDataError, load, remove, synthetic_claims
+
+
+class Command(BaseCommand):
+    help = 'Load a reproducible set of synthetic claims (NumPy-generated, COPY on PostgreSQL) for load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=10000,
+            help='Number of claims to generate (default: 10000)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Seed; the same seed and count always give the same claims (default: 42)'
+        )
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=24,
+            help='Discharge dates spread over this many months (default: 24)'
+        )
+        parser.add_argument(
+            '--end',
+            type=str,
+            help='Last discharge date (YYYY-MM-DD); defaults to today. Fix it for datasets that must not drift'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Rows per COPY or bulk_create batch'
+        )
+        parser.add_argument(
+            '--method',
+            choices=['auto', 'copy', 'bulk_create'],
+            default='auto',
+            help='How rows are inserted; auto uses COPY on PostgreSQL'
+        )
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='Delete the claims generated earlier with this seed first'
+        )
+        parser.add_argument(
+            '--remove',
+            action='store_true',
+            help='Only delete the synthetic claims of --seed'
+        )
+
+    def handle(self, *args, **options):
+        if options['remove']:
+            if options['seed'] is None:
+                raise CommandError('--remove needs --seed: synthetic claims are removed one seed at a time')
+            removed = remove(options['seed'])
+            self.stdout.write(self.style.SUCCESS(f'Removed {removed} synthetic claims'))
+            return
+        seed = 42 if options['seed'] is None else options['seed']
+
+        end = None
+        if options['end']:
+            try:
+                end = date.fromisoformat(options['end'])
+            except ValueError:
+                raise CommandError('--end must be YYYY-MM-DD')
+
+        existing = synthetic_claims(seed).count()
+        if existing:
+            if not options['replace']:
+                raise CommandError(f'{existing} claims of seed {seed} exist already; use --replace or another --seed')
+            self.stdout.write(f'Removed {remove(seed)} claims of seed {seed}')
+
+        started = time.perf_counter()
+        try:
+            method = load(
+                options['count'], seed, months=options['months'], end=end,
+                batch_size=options['batch_size'], method=options['method'], stdout=self.stdout,
+            )
+        except SyntheticDataError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Generated {options["count"]} claims (seed {seed}) with {method} in {elapsed:.1f}s '
+                f'({options["count"] / max(elapsed, 1e-9):,.0f} rows/s)'
+            )
+        )
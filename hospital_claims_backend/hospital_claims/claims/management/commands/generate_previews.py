@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from claims.previews import generate_missing, pdfium_available
+
+
+class Command(BaseCommand):
+    help = 'Render thumbnails and previews of claim documents that have none yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=max(settings.CLAIM_PREVIEW_WORKERS, 1),
+            help='Processes rendering in parallel (1 renders in this process)'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Also render files whose earlier attempt failed'
+        )
+        parser.add_argument(
+            '--retry-unsupported',
+            action='store_true',
+            help='Also render files marked unsupported, such as PDFs seen before pypdfium2 was installed'
+        )
+
+    def handle(self, *args, **options):
+        if not pdfium_available():
+            self.stdout.write(self.style.WARNING('pypdfium2 is not installed: PDFs will be marked unsupported'))
+
+        counts = generate_missing(
+            options['workers'],
+            retry_failed=options['retry_failed'],
+            retry_unsupported=options['retry_unsupported'],
+            stdout=self.stdout,
+        )
+        summary = ', '.join(f'{count} {status}' for status, count in sorted(counts.items())) or 'nothing to render'
+        self.stdout.write(self.style.SUCCESS(f'Previews: {summary}'))
@@ -4,7 +4,8 @@ from datetime import datetime
 from decimal import Decimal
 from django.core.management.base import BaseCommand
 from django.db import transaction
-from claims.models import Claim
+from claims.audit import capture
+from claims.models import Claim, Insurer, Tpa
 
 
 class Command(BaseCommand):
@@ -22,6 +23,11 @@ class Command(BaseCommand):
             )
             return
 
+        # The change history of the whole import is written in a few batched INSERTs
+        with capture(source='import_csv_claims'):
+            self.import_claims(csv_file_path)
+
+    def import_claims(self, csv_file_path):
         # Check if we should clear existing claims first
         existing_count = Claim.objects.count()
         if existing_count > 0:
@@ -32,12 +38,18 @@ class Command(BaseCommand):
 
         imported_count = 0
         errors = []
+        # Spelling -> Tpa/Insurer, so each distinct name hits the alias table once
+        self.dimension_cache = {Tpa: {}, Insurer: {}}
 
         with open(csv_file_path, 'r', encoding='utf-8') as file:
             reader = csv.DictReader(file)
             
             for row_num, row in enumerate(reader, start=2):  # Start from 2 because row 1 is header
                 try:
+                    # Resolved outside the row's transaction so a failed row can't roll back a cached name
+                    tpa = self.canonical(Tpa, row.get('tpa_name', ''))
+                    insurer = self.canonical(Insurer, row.get('parent_insurance', ''))
+                    
                     with transaction.atomic():
                         # Parse date fields
                         date_of_discharge = self.parse_date(row.get('date_of_discharge', ''))
@@ -56,8 +68,8 @@ class Command(BaseCommand):
                         # Create claim object
                         claim = Claim(
                             date_of_discharge=date_of_discharge,
-                            tpa_name=row.get('tpa_name', '').strip(),
-                            parent_insurance=row.get('parent_insurance', '').strip(),
+                            tpa=tpa,
+                            insurer=insurer,
                             claim_id=row.get('claim_id', '').strip(),
                             uhid_ip_no=row.get('uhid_ip_no', '').strip(),
                             patient_name=row.get('patient_name', '').strip(),
@@ -101,6 +113,14 @@ class Command(BaseCommand):
             for error in errors[:10]:  # Show first 10 errors
                 self.stdout.write(f'  - {error}')
 
+    def canonical(self, model, name):
+        """Canonical TPA/insurer for a spelling in the CSV (None when blank)"""
+        cache = self.dimension_cache[model]
+        name = (name or '').strip()
+        if name not in cache:
+            cache[name] = model.objects.canonical(name)
+        return cache[name]
+
     def parse_date(self, date_str):
         """Parse date string in various formats"""
         if not date_str or date_str.strip() == '':
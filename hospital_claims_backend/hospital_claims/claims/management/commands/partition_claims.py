@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from claims.partitioning import (
+    INTERVALS, PartitioningError, convert_to_partitioned, detect_interval,
+    ensure_future_partitions, existing_partitions, is_partitioned,
+)
+
+
+class Command(BaseCommand):
+    help = 'Range-partition claims by discharge date (PostgreSQL) and keep future partitions created'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Rebuild the claims table as a partitioned table (locks the table while copying)'
+        )
+        parser.add_argument(
+            '--interval',
+            choices=INTERVALS,
+            default=settings.CLAIMS_PARTITION_INTERVAL,
+            help='Partition width used by --convert'
+        )
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=settings.CLAIMS_PARTITIONS_AHEAD,
+            help='Number of future partitions to keep created'
+        )
+        parser.add_argument(
+            '--keep-old',
+            action='store_true',
+            help='Keep the unpartitioned table as claims_claim_unpartitioned after --convert'
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='List the existing partitions'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options['convert']:
+                created = convert_to_partitioned(
+                    options['interval'], options['ahead'], keep_old=options['keep_old'], stdout=self.stdout
+                )
+                self.stdout.write(
+                    self.style.SUCCESS(f'Claims table partitioned by {options["interval"]} ({len(created)} partitions)')
+                )
+            elif not is_partitioned():
+                self.stdout.write('Claims table is not partitioned; nothing to do (use --convert to partition it)')
+                return
+            else:
+                interval = detect_interval() or options['interval']
+                created = ensure_future_partitions(interval, options['ahead'])
+                if created:
+                    self.stdout.write(self.style.SUCCESS(f'Created partitions: {", ".join(created)}'))
+                else:
+                    self.stdout.write(f'Partitions already exist {options["ahead"]} {interval}s ahead')
+        except PartitioningError as e:
+            raise CommandError(str(e))
+
+        if options['list']:
+            for name in existing_partitions():
+                self.stdout.write(f'  {name}')
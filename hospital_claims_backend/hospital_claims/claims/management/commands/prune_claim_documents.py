@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from claims.documents import prune_stored_files, prune_uploads
+
+
+class Command(BaseCommand):
+    help = 'Cancel abandoned resumable uploads and delete stored document files no document refers to'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=settings.CLAIM_DOCUMENT_UPLOAD_EXPIRY_HOURS,
+            help='Cancel uploads that received nothing for this many hours'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be removed'
+        )
+
+    def handle(self, *args, **options):
+        uploads = prune_uploads(hours=options['hours'], dry_run=options['dry_run'])
+        files, size = prune_stored_files(dry_run=options['dry_run'])
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(f'{verb} {uploads} abandoned uploads')
+        self.stdout.write(
+            self.style.SUCCESS(f'{verb} {files} unreferenced files ({size / (1024 * 1024):.1f} MB)')
+        )
@@ -0,0 +1,98 @@
+import csv
+import os
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from claims.audit import capture
+from claims.bank_reconciliation import StatementError, reconcile_statement
+
+
+class Command(BaseCommand):
+    help = 'Mark claims as verified in bank by matching a bank statement CSV (UTR, amount, date)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'statement_file',
+            type=str,
+            help='Path to the bank statement CSV file'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=Decimal,
+            default=Decimal('1.00'),
+            help='Largest amount difference (in rupees) still treated as a match'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report matches without updating any claims'
+        )
+        parser.add_argument(
+            '--unmatched-report',
+            type=str,
+            help='Write statement lines that matched no claim to this CSV file'
+        )
+
+    def handle(self, *args, **options):
+        statement_file = options['statement_file']
+
+        if not os.path.exists(statement_file):
+            raise CommandError(f'File "{statement_file}" does not exist')
+
+        started = time.perf_counter()
+        try:
+            with open(statement_file, 'r', encoding='utf-8-sig', newline='') as lines, \
+                    capture(source='reconcile_bank_statement'):
+                report = reconcile_statement(lines, tolerance=options['tolerance'], dry_run=options['dry_run'])
+        except StatementError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        matched = report['matched']
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Reconciled {report["statement_lines"]} statement lines in {elapsed:.2f}s'
+                f'{" (dry run)" if options["dry_run"] else ""}'
+            )
+        )
+        self.stdout.write(
+            f'Matched: {sum(matched.values())} '
+            f'(exact UTR {matched["exact_utr"]}, fuzzy UTR {matched["fuzzy_utr"]}, amount {matched["amount"]})'
+        )
+        self.stdout.write(f'Claims updated: {report["claims_updated"]}')
+        self.stdout.write(f'Amount mismatches: {len(report["amount_mismatches"])}')
+        self.stdout.write(f'Settlement date conflicts (kept): {len(report["settlement_date_conflicts"])}')
+        self.stdout.write(f'Duplicate UTRs in statement: {len(report["duplicate_utrs"])}')
+        self.stdout.write(f'Invalid lines: {len(report["invalid_lines"])}')
+        self.stdout.write(f'Unmatched lines: {report["unmatched_count"]}')
+
+        for mismatch in report['amount_mismatches'][:20]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'Line {mismatch["line"]}: UTR {mismatch["utr"]} amount {mismatch["amount"]} '
+                    f'does not match claim {mismatch["claim"]} ({mismatch["expected_amount"]})'
+                )
+            )
+
+        for conflict in report['settlement_date_conflicts'][:20]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'Line {conflict["line"]}: UTR {conflict["utr"]} dated {conflict["date"]}, but claim '
+                    f'{conflict["claim"]} records settlement on {conflict["settlement_date"]} (kept)'
+                )
+            )
+
+        if options['unmatched_report']:
+            with open(options['unmatched_report'], 'w', newline='') as report_file:
+                writer = csv.writer(report_file)
+                writer.writerow(['line', 'utr', 'amount', 'date', 'reason'])
+                for line in report['unmatched_lines']:
+                    writer.writerow([line['line'], line['utr'], line['amount'], line['date'], 'unmatched'])
+                for mismatch in report['amount_mismatches']:
+                    writer.writerow([mismatch['line'], mismatch['utr'], mismatch['amount'], mismatch['date'], 'amount_mismatch'])
+                for line in report['invalid_lines']:
+                    writer.writerow([line['line'], line['utr'], line['amount'], line['date'], 'invalid'])
+                for line in report['duplicate_utrs']:
+                    writer.writerow([line['line'], line['utr'], line['amount'], line['date'], 'duplicate_utr'])
+            self.stdout.write(f'Unmatched report written to {options["unmatched_report"]}')
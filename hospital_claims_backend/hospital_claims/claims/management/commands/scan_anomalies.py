@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from claims.anomalies import run_scan
+from claims.models import ClaimAnomaly
+
+
+class Command(BaseCommand):
+    help = 'Flag short/over settlements, out-of-band TDS and excess deductions on changed claims'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Re-evaluate every claim instead of only those changed since the last scan'
+        )
+
+    def handle(self, *args, **options):
+        scan = run_scan(full=options['full'], stdout=self.stdout)
+        elapsed = (scan.finished_at - scan.started_at).total_seconds()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Scanned {scan.claims_scanned} claims in {elapsed:.2f}s '
+                f'({"full" if scan.full_scan else "incremental"} scan)'
+            )
+        )
+        self.stdout.write(f'Open findings written: {scan.anomalies_open}')
+        self.stdout.write(f'Findings resolved: {scan.anomalies_resolved}')
+        self.stdout.write(f'Total open anomalies: {ClaimAnomaly.objects.filter(status="open").count()}')
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0008_remove_claim_approval_letter_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(condition=models.Q(('settlement_date__isnull', True)), fields=['date_of_discharge'], name='claim_unsettled_discharge_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0009_claim_unsettled_discharge_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalyScan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('watermark', models.DateTimeField(help_text='The next scan re-evaluates claims updated at or after this time')),
+                ('full_scan', models.BooleanField(default=False)),
+                ('claims_scanned', models.PositiveIntegerField(default=0)),
+                ('anomalies_open', models.PositiveIntegerField(default=0)),
+                ('anomalies_resolved', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClaimAnomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('short_settlement', 'Short Settlement'), ('over_settlement', 'Over Settlement'), ('tds_out_of_band', 'TDS Outside Expected Band'), ('deductions_exceed_approved', 'Deductions Exceed Approved Amount')], max_length=40)),
+                ('severity', models.PositiveSmallIntegerField(choices=[(1, 'Low'), (2, 'Medium'), (3, 'High')])),
+                ('status', models.CharField(choices=[('open', 'Open'), ('resolved', 'Resolved')], default='open', max_length=10)),
+                ('expected_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('actual_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('message', models.CharField(blank=True, max_length=255)),
+                ('detected_at', models.DateTimeField()),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('claim', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='claims.claim')),
+            ],
+            options={
+                'ordering': ['-severity', '-detected_at'],
+                'indexes': [models.Index(fields=['status', '-severity', '-detected_at'], name='claims_clai_status_77d3b1_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='claimanomaly',
+            constraint=models.UniqueConstraint(fields=('claim', 'kind'), name='unique_claim_anomaly_kind'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0010_claimanomaly_anomalyscan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateScan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('watermark', models.DateTimeField(help_text='The next scan re-keys claims updated at or after this time')),
+                ('full_scan', models.BooleanField(default=False)),
+                ('claims_scanned', models.PositiveIntegerField(default=0)),
+                ('pairs_found', models.PositiveIntegerField(default=0)),
+                ('pairs_removed', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClaimBlockKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField(db_index=True)),
+                ('claim', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='block_keys', to='claims.claim')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.DecimalField(decimal_places=3, max_digits=4)),
+                ('reasons', models.CharField(help_text='Comma-separated fields the two claims agree on', max_length=200)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('confirmed', 'Confirmed Duplicate'), ('dismissed', 'Not a Duplicate')], default='open', max_length=10)),
+                ('detected_at', models.DateTimeField()),
+                ('claim_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='claims.claim')),
+                ('claim_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='claims.claim')),
+            ],
+            options={
+                'ordering': ['-score', '-detected_at'],
+                'indexes': [models.Index(fields=['status', '-score'], name='claims_dupl_status_3babd2_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='duplicatecandidate',
+            constraint=models.UniqueConstraint(fields=('claim_a', 'claim_b'), name='unique_duplicate_pair'),
+        ),
+    ]
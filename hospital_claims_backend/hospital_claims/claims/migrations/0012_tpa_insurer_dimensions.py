@@ -0,0 +1,134 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:16
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# A copy of claims.models.alias_key as it was when this migration was written,
+# so later changes to the live helper do not change what this migration does
+NAME_NOISE_WORDS = {'the', 'ltd', 'limited', 'pvt', 'private', 'co', 'company', 'inc'}
+
+
+def alias_key(name):
+    words = re.sub(r'[^a-z0-9]+', ' ', (name or '').lower().replace('&', ' and ')).split()
+    return ' '.join(word for word in words if word not in NAME_NOISE_WORDS)
+
+
+def _canonical(model, alias_model, name):
+    key = alias_key(name)
+    alias = alias_model.objects.filter(key=key).select_related('target').first()
+    if alias is not None:
+        return alias.target
+    target, _ = model.objects.get_or_create(name=name)
+    alias_model.objects.create(key=key, target=target)
+    return target
+
+
+def backfill_dimensions(apps, schema_editor):
+    """One Tpa/Insurer per distinct spelling group, then one UPDATE per name"""
+    Claim = apps.get_model('claims', 'Claim')
+    dimensions = (
+        ('tpa_name', 'tpa_id', apps.get_model('claims', 'Tpa'), apps.get_model('claims', 'TpaAlias')),
+        ('parent_insurance', 'insurer_id', apps.get_model('claims', 'Insurer'), apps.get_model('claims', 'InsurerAlias')),
+    )
+    for name_field, fk_field, model, alias_model in dimensions:
+        names = Claim.objects.exclude(**{name_field: ''}).values_list(name_field, flat=True).order_by().distinct()
+        for name in sorted(set(names)):
+            cleaned = ' '.join(name.split())
+            if not alias_key(cleaned):
+                continue
+            target = _canonical(model, alias_model, cleaned)
+            Claim.objects.filter(**{name_field: name}).update(**{fk_field: target.pk})
+
+
+def restore_names(apps, schema_editor):
+    Claim = apps.get_model('claims', 'Claim')
+    for name_field, fk_field, model_name in (('tpa_name', 'tpa_id', 'Tpa'), ('parent_insurance', 'insurer_id', 'Insurer')):
+        for pk, name in apps.get_model('claims', model_name).objects.values_list('pk', 'name'):
+            Claim.objects.filter(**{fk_field: pk}).update(**{name_field: name})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0011_claimblockkey_duplicatecandidate_duplicatescan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Insurer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='InsurerAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'insurer aliases',
+            },
+        ),
+        migrations.CreateModel(
+            name='Tpa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+            ],
+            options={
+                'verbose_name': 'TPA',
+                'verbose_name_plural': 'TPAs',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TpaAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'TPA aliases',
+            },
+        ),
+        migrations.AddField(
+            model_name='tpaalias',
+            name='target',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='claims.tpa'),
+        ),
+        migrations.AddField(
+            model_name='insureralias',
+            name='target',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='claims.insurer'),
+        ),
+        migrations.AddField(
+            model_name='claim',
+            name='insurer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='claims', to='claims.insurer'),
+        ),
+        migrations.AddField(
+            model_name='claim',
+            name='tpa',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='claims', to='claims.tpa'),
+        ),
+        migrations.RunPython(backfill_dimensions, restore_names),
+        migrations.RemoveIndex(
+            model_name='claim',
+            name='claims_clai_tpa_nam_c69898_idx',
+        ),
+        migrations.RemoveField(
+            model_name='claim',
+            name='parent_insurance',
+        ),
+        migrations.RemoveField(
+            model_name='claim',
+            name='tpa_name',
+        ),
+    ]
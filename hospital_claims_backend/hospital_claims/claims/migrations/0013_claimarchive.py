@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0012_tpa_insurer_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.CharField(db_index=True, max_length=7)),
+                ('path', models.CharField(help_text='Relative to CLAIMS_ARCHIVE_DIR', max_length=500, unique=True)),
+                ('row_count', models.PositiveIntegerField()),
+                ('size_bytes', models.BigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('archived_before', models.DateField(help_text='Cutoff the claims were settled before')),
+                ('first_claim_id', models.IntegerField()),
+                ('last_claim_id', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['month', 'created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ClaimArchiveTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('claim_count', models.PositiveIntegerField()),
+                ('bill_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('approved_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_settled_amount', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('tds', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('consumable_deduction', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('paid_by_patient', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('deductions', models.DecimalField(decimal_places=2, default=0, help_text='MOU, co-pay, consumable, hospital and other deductions', max_digits=15)),
+                ('archive', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totals', to='claims.claimarchive')),
+                ('insurer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='claims.insurer')),
+            ],
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:31
+
+from django.db import migrations, models
+
+
+def backfill_status(apps, schema_editor):
+    # claims.models.claim_status_expression as it was when this migration was written
+    status = models.Case(
+        models.When(settlement_date__isnull=False, receipt_verified_bank=True, then=models.Value('closed')),
+        models.When(settlement_date__isnull=False, then=models.Value('settled_unverified')),
+        models.When(
+            query_on_claim_uploaded=True, query_reply_uploaded=False, query_reply_date__isnull=True,
+            then=models.Value('query_pending'),
+        ),
+        models.When(physical_file_dispatch='pending', then=models.Value('awaiting_dispatch')),
+        models.When(approved_amount__gt=0, then=models.Value('approved_unsettled')),
+        default=models.Value('submitted'),
+        output_field=models.CharField(),
+    )
+    apps.get_model('claims', 'Claim').objects.update(status=status)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0014_claimchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='claim',
+            name='status',
+            field=models.CharField(choices=[('submitted', 'Submitted'), ('awaiting_dispatch', 'Awaiting Physical File Dispatch'), ('query_pending', 'Query Raised, Reply Pending'), ('approved_unsettled', 'Approved, Not Settled'), ('settled_unverified', 'Settled, Bank Not Verified'), ('closed', 'Settled and Verified')], default='submitted', editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(condition=models.Q(('status', 'submitted')), fields=['date_of_discharge', 'id'], name='claim_q_submitted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(condition=models.Q(('status', 'awaiting_dispatch')), fields=['date_of_discharge', 'id'], name='claim_q_awaiting_dispatch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(condition=models.Q(('status', 'query_pending')), fields=['date_of_discharge', 'id'], name='claim_q_query_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(condition=models.Q(('status', 'approved_unsettled')), fields=['date_of_discharge', 'id'], name='claim_q_approved_unsettled_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(condition=models.Q(('status', 'settled_unverified')), fields=['date_of_discharge', 'id'], name='claim_q_settled_unverified_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('claims', '0017_documentpreview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.CharField(max_length=7, unique=True)),
+                ('content_hash', models.CharField(blank=True, help_text="SHA-256 of the month's claims CSV", max_length=64)),
+                ('claim_count', models.PositiveIntegerField(default=0)),
+                ('summary', models.JSONField(default=dict)),
+                ('tpa_breakdown', models.JSONField(default=list)),
+                ('csv_size', models.BigIntegerField(default=0)),
+                ('xlsx_size', models.BigIntegerField(blank=True, help_text='Empty when XlsxWriter is not installed', null=True)),
+                ('stale', models.BooleanField(default=True, help_text='A claim of the month changed since it was generated')),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+                ('generated_at', models.DateTimeField(blank=True, null=True)),
+                ('generation_ms', models.PositiveIntegerField(default=0)),
+                ('generations', models.PositiveIntegerField(default=0, help_text='Times the content changed and files were written')),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-month'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 06:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0018_monthsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monthsnapshot',
+            name='change_version',
+            field=models.PositiveIntegerField(default=0, help_text='Bumped by every change to a claim of the month'),
+        ),
+    ]
@@ -1,12 +1,211 @@
 import os
-from django.db import models
+import re
+import uuid
+from django.conf import settings
+from collections import defaultdict
+from datetime import timedelta
+from functools import partial
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, router, transaction
 from django.core.validators import MinValueValidator
 from decimal import Decimal
+from django.utils import timezone
 
 def claim_file_upload_path(instance, filename):
     """Generate upload path for claim files"""
     return f'uploads/claims/{instance.claim_id}/{filename}'
 
+# Words dropped when matching TPA/insurer spellings, e.g. "Pvt. Ltd."
+NAME_NOISE_WORDS = {'the', 'ltd', 'limited', 'pvt', 'private', 'co', 'company', 'inc'}
+
+def alias_key(name):
+    """Spelling-insensitive lookup key for a TPA or insurer name"""
+    words = re.sub(r'[^a-z0-9]+', ' ', (name or '').lower().replace('&', ' and ')).split()
+    return ' '.join(word for word in words if word not in NAME_NOISE_WORDS)
+
+class DimensionManager(models.Manager):
+    def _alias_model(self):
+        return self.model._meta.get_field('aliases').related_model
+    
+    def find(self, name):
+        """The row an existing spelling refers to, or None"""
+        key = alias_key(name)
+        if not key:
+            return None
+        alias = self._alias_model().objects.select_related('target').filter(key=key).first()
+        return alias.target if alias else None
+    
+    def names(self):
+        """id -> name for the whole (small) table"""
+        return dict(self.values_list('id', 'name'))
+    
+    def canonical(self, name):
+        """The row a free-text name refers to, created with its alias if new; None for blank"""
+        name = ' '.join((name or '').split())
+        found = self.find(name)
+        if found is not None or not alias_key(name):
+            return found
+        with transaction.atomic():
+            target, _ = self.get_or_create(name=name)
+            self._alias_model().objects.get_or_create(key=alias_key(name), defaults={'target': target})
+        return target
+
+class Tpa(models.Model):
+    """Third-party administrator; claims reference it instead of repeating the name"""
+    name = models.CharField(max_length=200, unique=True)
+    
+    objects = DimensionManager()
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'TPA'
+        verbose_name_plural = 'TPAs'
+    
+    def __str__(self):
+        return self.name
+
+class Insurer(models.Model):
+    """Parent insurance company"""
+    name = models.CharField(max_length=200, unique=True)
+    
+    objects = DimensionManager()
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+class TpaAlias(models.Model):
+    """A spelling of a TPA name (as alias_key) and the TPA it means"""
+    key = models.CharField(max_length=200, unique=True)
+    target = models.ForeignKey(Tpa, on_delete=models.CASCADE, related_name='aliases')
+    
+    class Meta:
+        verbose_name_plural = 'TPA aliases'
+    
+    def __str__(self):
+        return f"{self.key} -> {self.target}"
+
+class InsurerAlias(models.Model):
+    """A spelling of an insurer name (as alias_key) and the insurer it means"""
+    key = models.CharField(max_length=200, unique=True)
+    target = models.ForeignKey(Insurer, on_delete=models.CASCADE, related_name='aliases')
+    
+    class Meta:
+        verbose_name_plural = 'insurer aliases'
+    
+    def __str__(self):
+        return f"{self.key} -> {self.target}"
+
+CLAIM_STATUS_CHOICES = [
+    ('submitted', 'Submitted'),
+    ('awaiting_dispatch', 'Awaiting Physical File Dispatch'),
+    ('query_pending', 'Query Raised, Reply Pending'),
+    ('approved_unsettled', 'Approved, Not Settled'),
+    ('settled_unverified', 'Settled, Bank Not Verified'),
+    ('closed', 'Settled and Verified'),
+]
+CLAIM_STATUS_LABELS = dict(CLAIM_STATUS_CHOICES)
+# Work queues; each has its own partial index
+OPEN_CLAIM_STATUSES = ('submitted', 'awaiting_dispatch', 'query_pending', 'approved_unsettled', 'settled_unverified')
+# A settlement is never taken back, and a bank-verified one is final
+CLAIM_STATUS_TRANSITIONS = {
+    **{status: set(CLAIM_STATUS_LABELS) for status in OPEN_CLAIM_STATUSES},
+    'settled_unverified': {'settled_unverified', 'closed'},
+    'closed': {'closed'},
+}
+# Fields the lifecycle status is derived from
+STATUS_FIELDS = {
+    'settlement_date', 'receipt_verified_bank', 'query_on_claim_uploaded', 'query_reply_uploaded',
+    'query_reply_date', 'physical_file_dispatch', 'approved_amount',
+}
+
+# Incremental scans re-read claims changed this long before their watermark: a
+# save stamped just before it may commit only after the scan has read the table
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+class InvalidStatusTransition(ValidationError):
+    pass
+
+def claim_status_expression():
+    """SQL version of Claim.derive_status(), for queryset updates and the backfill"""
+    return models.Case(
+        models.When(settlement_date__isnull=False, receipt_verified_bank=True, then=models.Value('closed')),
+        models.When(settlement_date__isnull=False, then=models.Value('settled_unverified')),
+        models.When(
+            query_on_claim_uploaded=True, query_reply_uploaded=False, query_reply_date__isnull=True,
+            then=models.Value('query_pending'),
+        ),
+        models.When(physical_file_dispatch='pending', then=models.Value('awaiting_dispatch')),
+        models.When(approved_amount__gt=0, then=models.Value('approved_unsettled')),
+        default=models.Value('submitted'),
+        output_field=models.CharField(),
+    )
+
+def check_status_transition(old, new, claim, reopen=False):
+    """Raise InvalidStatusTransition for a move the table forbids, unless it is a reopen (a manager's correction)"""
+    if not reopen and new not in CLAIM_STATUS_TRANSITIONS[old]:
+        raise InvalidStatusTransition(
+            f"Claim {claim} cannot move from {CLAIM_STATUS_LABELS[old]} to {CLAIM_STATUS_LABELS[new]}"
+        )
+
+class ClaimQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        if 'status' in kwargs:
+            raise InvalidStatusTransition('The claim status follows the claim fields and cannot be set directly')
+        return self._update_claims(kwargs)
+    
+    def _update_status(self, status):
+        """Store a derived status (a claim_status_expression() or one its rules produced) without the check"""
+        return self._update_claims({'status': status})
+    
+    def _update_claims(self, kwargs):
+        # Queryset updates skip save(), so the change history reads the rows around them
+        from .audit import audited_update
+        from .lag_stats import bump_month_version
+        from .month_close import mark_stale
+        # auto_now only applies in save(); incremental scans find changed claims by updated_at
+        kwargs.setdefault('updated_at', timezone.now())
+        update = lambda: audited_update(self, kwargs, lambda: super(ClaimQuerySet, self).update(**kwargs))
+        
+        using = self._db or router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            # ...and its signals, so the months whose cached statistics and snapshots change are collected here
+            months = set(self.using(using).order_by().values_list('month', flat=True).distinct())
+            if isinstance(kwargs.get('month'), str):
+                months.add(kwargs['month'])
+            if not STATUS_FIELDS.intersection(kwargs):
+                count = update()
+            else:
+                # The status follows the new values, so recompute it for the same rows afterwards
+                previous = dict(self.using(using).values_list('pk', 'status'))
+                count = update()
+                self.model.objects.using(using).refresh_status(previous)
+            if count:
+                mark_stale(*months)
+                transaction.on_commit(partial(bump_month_version, *months), using=using)
+        return count
+    
+    def refresh_status(self, previous):
+        """Re-derive the status of {pk: old status} rows; raises InvalidStatusTransition"""
+        ids = list(previous)
+        changed = defaultdict(list)
+        for start in range(0, len(ids), 900):
+            rows = (
+                self.filter(pk__in=ids[start:start + 900])
+                .annotate(derived_status=claim_status_expression())
+                .values_list('pk', 'derived_status')
+            )
+            for pk, status in rows:
+                check_status_transition(previous[pk], status, pk)
+                if status != previous[pk]:
+                    changed[status].append(pk)
+        for status, pks in changed.items():
+            for start in range(0, len(pks), 900):
+                self.filter(pk__in=pks[start:start + 900])._update_status(status)
+
 class Claim(models.Model):
     PHYSICAL_FILE_DISPATCH_CHOICES = [
         ('pending', 'Pending'),
@@ -14,10 +213,12 @@ class Claim(models.Model):
         ('received', 'Received'),
         ('not_required', 'Not Required'),
     ]
+    STATUS_CHOICES = CLAIM_STATUS_CHOICES
     
     # Auto-generated fields
     id = models.AutoField(primary_key=True)
     month = models.CharField(max_length=7, editable=False, null=True, blank=True)  # YYYY-MM format, auto from discharge date
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='submitted', editable=False)  # derived on save
     
     # Date fields
     date_of_admission = models.DateField(null=True, blank=True)
@@ -26,8 +227,8 @@ class Claim(models.Model):
     settlement_date = models.DateField(null=True, blank=True)
     
     # Basic claim info
-    tpa_name = models.CharField(max_length=200, blank=True)
-    parent_insurance = models.CharField(max_length=200, blank=True)
+    tpa = models.ForeignKey(Tpa, on_delete=models.PROTECT, null=True, blank=True, related_name='claims')
+    insurer = models.ForeignKey(Insurer, on_delete=models.PROTECT, null=True, blank=True, related_name='claims')
     claim_id = models.CharField(max_length=100, blank=True, null=True)
     uhid_ip_no = models.CharField(max_length=100, blank=True)
     patient_name = models.CharField(max_length=200, blank=True)
@@ -64,18 +265,77 @@ class Claim(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ClaimQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['claim_id']),
             models.Index(fields=['patient_name']),
             models.Index(fields=['month']),
-            models.Index(fields=['tpa_name']),
             models.Index(fields=['settlement_date']),
             models.Index(fields=['utr_number']),
+            # Receivables ageing only reads unsettled claims
+            models.Index(
+                fields=['date_of_discharge'],
+                name='claim_unsettled_discharge_idx',
+                condition=models.Q(settlement_date__isnull=True),
+            ),
+            # One small index per work queue, in queue order
+            *[
+                models.Index(
+                    fields=['date_of_discharge', 'id'],
+                    name=f'claim_q_{status}_idx',
+                    condition=models.Q(status=status),
+                )
+                for status in OPEN_CLAIM_STATUSES
+            ],
         ]
     
-    def save(self, *args, **kwargs):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Loaded values for the change history; deferred fields are left out and not compared
+        instance._audit_snapshot = {
+            name: instance.__dict__[name] for name in CLAIM_AUDIT_FIELDS if name in instance.__dict__
+        }
+        return instance
+    
+    # The API and imports deal in names; they are resolved to rows on save
+    @property
+    def tpa_name(self):
+        if '_tpa_name' in self.__dict__:
+            return self._tpa_name
+        return self.tpa.name if self.tpa_id else ''
+    
+    @tpa_name.setter
+    def tpa_name(self, value):
+        self._tpa_name = (value or '').strip()
+    
+    @property
+    def parent_insurance(self):
+        if '_parent_insurance' in self.__dict__:
+            return self._parent_insurance
+        return self.insurer.name if self.insurer_id else ''
+    
+    @parent_insurance.setter
+    def parent_insurance(self, value):
+        self._parent_insurance = (value or '').strip()
+    
+    def save(self, *args, reopen=False, **kwargs):
+        """
+        Derive month, difference_amount and status, then save. A save that would
+        take back a settlement or a bank verification raises InvalidStatusTransition
+        unless ``reopen`` is set (a manager's correction, kept in the change history).
+        """
+        if '_tpa_name' in self.__dict__:
+            self.tpa = Tpa.objects.canonical(self.__dict__.pop('_tpa_name'))
+        if '_parent_insurance' in self.__dict__:
+            self.insurer = Insurer.objects.canonical(self.__dict__.pop('_parent_insurance'))
+        
+        # Remember the stored month so signal handlers can invalidate it too
+        self._previous_month = self.month
+        
         # Auto-generate month from discharge date
         if self.date_of_discharge:
             self.month = self.date_of_discharge.strftime('%Y-%m')
@@ -92,7 +352,324 @@ class Claim(models.Model):
         
         self.difference_amount = bill - (settled + tds + patient_paid + mou_discount)
         
+        status = self.derive_status()
+        if not self._state.adding:
+            check_status_transition(self.status, status, self.pk, reopen=reopen)
+        self.status = status
+        
         super().save(*args, **kwargs)
     
+    def derive_status(self):
+        """Lifecycle status implied by the current field values (see claim_status_expression)"""
+        if self.settlement_date:
+            return 'closed' if self.receipt_verified_bank else 'settled_unverified'
+        if self.query_on_claim_uploaded and not self.query_reply_uploaded and not self.query_reply_date:
+            return 'query_pending'
+        if self.physical_file_dispatch == 'pending':
+            return 'awaiting_dispatch'
+        if self.approved_amount and self.approved_amount > 0:
+            return 'approved_unsettled'
+        return 'submitted'
+    
+    def __str__(self):
+        return f"{self.claim_id} - {self.patient_name}"
+
+# Fields whose changes are recorded in ClaimChange; month and timestamps follow from them
+CLAIM_AUDIT_FIELDS = tuple(
+    field.attname for field in Claim._meta.concrete_fields
+    if field.attname not in ('id', 'month', 'created_at', 'updated_at')
+)
+
+
+class ClaimAnomaly(models.Model):
+    """A reconciliation finding on a claim, maintained by the anomaly scanner"""
+    KIND_CHOICES = [
+        ('short_settlement', 'Short Settlement'),
+        ('over_settlement', 'Over Settlement'),
+        ('tds_out_of_band', 'TDS Outside Expected Band'),
+        ('deductions_exceed_approved', 'Deductions Exceed Approved Amount'),
+    ]
+    SEVERITY_LOW = 1
+    SEVERITY_MEDIUM = 2
+    SEVERITY_HIGH = 3
+    SEVERITY_CHOICES = [
+        (SEVERITY_LOW, 'Low'),
+        (SEVERITY_MEDIUM, 'Medium'),
+        (SEVERITY_HIGH, 'High'),
+    ]
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('resolved', 'Resolved'),
+    ]
+    
+    claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='anomalies')
+    kind = models.CharField(max_length=40, choices=KIND_CHOICES)
+    severity = models.PositiveSmallIntegerField(choices=SEVERITY_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    expected_amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    actual_amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    message = models.CharField(max_length=255, blank=True)
+    detected_at = models.DateTimeField()
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-severity', '-detected_at']
+        constraints = [
+            models.UniqueConstraint(fields=['claim', 'kind'], name='unique_claim_anomaly_kind'),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-severity', '-detected_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.claim_id} - {self.get_kind_display()} ({self.get_severity_display()})"
+
+
+class AnomalyScan(models.Model):
+    """One run of the anomaly scanner; the latest watermark bounds the next run"""
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    watermark = models.DateTimeField(help_text="The next scan re-evaluates claims updated at or after this time")
+    full_scan = models.BooleanField(default=False)
+    claims_scanned = models.PositiveIntegerField(default=0)
+    anomalies_open = models.PositiveIntegerField(default=0)
+    anomalies_resolved = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"Scan at {self.started_at:%Y-%m-%d %H:%M} ({self.claims_scanned} claims)"
+
+
+class ClaimBlockKey(models.Model):
+    """Hashed blocking key of a claim; duplicates are only looked for within a key"""
+    claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='block_keys')
+    key = models.BigIntegerField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.claim_id} - {self.key}"
+
+
+class DuplicateCandidate(models.Model):
+    """A pair of claims that look like the same admission (claim_a has the lower id)"""
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('confirmed', 'Confirmed Duplicate'),
+        ('dismissed', 'Not a Duplicate'),
+    ]
+    
+    claim_a = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='+')
+    claim_b = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='+')
+    score = models.DecimalField(max_digits=4, decimal_places=3)
+    reasons = models.CharField(max_length=200, help_text="Comma-separated fields the two claims agree on")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    detected_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-score', '-detected_at']
+        constraints = [
+            models.UniqueConstraint(fields=['claim_a', 'claim_b'], name='unique_duplicate_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.claim_a_id} ~ {self.claim_b_id} ({self.score})"
+
+
+class DuplicateScan(models.Model):
+    """One run of the duplicate finder; the latest watermark bounds the next run"""
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    watermark = models.DateTimeField(help_text="The next scan re-keys claims updated at or after this time")
+    full_scan = models.BooleanField(default=False)
+    claims_scanned = models.PositiveIntegerField(default=0)
+    pairs_found = models.PositiveIntegerField(default=0)
+    pairs_removed = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"Duplicate scan at {self.started_at:%Y-%m-%d %H:%M} ({self.claims_scanned} claims)"
+
+
+class ClaimArchive(models.Model):
+    """One columnar file of archived claims for a discharge month"""
+    month = models.CharField(max_length=7, db_index=True)
+    path = models.CharField(max_length=500, unique=True, help_text="Relative to CLAIMS_ARCHIVE_DIR")
+    row_count = models.PositiveIntegerField()
+    size_bytes = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    archived_before = models.DateField(help_text="Cutoff the claims were settled before")
+    first_claim_id = models.IntegerField()
+    last_claim_id = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['month', 'created_at']
+    
+    def __str__(self):
+        return f"{self.month}: {self.row_count} claims ({self.path})"
+
+
+class ClaimArchiveTotal(models.Model):
+    """Totals of an archive file per insurer, so dashboards can include archived claims without reading files"""
+    archive = models.ForeignKey(ClaimArchive, on_delete=models.CASCADE, related_name='totals')
+    insurer = models.ForeignKey(Insurer, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    claim_count = models.PositiveIntegerField()
+    bill_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    approved_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    total_settled_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    tds = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    consumable_deduction = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    paid_by_patient = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    deductions = models.DecimalField(max_digits=15, decimal_places=2, default=0, help_text="MOU, co-pay, consumable, hospital and other deductions")
+    
+    def __str__(self):
+        return f"{self.archive.month} / {self.insurer or 'No insurer'}: {self.claim_count} claims"
+
+
+
+class ClaimChange(models.Model):
+    """Field-level history entry of a claim: {field: [old, new]} for one save, update or delete"""
+    ACTION_CHOICES = [
+        ('create', 'Created'),
+        ('update', 'Updated'),
+        ('delete', 'Deleted'),
+    ]
+    
+    # Not a foreign key: the history outlives deleted and archived claims
+    claim_id = models.IntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changes = models.JSONField(encoder=DjangoJSONEncoder)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    source = models.CharField(max_length=200, blank=True, help_text="Request or command that made the change")
+    changed_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-changed_at', '-id']
+        indexes = [
+            models.Index(fields=['claim_id', '-changed_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.claim_id} {self.action} at {self.changed_at:%Y-%m-%d %H:%M}"
+
+
+# Document kinds and the claim flag each one sets when it arrives
+DOCUMENT_KIND_FLAGS = {
+    'approval_letter': 'approval_letter_uploaded',
+    'physical_file': 'physical_file_uploaded',
+    'query_on_claim': 'query_on_claim_uploaded',
+    'query_reply': 'query_reply_uploaded',
+    'other': None,
+}
+
+class ClaimDocument(models.Model):
+    """A file attached to a claim; the bytes are stored once per SHA-256 under CLAIM_DOCUMENTS_DIR"""
+    KIND_CHOICES = [
+        ('approval_letter', 'Approval Letter'),
+        ('physical_file', 'Physical File'),
+        ('query_on_claim', 'Query on Claim'),
+        ('query_reply', 'Query Reply'),
+        ('other', 'Other'),
+    ]
+    
+    # No database constraint (the claims table may be partitioned) and no cascade:
+    # like the change history, documents outlive deleted and archived claims
+    claim = models.ForeignKey(
+        Claim, on_delete=models.DO_NOTHING, db_constraint=False, related_name='documents'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    original_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, db_index=True)
+    uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-uploaded_at', '-id']
+        indexes = [
+            models.Index(fields=['claim', 'kind']),
+        ]
+    
+    def __str__(self):
+        return f"{self.claim_id} {self.kind}: {self.original_name}"
+
+
+class DocumentUpload(models.Model):
+    """A resumable upload in progress; the bytes received so far sit in a part file"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    claim = models.ForeignKey(
+        Claim, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    kind = models.CharField(max_length=20, choices=ClaimDocument.KIND_CHOICES)
+    original_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.BigIntegerField(help_text="Total size declared when the upload started")
+    offset = models.BigIntegerField(default=0, help_text="Bytes received so far")
+    sha256 = models.CharField(max_length=64, blank=True, help_text="Expected hash, checked on completion if given")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.original_name}: {self.offset}/{self.size} bytes"
+
+
+class DocumentPreview(models.Model):
+    """Thumbnail and preview rendering of one stored file, shared by every document with its hash"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('unsupported', 'Unsupported'),
+        ('failed', 'Failed'),
+    ]
+    
+    sha256 = models.CharField(max_length=64, unique=True)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='pending')
+    source_type = models.CharField(max_length=10, blank=True, help_text="pdf or image")
+    width = models.PositiveIntegerField(null=True, blank=True, help_text="Of the rendered first page or image")
+    height = models.PositiveIntegerField(null=True, blank=True)
+    queued_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    wait_ms = models.PositiveIntegerField(null=True, blank=True, help_text="From queued to started")
+    render_ms = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'queued_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.sha256[:12]}: {self.status}"
+
+
+class MonthSnapshot(models.Model):
+    """Frozen reports of a closed discharge month; the files are named by the CSV's SHA-256"""
+    month = models.CharField(max_length=7, unique=True)
+    content_hash = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the month's claims CSV")
+    claim_count = models.PositiveIntegerField(default=0)
+    summary = models.JSONField(default=dict)
+    tpa_breakdown = models.JSONField(default=list)
+    csv_size = models.BigIntegerField(default=0)
+    xlsx_size = models.BigIntegerField(null=True, blank=True, help_text="Empty when XlsxWriter is not installed")
+    stale = models.BooleanField(default=True, help_text="A claim of the month changed since it was generated")
+    change_version = models.PositiveIntegerField(default=0, help_text="Bumped by every change to a claim of the month")
+    closed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    closed_at = models.DateTimeField(auto_now_add=True)
+    generated_at = models.DateTimeField(null=True, blank=True)
+    generation_ms = models.PositiveIntegerField(default=0)
+    generations = models.PositiveIntegerField(default=0, help_text="Times the content changed and files were written")
+    
+    class Meta:
+        ordering = ['-month']
+    
     def __str__(self):
-        return f"{self.claim_id} - {self.patient_name}"
\ No newline at end of file
+        return f"{self.month}: {self.claim_count} claims{' (stale)' if self.stale else ''}"
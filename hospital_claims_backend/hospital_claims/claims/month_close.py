@@ -0,0 +1,267 @@
+"""
+Month-close snapshots of the claims reports.
+
+Closing a discharge month (``manage.py close_month`` or the months API)
+freezes its reports into a ``MonthSnapshot``: the summary figures and the
+per-TPA breakdown as JSON, and the month's claims as CSV and XLSX files under
+``snapshots/<month>/`` in the document store, named by the SHA-256 of the CSV.
+Requests for a closed month are served from the snapshot, so the month-end
+rush of identical downloads reads nothing from the claims table.
+
+Saving, deleting or queryset-updating a claim of a closed month marks its
+snapshot stale, and once the change commits a background thread of the
+process regenerates it. Every change also bumps ``change_version``, and a
+regeneration only clears the flag if the version it started from is still
+current, so a change it could not see leaves the snapshot stale. A snapshot still stale when it is requested is
+regenerated first, under a row lock, so concurrent requests wait for one
+regeneration rather than each computing it. When the content hash comes out unchanged the files are kept.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .documents import hash_file, stored_file_response
+from .exports import XLSX_CONTENT_TYPE, write_claims_csv, write_claims_xlsx, xlsxwriter_available
+from .models import Claim, MonthSnapshot
+from .partitioning import month_range
+
+logger = logging.getLogger(__name__)
+
+MONTH_RE = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+# Same order as the claims list
+ORDERING = ('-created_at', '-id')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': XLSX_CONTENT_TYPE,
+}
+
+_lock = threading.Lock()
+_executor = None
+_queued = set()
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def check_month(month):
+    """Raise SnapshotError unless ``month`` is a YYYY-MM month that has ended"""
+    if not month or not MONTH_RE.match(month):
+        raise SnapshotError('month must be YYYY-MM')
+    if month >= f'{timezone.localdate():%Y-%m}':
+        raise SnapshotError(f'{month} has not ended yet, so it cannot be closed')
+
+
+def snapshot_path(month, content_hash, extension):
+    return os.path.join(settings.CLAIM_DOCUMENTS_DIR, 'snapshots', month, f'{content_hash}.{extension}')
+
+
+def month_claims(month):
+    start, end = month_range(month)
+    # Discharge date bounds let a partitioned claims table skip other months
+    return Claim.objects.filter(month=month, date_of_discharge__gte=start, date_of_discharge__lt=end)
+
+
+def _float(value):
+    return float(value or 0)
+
+
+def _reports(claims):
+    """(summary, per-TPA breakdown) from one read grouped by TPA"""
+    rows = list(
+        claims.values('tpa', 'tpa__name').annotate(
+            claim_count=Count('id'),
+            settled_claims=Count('id', filter=Q(settlement_date__isnull=False)),
+            total_bill=Sum('bill_amount'),
+            total_approved=Sum('approved_amount'),
+            total_settled=Sum('total_settled_amount'),
+            total_tds=Sum('tds'),
+            total_consumables=Sum('consumable_deduction'),
+            total_paid_by_patient=Sum('paid_by_patient'),
+            total_difference=Sum('difference_amount'),
+        ).order_by()
+    )
+    totals = defaultdict(int)
+    for row in rows:
+        for key, value in row.items():
+            if key not in ('tpa', 'tpa__name'):
+                totals[key] += value or 0
+    summary = {
+        'claimCount': totals['claim_count'],
+        'settledClaims': totals['settled_claims'],
+        'pendingClaims': totals['claim_count'] - totals['settled_claims'],
+        'totalBillAmount': _float(totals['total_bill']),
+        'totalApprovedAmount': _float(totals['total_approved']),
+        'totalSettledAmount': _float(totals['total_settled']),
+        'totalTds': _float(totals['total_tds']),
+        'totalConsumables': _float(totals['total_consumables']),
+        'totalPaidByPatients': _float(totals['total_paid_by_patient']),
+        'totalDifference': _float(totals['total_difference']),
+    }
+    breakdown = sorted((
+        {
+            'name': row['tpa__name'] or 'Unknown TPA',
+            'claim_count': row['claim_count'],
+            'settled_claims': row['settled_claims'],
+            'total_bill': _float(row['total_bill']),
+            'total_approved': _float(row['total_approved']),
+            'total_settled': _float(row['total_settled']),
+            'total_tds': _float(row['total_tds']),
+        }
+        for row in rows
+    ), key=lambda row: (-row['total_approved'], row['name']))
+    return summary, breakdown
+
+
+def _remove_files(month, keep):
+    directory = os.path.dirname(snapshot_path(month, keep, 'csv'))
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        # Dot files are temporaries of a regeneration in progress
+        if not name.startswith((keep, '.')):
+            os.remove(os.path.join(directory, name))
+
+
+def build(month, user=None, force=False):
+    """Generate (or confirm) the month's snapshot; returns (snapshot, whether new files were written)"""
+    check_month(month)
+    started = time.perf_counter()
+    directory = os.path.dirname(snapshot_path(month, 'x', 'csv'))
+    os.makedirs(directory, exist_ok=True)
+    temporary = os.path.join(directory, f'.{os.getpid()}-{threading.get_ident()}.tmp')
+
+    with transaction.atomic():
+        snapshot, _ = MonthSnapshot.objects.get_or_create(month=month, defaults={'closed_by': user})
+        # Waits for a regeneration already running; claim saves marking it stale wait for this one
+        snapshot = MonthSnapshot.objects.select_for_update().get(pk=snapshot.pk)
+        # Read before the claims: a change after this point bumps it, and the flag stays set
+        version = snapshot.change_version
+        claims = month_claims(month).order_by(*ORDERING)
+        try:
+            with open(temporary, 'wb') as f:
+                count = write_claims_csv(claims, f)
+            content_hash = hash_file(temporary)
+            csv_path = snapshot_path(month, content_hash, 'csv')
+            unchanged = (
+                content_hash == snapshot.content_hash and os.path.exists(csv_path)
+                and (snapshot.xlsx_size is None or os.path.exists(snapshot_path(month, content_hash, 'xlsx')))
+            )
+            if unchanged and not force:
+                os.remove(temporary)
+                _clear_stale(snapshot, version)
+                return snapshot, False
+
+            os.replace(temporary, csv_path)
+            snapshot.xlsx_size = None
+            if xlsxwriter_available():
+                xlsx_path = snapshot_path(month, content_hash, 'xlsx')
+                write_claims_xlsx(claims, temporary)
+                os.replace(temporary, xlsx_path)
+                snapshot.xlsx_size = os.path.getsize(xlsx_path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+        snapshot.summary, snapshot.tpa_breakdown = _reports(month_claims(month))
+        snapshot.content_hash = content_hash
+        snapshot.claim_count = count
+        snapshot.csv_size = os.path.getsize(csv_path)
+        snapshot.generated_at = timezone.now()
+        snapshot.generation_ms = int((time.perf_counter() - started) * 1000)
+        snapshot.generations = models.F('generations') + 1
+        if user is not None and snapshot.closed_by_id is None:
+            snapshot.closed_by = user
+        snapshot.save(update_fields=[
+            'summary', 'tpa_breakdown', 'content_hash', 'claim_count', 'csv_size', 'xlsx_size',
+            'generated_at', 'generation_ms', 'generations', 'closed_by',
+        ])
+        _clear_stale(snapshot, version)
+        # Files of the previous content go once nothing can roll back to them
+        transaction.on_commit(partial(_remove_files, month, content_hash))
+    snapshot.refresh_from_db()
+    return snapshot, True
+
+
+def _clear_stale(snapshot, version):
+    """Clear the stale flag unless a claim changed after ``version`` was read"""
+    snapshot.stale = not MonthSnapshot.objects.filter(pk=snapshot.pk, change_version=version).update(stale=False)
+
+
+def fresh_snapshot(month):
+    """The month's snapshot, regenerated first if a claim changed since; None when the month is not closed"""
+    snapshot = MonthSnapshot.objects.filter(month=month).first()
+    if snapshot is not None and snapshot.stale:
+        snapshot, _ = build(month)
+    return snapshot
+
+
+def _refresh(month):
+    # Dropped before building, so a change committed during this run queues another
+    with _lock:
+        _queued.discard(month)
+    try:
+        if MonthSnapshot.objects.filter(month=month, stale=True).exists():
+            build(month)
+    except Exception:
+        logger.exception('Regenerating the %s snapshot failed; it stays stale', month)
+    finally:
+        # Connections are per thread, and this thread outlives the task
+        connections.close_all()
+
+
+def _refresh_later(month):
+    global _executor
+    with _lock:
+        if month in _queued:
+            return
+        _queued.add(month)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='month-snapshots')
+    _executor.submit(_refresh, month)
+
+
+def mark_stale(*months):
+    """Flag the snapshots of closed months whose claims changed; regenerated after the change commits"""
+    for month in {month for month in months if month}:
+        # Always written, even when already stale, so a regeneration in progress sees the change
+        changed = MonthSnapshot.objects.filter(month=month).update(
+            stale=True, change_version=F('change_version') + 1
+        )
+        # A bulk edit queues one regeneration: _refresh_later skips a month already waiting
+        if changed and settings.CLAIM_SNAPSHOT_BACKGROUND_REFRESH:
+            transaction.on_commit(partial(_refresh_later, month))
+
+
+def refresh_stale(stdout=None):
+    """Regenerate every stale snapshot; returns the snapshots that got new files"""
+    changed = []
+    for month in MonthSnapshot.objects.filter(stale=True).order_by('month').values_list('month', flat=True):
+        snapshot, written = build(month)
+        if written:
+            changed.append(snapshot)
+        if stdout:
+            stdout.write(f'{month}: {"regenerated" if written else "unchanged"} ({snapshot.claim_count} claims)')
+    return changed
+
+
+def file_response(request, snapshot, extension):
+    """The snapshot's CSV or XLSX file, with the content hash as its ETag"""
+    response = stored_file_response(
+        request, snapshot_path(snapshot.month, snapshot.content_hash, extension), f'"{snapshot.content_hash}"',
+        CONTENT_TYPES[extension], filename=f'claims-{snapshot.month}.{extension}',
+    )
+    # The URL names the month rather than the content, so clients revalidate with the ETag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
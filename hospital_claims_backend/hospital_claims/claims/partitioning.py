@@ -0,0 +1,233 @@
+"""
+Optional PostgreSQL range partitioning of the claims table by discharge date.
+
+``convert_to_partitioned`` rebuilds ``claims_claim`` as a declaratively
+partitioned table with one partition per month or quarter of
+``date_of_discharge``, plus a DEFAULT partition for claims without a
+discharge date (and any date no partition covers yet). Every index on the old
+table is recreated on the parent, so each partition gets the same indexes.
+
+PostgreSQL requires unique constraints on a partitioned table to include the
+partition key, and ``date_of_discharge`` is nullable. So the partitioned table
+has a plain index on ``id`` instead of a primary key (ids still come from the
+same numbering). Foreign keys from other tables to claims are dropped for the
+same reason; Django already emulates ``on_delete`` for ORM deletes.
+
+``create_partitions`` is idempotent and meant to run on every deploy to keep
+partitions ``CLAIMS_PARTITIONS_AHEAD`` intervals ahead. Rows already sitting
+in the DEFAULT partition for a new range are moved into it.
+"""
+import re
+from datetime import date, timedelta
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import Claim
+
+INTERVALS = ('month', 'quarter')
+
+
+class PartitioningError(RuntimeError):
+    """The database or table is not in a state that allows the operation"""
+
+
+def month_range(month):
+    """[first day, first day of next month) for a 'YYYY-MM' month"""
+    start = date.fromisoformat(f'{month}-01')
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+def interval_start(day, interval):
+    if interval == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day.replace(day=1)
+
+
+def next_interval(day, interval):
+    months = 3 if interval == 'quarter' else 1
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(table, start, interval):
+    if interval == 'quarter':
+        return f'{table}_{start.year}q{(start.month - 1) // 3 + 1}'
+    return f'{table}_{start:%Y_%m}'
+
+
+def _connection():
+    connection = connections[router.db_for_write(Claim)]
+    if connection.vendor != 'postgresql':
+        raise PartitioningError('Claims partitioning needs PostgreSQL')
+    return connection
+
+
+def is_partitioned(connection=None):
+    connection = connection or connections[router.db_for_write(Claim)]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = %s AND pg_table_is_visible(c.oid)',
+            [Claim._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def existing_partitions(connection=None):
+    """Names of the claims partitions, DEFAULT included"""
+    connection = connection or _connection()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits i '
+            'JOIN pg_class parent ON parent.oid = i.inhparent '
+            'JOIN pg_class child ON child.oid = i.inhrelid '
+            'WHERE parent.relname = %s AND pg_table_is_visible(parent.oid) ORDER BY child.relname',
+            [Claim._meta.db_table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def detect_interval(connection=None):
+    """'month' or 'quarter' from the names of existing partitions, None if there are none"""
+    for name in existing_partitions(connection):
+        if re.search(r'_\d{4}q\d$', name):
+            return 'quarter'
+        if re.search(r'_\d{4}_\d{2}$', name):
+            return 'month'
+    return None
+
+
+def create_partitions(start, end, interval, connection=None):
+    """Create the missing partitions covering [start, end); returns the names created"""
+    connection = connection or _connection()
+    qn = connection.ops.quote_name
+    table = Claim._meta.db_table
+    default = f'{table}_default'
+    existing = set(existing_partitions(connection))
+    created = []
+    lower = interval_start(start, interval)
+    while lower < end:
+        upper = next_interval(lower, interval)
+        name = partition_name(table, lower, interval)
+        if name not in existing:
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                # Build it detached, pull matching rows out of DEFAULT, then attach
+                cursor.execute(f'CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS)')
+                cursor.execute(
+                    f'WITH moved AS (DELETE FROM {qn(default)} WHERE {qn("date_of_discharge")} >= %s '
+                    f'AND {qn("date_of_discharge")} < %s RETURNING *) '
+                    f'INSERT INTO {qn(name)} SELECT * FROM moved',
+                    [lower, upper],
+                )
+                cursor.execute(
+                    f'ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)',
+                    [lower, upper],
+                )
+            created.append(name)
+        lower = upper
+    return created
+
+
+def ensure_future_partitions(interval, ahead, connection=None):
+    """Partitions from the current interval through ``ahead`` intervals ahead"""
+    today = timezone.localdate()
+    end = interval_start(today, interval)
+    for _ in range(ahead + 1):
+        end = next_interval(end, interval)
+    return create_partitions(today, end, interval, connection)
+
+
+def convert_to_partitioned(interval, ahead, keep_old=False, stdout=None):
+    """Rebuild claims_claim as a range-partitioned table, copying every row"""
+    if interval not in INTERVALS:
+        raise PartitioningError(f'interval must be one of: {", ".join(INTERVALS)}')
+    connection = _connection()
+    if is_partitioned(connection):
+        raise PartitioningError('The claims table is already partitioned')
+
+    qn = connection.ops.quote_name
+    table = Claim._meta.db_table
+    old_table = f'{table}_unpartitioned'
+    log = stdout.write if stdout else (lambda message: None)
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(
+            'SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x '
+            'JOIN pg_class i ON i.oid = x.indexrelid JOIN pg_class t ON t.oid = x.indrelid '
+            'WHERE t.relname = %s AND pg_table_is_visible(t.oid) AND NOT x.indisprimary',
+            [table],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            'SELECT c.conname, r.relname FROM pg_constraint c '
+            'JOIN pg_class r ON r.oid = c.conrelid JOIN pg_class t ON t.oid = c.confrelid '
+            "WHERE c.contype = 'f' AND t.relname = %s AND pg_table_is_visible(t.oid)",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE contype = 'f' AND conrelid = %s::regclass",
+            [table],
+        )
+        outgoing_keys = cursor.fetchall()
+        cursor.execute(
+            'SELECT attidentity, pg_get_serial_sequence(%s, %s) FROM pg_attribute '
+            'WHERE attrelid = %s::regclass AND attname = %s',
+            [table, 'id', table, 'id'],
+        )
+        identity, sequence = cursor.fetchone()
+        cursor.execute(
+            f'SELECT MIN({qn("date_of_discharge")}), MAX({qn("date_of_discharge")}) FROM {qn(table)}'
+        )
+        first_day, last_day = cursor.fetchone()
+
+        for name, referencing_table in foreign_keys:
+            log(f'Dropping foreign key {name} on {referencing_table}')
+            cursor.execute(f'ALTER TABLE {qn(referencing_table)} DROP CONSTRAINT {qn(name)}')
+        cursor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(old_table)}')
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX {qn(name)} RENAME TO {qn(name[:55] + "_unpart")}')
+
+        cursor.execute(
+            f'CREATE TABLE {qn(table)} (LIKE {qn(old_table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ({qn("date_of_discharge")})'
+        )
+        if sequence and not identity:
+            # serial column: the copied default already uses the sequence, keep it alive
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {qn(table)}.{qn("id")}')
+        cursor.execute(f'CREATE INDEX {qn(table + "_id_idx")} ON {qn(table)} ({qn("id")})')
+        for name, definition in indexes:
+            # The definition still names the original table, which is now the parent
+            cursor.execute(definition)
+        for name, definition in outgoing_keys:
+            # LIKE never copies foreign keys; the TPA/insurer references are still valid
+            cursor.execute(f'ALTER TABLE {qn(old_table)} DROP CONSTRAINT {qn(name)}')
+            cursor.execute(f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}')
+        cursor.execute(f'CREATE TABLE {qn(table + "_default")} PARTITION OF {qn(table)} DEFAULT')
+
+        today = timezone.localdate()
+        start = min(first_day or today, today)
+        end = interval_start(max(last_day or today, today), interval)
+        for _ in range(ahead + 1):
+            end = next_interval(end, interval)
+        created = create_partitions(start, end, interval, connection)
+        log(f'Created {len(created)} {interval}ly partitions')
+
+        cursor.execute(f'INSERT INTO {qn(table)} SELECT * FROM {qn(old_table)}')
+        log(f'Copied {cursor.rowcount} claims')
+        if identity:
+            # LIKE does not copy identity; continue numbering after the copied ids
+            cursor.execute(f'SELECT COALESCE(MAX({qn("id")}), 0) + 1 FROM {qn(table)}')
+            cursor.execute(
+                f'ALTER TABLE {qn(table)} ALTER COLUMN {qn("id")} '
+                f'ADD GENERATED BY DEFAULT AS IDENTITY (START WITH {int(cursor.fetchone()[0])})'
+            )
+        if not keep_old:
+            cursor.execute(f'DROP TABLE {qn(old_table)}')
+        cursor.execute(f'ANALYZE {qn(table)}')
+    return created
@@ -0,0 +1,269 @@
+"""
+Background thumbnails and previews of claim documents.
+
+When a document is stored, ``enqueue`` hands its file to a process pool that
+renders the first page (PDFs) or the image itself into a small thumbnail and
+a downsized preview, both JPEG, under ``previews/`` in the document store.
+The output is keyed by the file's SHA-256 like the file itself, so a second
+upload of the same scan reuses the images and renders nothing.
+
+The pool is spawned lazily in each web process with
+``CLAIM_PREVIEW_WORKERS`` processes, and spawned again if a worker dies
+and breaks it. Each worker sets Django up once and
+records its result in ``DocumentPreview`` with the time the item waited and
+the time it took to render. At most ``CLAIM_PREVIEW_QUEUE_LIMIT`` files wait
+in a process's pool; beyond that, and for files left pending by a restart,
+``manage.py generate_previews`` catches up. Rendering PDFs needs pypdfium2,
+which is optional; without it PDFs are marked unsupported, and
+``generate_previews --retry-unsupported`` renders them once it is installed.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from functools import partial
+from multiprocessing import get_context
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pragma: no cover - optional dependency
+    pdfium = None
+
+import django
+from django.conf import settings
+from django.db.models import Avg, Count, Max
+from django.utils import timezone
+
+from .documents import blob_path
+from .models import ClaimDocument, DocumentPreview
+
+# Longest side in pixels of each rendered image
+SIZES = {
+    'thumbnail': 256,
+    'preview': 1280,
+}
+JPEG_QUALITY = 80
+# Render timings of recent items kept in memory for the queue statistics
+RECENT_TIMINGS = 200
+
+_lock = threading.Lock()
+_executor = None
+_in_flight = {}
+_recent = deque(maxlen=RECENT_TIMINGS)
+
+
+class UnsupportedDocument(ValueError):
+    pass
+
+
+def pdfium_available():
+    return pdfium is not None
+
+
+def preview_path(sha256, variant):
+    return os.path.join(settings.CLAIM_DOCUMENTS_DIR, 'previews', sha256[:2], f'{sha256}-{variant}.jpg')
+
+
+def _first_page(path):
+    """First page of a PDF or the image itself, as an RGB PIL image; returns (image, source type)"""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    with open(path, 'rb') as f:
+        is_pdf = f.read(5) == b'%PDF-'
+    if is_pdf:
+        if pdfium is None:
+            raise UnsupportedDocument('Rendering PDFs needs pypdfium2 (pip install pypdfium2)')
+        pdf = pdfium.PdfDocument(path)
+        try:
+            page = pdf[0]
+            width, height = page.get_size()
+            # Render straight at preview size rather than full resolution
+            image = page.render(scale=SIZES['preview'] / max(width, height, 1)).to_pil()
+            page.close()
+        finally:
+            pdf.close()
+        return image.convert('RGB'), 'pdf'
+
+    try:
+        image = Image.open(path)
+    except UnidentifiedImageError:
+        raise UnsupportedDocument('Not a PDF or an image Pillow can read')
+    # Let the JPEG decoder scale down while decoding
+    image.draft('RGB', (SIZES['preview'], SIZES['preview']))
+    image = ImageOps.exif_transpose(image)
+    return image.convert('RGB'), 'image'
+
+
+def _save(image, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.tmp'
+    image.save(temporary, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+    os.replace(temporary, path)
+
+
+def render(sha256):
+    """Write the thumbnail and preview of a stored file; returns (source type, width, height)"""
+    image, source_type = _first_page(blob_path(sha256))
+    width, height = image.size
+    for variant in ('preview', 'thumbnail'):
+        # Each variant is shrunk from the previous, larger one
+        image.thumbnail((SIZES[variant], SIZES[variant]))
+        _save(image, preview_path(sha256, variant))
+    return source_type, width, height
+
+
+def generate(sha256):
+    """Render one file and record the outcome; runs in a pool worker. Returns (status, render ms)"""
+    started_at = timezone.now()
+    started = time.perf_counter()
+    values = {'error': ''}
+    try:
+        values['source_type'], values['width'], values['height'] = render(sha256)
+        values['status'] = 'done'
+    except UnsupportedDocument as e:
+        values.update(status='unsupported', error=str(e))
+    except Exception as e:
+        values.update(status='failed', error=f'{type(e).__name__}: {e}')
+    render_ms = int((time.perf_counter() - started) * 1000)
+
+    preview = DocumentPreview.objects.filter(sha256=sha256).first()
+    if preview is not None:
+        values['wait_ms'] = max(int((started_at - preview.queued_at).total_seconds() * 1000), 0)
+    DocumentPreview.objects.filter(sha256=sha256).update(
+        started_at=started_at, finished_at=timezone.now(), render_ms=render_ms, **values
+    )
+    return values['status'], render_ms
+
+
+def _pool(workers):
+    # Spawned, not forked: workers start clean and set Django up themselves
+    return ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'), initializer=django.setup)
+
+
+def _executor_for_process():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = _pool(settings.CLAIM_PREVIEW_WORKERS)
+        return _executor
+
+
+def _discard_executor(executor):
+    """Forget a pool a dead worker broke, so the next item starts a new one"""
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+
+
+def _finished(sha256, queued, executor, future):
+    with _lock:
+        _in_flight.pop(sha256, None)
+    try:
+        status, render_ms = future.result()
+    except BrokenProcessPool:
+        # A worker died (out of memory, a crash in pdfium); the row stays pending for generate_previews
+        _discard_executor(executor)
+        return
+    except Exception:
+        return
+    _recent.append((status, render_ms, int((time.monotonic() - queued) * 1000)))
+
+
+def is_cached(preview):
+    return preview.status == 'done' and all(os.path.exists(preview_path(preview.sha256, v)) for v in SIZES)
+
+
+def enqueue(sha256):
+    """Queue a stored file for rendering unless its images exist already; returns its DocumentPreview"""
+    preview, created = DocumentPreview.objects.get_or_create(sha256=sha256)
+    if not created and (preview.status in ('unsupported', 'failed') or is_cached(preview)):
+        return preview
+    if not created and preview.status == 'done':
+        # Rendered once but the files are gone; render again
+        DocumentPreview.objects.filter(pk=preview.pk).update(status='pending', queued_at=timezone.now())
+    if settings.CLAIM_PREVIEW_WORKERS <= 0:
+        return preview
+    with _lock:
+        if sha256 in _in_flight or len(_in_flight) >= settings.CLAIM_PREVIEW_QUEUE_LIMIT:
+            return preview
+        queued = _in_flight[sha256] = time.monotonic()
+    executor = _executor_for_process()
+    try:
+        future = executor.submit(generate, sha256)
+    except BrokenProcessPool:
+        # The pool broke since it was last used; leave the item pending and start afresh next time
+        _discard_executor(executor)
+        executor.shutdown(wait=False)
+        with _lock:
+            _in_flight.pop(sha256, None)
+        return preview
+    except Exception:
+        with _lock:
+            _in_flight.pop(sha256, None)
+        raise
+    future.add_done_callback(partial(_finished, sha256, queued, executor))
+    return preview
+
+
+def queue_stats():
+    """Queue depth of this process and overall, with timings of recent renders"""
+    with _lock:
+        in_flight = len(_in_flight)
+        recent = list(_recent)
+    by_status = dict(DocumentPreview.objects.values_list('status').annotate(count=Count('id')).order_by())
+    timings = DocumentPreview.objects.filter(
+        finished_at__gte=timezone.now() - timedelta(hours=24)
+    ).aggregate(
+        items=Count('id'), avg_render_ms=Avg('render_ms'), max_render_ms=Max('render_ms'),
+        avg_wait_ms=Avg('wait_ms'), max_wait_ms=Max('wait_ms'),
+    )
+    render_times = sorted(render_ms for _, render_ms, _ in recent)
+    return {
+        'workers': settings.CLAIM_PREVIEW_WORKERS,
+        'queue_limit': settings.CLAIM_PREVIEW_QUEUE_LIMIT,
+        'in_flight_this_process': in_flight,
+        'pending': by_status.get('pending', 0),
+        'by_status': {status: by_status.get(status, 0) for status, _ in DocumentPreview.STATUS_CHOICES},
+        'last_24h': timings,
+        'this_process': {
+            'items': len(recent),
+            'p50_render_ms': render_times[len(render_times) // 2] if render_times else None,
+            'p95_render_ms': render_times[int(len(render_times) * 0.95)] if render_times else None,
+        },
+        'pdf_rendering': pdfium_available(),
+    }
+
+
+def generate_missing(workers, retry_failed=False, retry_unsupported=False, stdout=None):
+    """Render every stored file without images (pending, never queued, or failed/unsupported if asked); returns counts"""
+    hashes = set(ClaimDocument.objects.values_list('sha256', flat=True))
+    known = dict(DocumentPreview.objects.values_list('sha256', 'status'))
+    statuses = {'pending'}
+    if retry_failed:
+        statuses.add('failed')
+    if retry_unsupported:
+        # e.g. PDFs recorded before pypdfium2 was installed
+        statuses.add('unsupported')
+    todo = sorted(h for h in hashes if known.get(h, 'pending') in statuses)
+    for sha256 in todo:
+        DocumentPreview.objects.update_or_create(
+            sha256=sha256, defaults={'status': 'pending', 'queued_at': timezone.now()}
+        )
+
+    counts = {}
+    log = stdout.write if stdout else (lambda message: None)
+    if workers <= 1:
+        results = ((sha256, generate(sha256)) for sha256 in todo)
+        for sha256, (status, render_ms) in results:
+            counts[status] = counts.get(status, 0) + 1
+            log(f'{sha256[:12]}  {status:<12}{render_ms:>7} ms')
+        return counts
+    with _pool(workers) as pool:
+        for sha256, (status, render_ms) in zip(todo, pool.map(generate, todo)):
+            counts[status] = counts.get(status, 0) + 1
+            log(f'{sha256[:12]}  {status:<12}{render_ms:>7} ms')
+    return counts
@@ -1,5 +1,11 @@
+import copy
+
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Claim
+from .models import (
+    Claim, ClaimAnomaly, ClaimArchive, ClaimChange, ClaimDocument, DocumentUpload, DuplicateCandidate,
+    InvalidStatusTransition, MonthSnapshot, check_status_transition,
+)
 
 class ClaimSerializer(serializers.ModelSerializer):
     difference_amount = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
@@ -41,7 +47,8 @@ class ClaimSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Claim
-        fields = '__all__'
+        # tpa/insurer are read and written by name through tpa_name/parent_insurance
+        exclude = ['tpa', 'insurer']
         
     def validate(self, data):
         # Validate date range - only if both dates are provided
@@ -91,7 +98,26 @@ class ClaimSerializer(serializers.ModelSerializer):
             if field in data and (data[field] == '' or data[field] == 'null' or data[field] == 'undefined'):
                 data[field] = None
         
+        # The status follows these fields; refuse edits that would take back a settlement
+        if self.instance is not None:
+            updated = copy.copy(self.instance)
+            for field, value in data.items():
+                setattr(updated, field, value)
+            try:
+                check_status_transition(
+                    self.instance.status, updated.derive_status(), self.instance.pk, reopen=self.context.get('reopen', False)
+                )
+            except InvalidStatusTransition as e:
+                raise serializers.ValidationError(e.messages[0])
+        
         return data
+    
+    def update(self, instance, validated_data):
+        # context['reopen'] is a manager's correction of a settlement or bank verification
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(reopen=self.context.get('reopen', False))
+        return instance
 
 class ClaimListSerializer(serializers.ModelSerializer):
     """Serializer for claim list view with essential fields only"""
@@ -103,4 +129,136 @@ class ClaimListSerializer(serializers.ModelSerializer):
             'date_of_admission', 'date_of_discharge', 'bill_amount', 
             'approved_amount', 'total_settled_amount', 'difference_amount',
             'settlement_date', 'month', 'created_at', 'utr_number'
-        ]
\ No newline at end of file
+        ]
+
+class ClaimAnomalySerializer(serializers.ModelSerializer):
+    """Anomaly with the claim fields needed to follow it up"""
+    claim_id = serializers.CharField(source='claim.claim_id', read_only=True)
+    patient_name = serializers.CharField(source='claim.patient_name', read_only=True)
+    tpa_name = serializers.CharField(source='claim.tpa_name', read_only=True)
+    severity_display = serializers.CharField(source='get_severity_display', read_only=True)
+    
+    class Meta:
+        model = ClaimAnomaly
+        fields = [
+            'id', 'claim', 'claim_id', 'patient_name', 'tpa_name', 'kind', 'severity',
+            'severity_display', 'status', 'expected_amount', 'actual_amount', 'message',
+            'detected_at', 'resolved_at'
+        ]
+
+
+class DuplicateClaimSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Claim
+        fields = [
+            'id', 'claim_id', 'uhid_ip_no', 'patient_name', 'tpa_name',
+            'date_of_admission', 'date_of_discharge', 'bill_amount', 'created_at'
+        ]
+
+
+class DuplicateCandidateSerializer(serializers.ModelSerializer):
+    """Candidate pair with both claims; only the review status is writable"""
+    claim_a = DuplicateClaimSummarySerializer(read_only=True)
+    claim_b = DuplicateClaimSummarySerializer(read_only=True)
+    reasons = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = DuplicateCandidate
+        fields = ['id', 'claim_a', 'claim_b', 'score', 'reasons', 'status', 'detected_at']
+        read_only_fields = ['score', 'detected_at']
+    
+    def get_reasons(self, obj):
+        return obj.reasons.split(',') if obj.reasons else []
+
+
+class ClaimArchiveSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ClaimArchive
+        fields = [
+            'id', 'month', 'path', 'row_count', 'size_bytes', 'sha256', 'archived_before',
+            'first_claim_id', 'last_claim_id', 'created_at'
+        ]
+
+
+class ClaimChangeSerializer(serializers.ModelSerializer):
+    """History entry; TPA and insurer ids are shown by name when the view passes the name maps"""
+    user = serializers.CharField(source='user.username', read_only=True, default=None)
+    changes = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ClaimChange
+        fields = ['id', 'claim_id', 'action', 'changes', 'user', 'source', 'changed_at']
+    
+    def get_changes(self, obj):
+        names = {
+            'tpa_id': ('tpa_name', self.context.get('tpa_names', {})),
+            'insurer_id': ('parent_insurance', self.context.get('insurer_names', {})),
+        }
+        changes = {}
+        for field, (old, new) in obj.changes.items():
+            if field in names:
+                field, lookup = names[field]
+                old, new = lookup.get(old, old), lookup.get(new, new)
+            changes[field] = {'old': old, 'new': new}
+        return changes
+
+
+class ClaimDocumentSerializer(serializers.ModelSerializer):
+    uploaded_by = serializers.CharField(source='uploaded_by.username', read_only=True, default=None)
+    download_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    preview_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ClaimDocument
+        fields = [
+            'id', 'claim', 'kind', 'original_name', 'content_type', 'size', 'sha256', 'uploaded_by', 'uploaded_at',
+            'download_url', 'thumbnail_url', 'preview_url'
+        ]
+        read_only_fields = fields
+    
+    def _url(self, name, obj):
+        url = reverse(name, args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+    
+    def get_download_url(self, obj):
+        return self._url('claim-document-download', obj)
+    
+    def get_thumbnail_url(self, obj):
+        return self._url('claim-document-thumbnail', obj)
+    
+    def get_preview_url(self, obj):
+        return self._url('claim-document-preview', obj)
+
+
+class DocumentUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DocumentUpload
+        fields = ['id', 'claim', 'kind', 'original_name', 'content_type', 'size', 'offset', 'sha256', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class MonthSnapshotSerializer(serializers.ModelSerializer):
+    closed_by = serializers.CharField(source='closed_by.username', read_only=True, default=None)
+    csv_url = serializers.SerializerMethodField()
+    xlsx_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = MonthSnapshot
+        fields = [
+            'month', 'content_hash', 'claim_count', 'summary', 'tpa_breakdown', 'csv_size', 'xlsx_size', 'stale',
+            'closed_by', 'closed_at', 'generated_at', 'generation_ms', 'generations', 'csv_url', 'xlsx_url'
+        ]
+        read_only_fields = fields
+    
+    def _url(self, name, obj):
+        url = reverse(name, args=[obj.month])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+    
+    def get_csv_url(self, obj):
+        return self._url('month-snapshot-csv', obj)
+    
+    def get_xlsx_url(self, obj):
+        return self._url('month-snapshot-xlsx', obj) if obj.xlsx_size is not None else None
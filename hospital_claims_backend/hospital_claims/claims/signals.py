@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .audit import record_delete, record_save
+from .lag_stats import bump_month_version
+from .month_close import mark_stale
+from .models import Claim
+
+
+@receiver(post_save, sender=Claim)
+def claim_saved(sender, instance, created, **kwargs):
+    """Invalidate cached per-month statistics and snapshots for the old and new month, and record the change"""
+    previous_month = getattr(instance, '_previous_month', None)
+    bump_month_version(instance.month)
+    if previous_month and previous_month != instance.month:
+        bump_month_version(previous_month)
+    mark_stale(instance.month, previous_month)
+    record_save(instance, created)
+
+
+@receiver(post_delete, sender=Claim)
+def claim_deleted(sender, instance, **kwargs):
+    bump_month_version(instance.month)
+    mark_stale(instance.month)
+    record_delete(instance)
@@ -0,0 +1,280 @@
+"""
+Deterministic synthetic claims for load tests and benchmarks.
+
+``generate`` draws claims column by column with NumPy, following the
+distributions of ``create_monthly_claims``: bills of 75,000-4,50,000,
+75-95% approved, the same deduction percentages, stays of 1-12 days, 85%
+settled within 25 days of discharge and a quarter with a query reply. TPAs
+and insurers are drawn from the names those commands use. Rows are drawn in
+fixed blocks, each from a generator seeded with (seed, block number), so the
+same seed and count always give the same claims whatever the load batch size.
+
+``load`` writes the rows with ``COPY`` on PostgreSQL and ``bulk_create``
+elsewhere. The status is derived in NumPy and checked against
+``claim_status_expression`` in the database, which corrects any row whose
+status differs. Claim ids are ``SYN<seed>-<n>``, so a dataset can be told apart
+and ``remove`` deletes it again, one seed at a time. NumPy is optional; without it ``generate``
+raises.
+"""
+import csv
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .audit import paused
+from .lag_stats import bump_month_version
+from .models import (
+    Claim, Insurer, Tpa, claim_status_expression,
+)
+from .month_close import mark_stale
+
+# Rows drawn from one seeded generator
+BLOCK_SIZE = 100000
+
+TPA_NAMES = (
+    'Star Health Insurance', 'HDFC ERGO Health Insurance', 'ICICI Lombard Health Insurance',
+    'Max Bupa Health Insurance', 'Apollo Munich Health Insurance', 'Bajaj Allianz Health Insurance',
+    'Future Generali Health Insurance', 'Reliance General Insurance', 'United India Insurance',
+    'National Insurance Company',
+)
+INSURER_NAMES = (
+    'LIC of India', 'HDFC Life Insurance', 'ICICI Prudential Life Insurance', 'SBI Life Insurance',
+    'Max Life Insurance', 'Bajaj Allianz Life Insurance', 'Tata AIA Life Insurance',
+    'Kotak Mahindra Life Insurance', 'Birla Sun Life Insurance', 'Reliance Nippon Life Insurance',
+)
+PATIENT_NAMES = (
+    'Rajesh Kumar', 'Priya Sharma', 'Amit Singh', 'Sunita Patel', 'Vikash Gupta',
+    'Meera Agarwal', 'Ravi Verma', 'Kavita Joshi', 'Suresh Yadav', 'Pooja Mishra',
+    'Manoj Tiwari', 'Rekha Sinha', 'Ashok Pandey', 'Geeta Rani', 'Dinesh Chandra',
+    'Sita Devi', 'Ramesh Prasad', 'Anita Kumari', 'Vijay Kumar', 'Shanti Devi',
+    'Mukesh Singh', 'Radha Sharma', 'Sunil Kumar', 'Pushpa Devi', 'Naresh Gupta',
+)
+AUTHORITIES = ('CMO Approval', 'Medical Director', 'Senior Consultant', 'Department Head')
+DISPATCH_STATUSES = ('pending', 'dispatched', 'received', 'not_required')
+# Share of the approved amount: (low, high) of a uniform draw
+DEDUCTIONS = {
+    'mou_discount': (0, 0.04),
+    'co_pay': (0, 0.08),
+    'consumable_deduction': (0, 0.06),
+    'hospital_discount': (0, 0.025),
+    'paid_by_patient': (0, 0.12),
+    'other_deductions': (0, 0.015),
+    'tds': (0.008, 0.018),
+}
+SETTLED_SHARE = 0.85
+QUERY_REPLY_SHARE = 0.25
+REASON_SHARE = 0.15
+AMOUNT_FIELDS = (
+    'bill_amount', 'approved_amount', *DEDUCTIONS, 'amount_settled_in_ac', 'total_settled_amount',
+    'difference_amount',
+)
+DATE_FIELDS = ('date_of_admission', 'date_of_discharge', 'query_reply_date', 'settlement_date')
+TEXT_FIELDS = (
+    'claim_id', 'uhid_ip_no', 'patient_name', 'hospital_discount_authority', 'physical_file_dispatch',
+    'reason_less_settlement', 'month',
+)
+FLAG_FIELDS = ('claim_settled_software', 'receipt_verified_bank')
+COLUMNS = ('tpa_id', 'insurer_id') + TEXT_FIELDS + DATE_FIELDS + AMOUNT_FIELDS + FLAG_FIELDS + ('status',)
+
+
+class SyntheticDataError(RuntimeError):
+    pass
+
+
+def numpy_available():
+    return np is not None
+
+
+def prefix(seed):
+    return f'SYN{seed}-'
+
+
+def synthetic_claims(seed=None):
+    """Claims generated by this module, of one seed or any"""
+    if seed is None:
+        return Claim.objects.filter(claim_id__startswith='SYN')
+    return Claim.objects.filter(claim_id__startswith=prefix(seed))
+
+
+def _dimension_ids(model, names):
+    return np.array([model.objects.canonical(name).pk for name in names], dtype=np.int64)
+
+
+def _dates(days):
+    """ISO date strings of day numbers (days since 1970-01-01), None where negative"""
+    strings = (np.datetime64('1970-01-01', 'D') + np.maximum(days, 0)).astype(str).astype(object)
+    strings[days < 0] = None
+    return strings
+
+
+def _block(seed, number, size, first_day, last_day, tpa_ids, insurer_ids):
+    rng = np.random.default_rng([seed, number])
+    start = number * BLOCK_SIZE
+    columns = {
+        'tpa_id': tpa_ids[rng.integers(0, len(tpa_ids), size)],
+        'insurer_id': insurer_ids[rng.integers(0, len(insurer_ids), size)],
+        'claim_id': np.array([f'{prefix(seed)}{n:09d}' for n in range(start, start + size)], dtype=object),
+        'uhid_ip_no': np.char.add('UHID', rng.integers(100000, 1000000, size).astype(str)).astype(object),
+        'patient_name': np.array(PATIENT_NAMES, dtype=object)[rng.integers(0, len(PATIENT_NAMES), size)],
+        'hospital_discount_authority': np.array(AUTHORITIES, dtype=object)[rng.integers(0, len(AUTHORITIES), size)],
+        'physical_file_dispatch': np.array(DISPATCH_STATUSES, dtype=object)[rng.integers(0, len(DISPATCH_STATUSES), size)],
+        'reason_less_settlement': np.where(rng.random(size) < REASON_SHARE, 'Insurance policy terms', '').astype(object),
+    }
+
+    discharge = rng.integers(first_day, last_day + 1, size)
+    settlement = discharge + rng.integers(1, 26, size)
+    # Settlements that would fall after the last day have not happened yet
+    settled = (rng.random(size) < SETTLED_SHARE) & (settlement <= last_day)
+    query_reply = np.where(rng.random(size) < QUERY_REPLY_SHARE, discharge + rng.integers(1, 9, size), -1)
+    columns.update(
+        date_of_admission=_dates(discharge - rng.integers(1, 13, size)),
+        date_of_discharge=_dates(discharge),
+        query_reply_date=_dates(query_reply),
+        settlement_date=_dates(np.where(settled, settlement, -1)),
+    )
+    columns['month'] = np.array([day[:7] for day in columns['date_of_discharge']], dtype=object)
+
+    bill = rng.integers(75000, 450001, size).astype(np.float64)
+    approved = np.round(bill * rng.uniform(0.75, 0.95, size), 2)
+    amounts = {'bill_amount': bill, 'approved_amount': approved}
+    for field, (low, high) in DEDUCTIONS.items():
+        amounts[field] = np.round(approved * rng.uniform(low, high, size), 2)
+    amount_settled = np.round(approved - sum(amounts[field] for field in DEDUCTIONS), 2)
+    amounts['amount_settled_in_ac'] = np.where(settled, amount_settled, 0)
+    amounts['total_settled_amount'] = amounts['amount_settled_in_ac']
+    # As Claim.save computes it
+    amounts['difference_amount'] = np.round(
+        bill - (amounts['total_settled_amount'] + amounts['tds'] + amounts['paid_by_patient'] + amounts['mou_discount']),
+        2,
+    )
+    columns.update(amounts)
+
+    columns['claim_settled_software'] = settled & (rng.random(size) < 0.5)
+    columns['receipt_verified_bank'] = settled & (rng.random(size) < 0.5)
+    # Claim.derive_status for these rows (no query documents are flagged, so never query_pending)
+    columns['status'] = np.select(
+        [settled & columns['receipt_verified_bank'], settled, columns['physical_file_dispatch'] == 'pending', approved > 0],
+        ['closed', 'settled_unverified', 'awaiting_dispatch', 'approved_unsettled'],
+        'submitted',
+    ).astype(object)
+    return columns
+
+
+def generate(count, seed, months=24, end=None):
+    """Yield blocks of claims as {column: NumPy array}, discharged over ``months`` months up to ``end``"""
+    if np is None:
+        raise SyntheticDataError('Generating synthetic claims needs NumPy (pip install numpy)')
+    end = end or date.today()
+    epoch = date(1970, 1, 1)
+    last_day = (end - epoch).days
+    first_day = (end - timedelta(days=round(months * 30.44)) - epoch).days
+    tpa_ids = _dimension_ids(Tpa, TPA_NAMES)
+    insurer_ids = _dimension_ids(Insurer, INSURER_NAMES)
+    for number in range((count + BLOCK_SIZE - 1) // BLOCK_SIZE):
+        size = min(BLOCK_SIZE, count - number * BLOCK_SIZE)
+        yield _block(seed, number, size, first_day, last_day, tpa_ids, insurer_ids)
+
+
+def _rows(columns, start, stop):
+    return zip(*(columns[name][start:stop].tolist() for name in COLUMNS))
+
+
+def _copy(connection, columns, now, batch_size):
+    # COPY skips Django's defaults, so every other column is given its default explicitly
+    constants = {
+        field.column: field.get_default()
+        for field in Claim._meta.concrete_fields
+        if not field.primary_key and field.attname not in COLUMNS
+    }
+    constants.update(created_at=now, updated_at=now)
+    tail = ['\\N' if value is None else value for value in constants.values()]
+    table = connection.ops.quote_name(Claim._meta.db_table)
+    names = ', '.join(connection.ops.quote_name(name) for name in COLUMNS + tuple(constants))
+    size = len(columns['claim_id'])
+    with connection.cursor() as cursor:
+        for start in range(0, size, batch_size):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in _rows(columns, start, start + batch_size):
+                writer.writerow(['\\N' if value is None else value for value in row] + tail)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} ({names}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+
+
+def _bulk_create(using, columns, batch_size):
+    size = len(columns['claim_id'])
+    for start in range(0, size, batch_size):
+        claims = []
+        for row in _rows(columns, start, start + batch_size):
+            values = dict(zip(COLUMNS, row))
+            for field in AMOUNT_FIELDS:
+                values[field] = Decimal(repr(values[field]))
+            for field in DATE_FIELDS:
+                if values[field] is not None:
+                    values[field] = date.fromisoformat(values[field])
+            claims.append(Claim(**values))
+        Claim.objects.using(using).bulk_create(claims, batch_size=batch_size)
+
+
+def load(count, seed, months=24, end=None, batch_size=10000, method='auto', stdout=None):
+    """Generate and insert ``count`` claims; returns the method used ('copy' or 'bulk_create')"""
+    using = router.db_for_write(Claim)
+    connection = connections[using]
+    if method == 'auto':
+        method = 'copy' if connection.vendor == 'postgresql' else 'bulk_create'
+    if method == 'copy' and connection.vendor != 'postgresql':
+        raise SyntheticDataError('COPY needs PostgreSQL')
+
+    now = timezone.now().isoformat()
+    months_loaded = set()
+    loaded = 0
+    # Fixtures, not edits: no change history
+    with paused(), transaction.atomic(using=using):
+        for columns in generate(count, seed, months=months, end=end):
+            if method == 'copy':
+                _copy(connection, columns, now, batch_size)
+            else:
+                _bulk_create(using, columns, batch_size)
+            months_loaded.update(np.unique(columns['month']).tolist())
+            loaded += len(columns['claim_id'])
+            if stdout:
+                stdout.write(f'Loaded {loaded}/{count} claims')
+        # claim_status_expression stays the authority: rows the NumPy rules got wrong are corrected in SQL
+        status = claim_status_expression()
+        synthetic_claims(seed).using(using).exclude(status=status)._update_status(status)
+        # Bulk inserts skip save() signals
+        _invalidate(months_loaded)
+    return method
+
+
+def _invalidate(months):
+    mark_stale(*months)
+    for month in months:
+        bump_month_version(month)
+
+
+def remove(seed, batch_size=2000):
+    """Delete the synthetic claims of one seed; returns how many"""
+    if seed is None:
+        # SYN-prefixed claim ids are not proof enough that a claim is synthetic
+        raise SyntheticDataError('remove() needs the seed of the claims to delete')
+    using = router.db_for_write(Claim)
+    claims = synthetic_claims(seed).using(using).order_by('pk').values_list('pk', flat=True)
+    count = 0
+    with paused(), transaction.atomic(using=using):
+        # An ordinary delete, in batches so a large dataset is never loaded at once
+        while True:
+            pks = list(claims[:batch_size])
+            if not pks:
+                break
+            Claim.objects.using(using).filter(pk__in=pks).delete()
+            count += len(pks)
+    return count
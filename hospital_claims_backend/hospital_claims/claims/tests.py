@@ -1,3 +1,1568 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import product
+from unittest import mock, skipUnless
 
-# Create your tests here.
+try:
+    import openpyxl
+except ImportError:  # pragma: no cover - optional dependency
+    openpyxl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pq = None
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.db import connection
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, Q, Sum
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from hospital_claims import db_routers
+
+from . import analytics, anomalies, archive, async_views, dedupe, exports, month_close, previews, synthetic, views
+from .ageing import ageing_report
+from .audit import audited_writes, capture, diff, paused
+from .bank_reconciliation import StatementError, reconcile_statement
+from .cube import CubeError, run_cube
+from .documents import (
+    DocumentError, UploadOffsetMismatch, append_chunk, attach_document, blob_path, hash_file, incoming_dir,
+    parse_range, part_path, start_upload, stored_file_response,
+)
+from .lag_stats import LagSketch, compute_lag_stats, lag_stats
+from .models import (
+    CLAIM_STATUS_LABELS, CLAIM_STATUS_TRANSITIONS, OPEN_CLAIM_STATUSES, Claim, ClaimAnomaly, ClaimArchive,
+    ClaimArchiveTotal, ClaimChange, ClaimDocument, DocumentPreview, DocumentUpload, DuplicateCandidate, Insurer, InsurerAlias, InvalidStatusTransition, MonthSnapshot, Tpa, TpaAlias,
+    alias_key, check_status_transition, claim_status_expression,
+)
+from .month_close import SnapshotError, build as build_snapshot, check_month
+from .partitioning import (
+    convert_to_partitioned, create_partitions, detect_interval, ensure_future_partitions, existing_partitions,
+    interval_start, is_partitioned, month_range, next_interval, partition_name,
+)
+from .trends import monthwise_trends
+
+
+def make_claim(**fields):
+    values = {
+        'claim_id': 'CLM-1',
+        'uhid_ip_no': 'UH-1',
+        'patient_name': 'Asha Rao',
+        'date_of_admission': date(2026, 1, 2),
+        'date_of_discharge': date(2026, 1, 5),
+        'bill_amount': Decimal('1000.00'),
+        'physical_file_dispatch': 'dispatched',
+    }
+    values.update(fields)
+    return Claim.objects.create(**values)
+
+
+def api_client(username, role):
+    user = get_user_model().objects.create_user(
+        username=username, email=f'{username}@example.com', password='password', role=role
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def use_documents_dir(test, **overrides):
+    """Point CLAIM_DOCUMENTS_DIR at a temporary directory for the rest of the test"""
+    path = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, path)
+    settings_override = override_settings(CLAIM_DOCUMENTS_DIR=path, CLAIM_DOCUMENTS_SENDFILE='', **overrides)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+    return path
+
+
+class ClaimStatusTransitionTests(TestCase):
+    def test_transition_table(self):
+        for old, new in product(CLAIM_STATUS_LABELS, CLAIM_STATUS_LABELS):
+            allowed = new in CLAIM_STATUS_TRANSITIONS[old]
+            if old in ('settled_unverified', 'closed'):
+                self.assertEqual(allowed, new == old or (old, new) == ('settled_unverified', 'closed'), (old, new))
+            else:
+                self.assertTrue(allowed, (old, new))
+
+    def test_check_status_transition(self):
+        check_status_transition('submitted', 'closed', 1)
+        with self.assertRaises(InvalidStatusTransition):
+            check_status_transition('closed', 'settled_unverified', 1)
+        check_status_transition('closed', 'submitted', 1, reopen=True)
+
+    def test_save_derives_status(self):
+        claim = make_claim()
+        self.assertEqual(claim.status, 'submitted')
+        claim.approved_amount = Decimal('900.00')
+        claim.save()
+        self.assertEqual(claim.status, 'approved_unsettled')
+        claim.settlement_date = date(2026, 2, 1)
+        claim.save()
+        self.assertEqual(claim.status, 'settled_unverified')
+        claim.receipt_verified_bank = True
+        claim.save()
+        self.assertEqual(claim.status, 'closed')
+
+    def test_save_refuses_to_take_back_a_settlement(self):
+        claim = make_claim(settlement_date=date(2026, 2, 1), receipt_verified_bank=True)
+        claim.receipt_verified_bank = False
+        with self.assertRaises(InvalidStatusTransition):
+            claim.save()
+        self.assertEqual(Claim.objects.get(pk=claim.pk).status, 'closed')
+
+    def test_save_with_reopen(self):
+        claim = make_claim(settlement_date=date(2026, 2, 1))
+        claim.settlement_date = None
+        claim.save(reopen=True)
+        self.assertEqual(Claim.objects.get(pk=claim.pk).status, 'submitted')
+
+    def test_queryset_update_refreshes_status(self):
+        claim = make_claim()
+        Claim.objects.filter(pk=claim.pk).update(settlement_date=date(2026, 2, 1))
+        self.assertEqual(Claim.objects.get(pk=claim.pk).status, 'settled_unverified')
+
+    def test_queryset_update_refuses_to_take_back_a_settlement(self):
+        claim = make_claim(settlement_date=date(2026, 2, 1))
+        with self.assertRaises(InvalidStatusTransition):
+            Claim.objects.filter(pk=claim.pk).update(settlement_date=None)
+        claim.refresh_from_db()
+        self.assertEqual(claim.settlement_date, date(2026, 2, 1))
+        self.assertEqual(claim.status, 'settled_unverified')
+
+    def test_queryset_update_cannot_set_status(self):
+        claim = make_claim(settlement_date=date(2026, 2, 1))
+        with self.assertRaises(InvalidStatusTransition):
+            Claim.objects.filter(pk=claim.pk).update(status='submitted')
+        self.assertEqual(Claim.objects.get(pk=claim.pk).status, 'settled_unverified')
+
+
+class ClaimStatusExpressionTests(TestCase):
+    def test_expression_matches_derive_status(self):
+        combinations = product(
+            (None, date(2026, 2, 1)),  # settlement_date
+            (False, True),  # receipt_verified_bank
+            (False, True),  # query_on_claim_uploaded
+            (False, True),  # query_reply_uploaded
+            (None, date(2026, 1, 20)),  # query_reply_date
+            ('pending', 'dispatched'),  # physical_file_dispatch
+            (None, Decimal('0'), Decimal('500.00')),  # approved_amount
+        )
+        Claim.objects.bulk_create([
+            Claim(
+                claim_id=f'CLM-{n}', settlement_date=settlement_date, receipt_verified_bank=verified,
+                query_on_claim_uploaded=query, query_reply_uploaded=reply_uploaded, query_reply_date=reply_date,
+                physical_file_dispatch=dispatch, approved_amount=approved,
+            )
+            for n, (settlement_date, verified, query, reply_uploaded, reply_date, dispatch, approved)
+            in enumerate(combinations)
+        ])
+        claims = Claim.objects.annotate(derived_status=claim_status_expression())
+        self.assertEqual(len(claims), 192)
+        for claim in claims:
+            self.assertEqual(claim.derived_status, claim.derive_status(), claim.claim_id)
+
+
+class ClaimStatusApiTests(TestCase):
+    def setUp(self):
+        self.claim = make_claim(settlement_date=date(2026, 2, 1), receipt_verified_bank=True)
+        self.url = reverse('claim-detail', args=[self.claim.pk])
+
+    def test_patch_refuses_to_take_back_a_settlement(self):
+        response = api_client('entry', 'dataentry').patch(self.url, {'receipt_verified_bank': False}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Claim.objects.get(pk=self.claim.pk).status, 'closed')
+
+    def test_reopen_needs_a_manager(self):
+        response = api_client('entry', 'dataentry').patch(
+            f'{self.url}?reopen=true', {'receipt_verified_bank': False}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_manager_reopens_and_history_records_it(self):
+        response = api_client('manager', 'manager').patch(
+            f'{self.url}?reopen=true', {'receipt_verified_bank': False}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'settled_unverified')
+        change = ClaimChange.objects.filter(claim_id=self.claim.pk, action='update').latest('id')
+        self.assertEqual(change.changes['status'], ['closed', 'settled_unverified'])
+        self.assertEqual(change.user.username, 'manager')
+
+
+class ClaimQueueTests(TestCase):
+    def test_queue_counts(self):
+        make_claim(claim_id='A')
+        make_claim(claim_id='B')
+        make_claim(claim_id='C', physical_file_dispatch='pending')
+        make_claim(claim_id='D', approved_amount=Decimal('800.00'))
+        make_claim(claim_id='E', settlement_date=date(2026, 2, 1))
+        make_claim(claim_id='F', settlement_date=date(2026, 2, 1), receipt_verified_bank=True)
+
+        response = api_client('entry', 'dataentry').get(reverse('claim-queues'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['status'] for row in response.data], list(OPEN_CLAIM_STATUSES))
+        self.assertEqual(
+            {row['status']: row['count'] for row in response.data},
+            {
+                'submitted': 2, 'awaiting_dispatch': 1, 'query_pending': 0,
+                'approved_unsettled': 1, 'settled_unverified': 1,
+            },
+        )
+
+
+class ClaimAuditTests(TestCase):
+    def changes(self, claim):
+        return list(ClaimChange.objects.filter(claim_id=claim.pk).order_by('id').values_list('action', 'changes'))
+
+    def test_diff(self):
+        self.assertEqual(
+            diff({'a': 1, 'b': None, 'c': 'x'}, {'a': 2, 'b': '', 'c': 'x'}),
+            {'a': [1, 2]},
+        )
+
+    def test_create_update_and_delete(self):
+        claim = make_claim()
+        action, changes = self.changes(claim)[0]
+        self.assertEqual(action, 'create')
+        self.assertEqual(changes['patient_name'], [None, 'Asha Rao'])
+
+        claim = Claim.objects.get(pk=claim.pk)
+        claim.patient_name = 'Asha R. Rao'
+        claim.save()
+        self.assertEqual(self.changes(claim)[1], ('update', {'patient_name': ['Asha Rao', 'Asha R. Rao']}))
+
+        claim.save()
+        self.assertEqual(len(self.changes(claim)), 2)
+
+        pk = claim.pk
+        claim.delete()
+        claim.pk = pk
+        action, changes = self.changes(claim)[2]
+        self.assertEqual(action, 'delete')
+        self.assertEqual(changes['patient_name'], ['Asha R. Rao', None])
+
+    def test_queryset_update(self):
+        first = make_claim(claim_id='A', tds=Decimal('10.00'))
+        second = make_claim(claim_id='B', tds=Decimal('25.00'))
+        Claim.objects.filter(pk__in=[first.pk, second.pk]).update(tds=Decimal('25.00'))
+        self.assertEqual(self.changes(first)[-1], ('update', {'tds': ['10.00', '25.00']}))
+        self.assertEqual(len(self.changes(second)), 1)
+
+    def test_paused(self):
+        claim = make_claim()
+        with paused():
+            Claim.objects.filter(pk=claim.pk).update(patient_name='Changed')
+        self.assertEqual(len(self.changes(claim)), 1)
+
+    def test_capture_buffers_with_user_and_source(self):
+        user = get_user_model().objects.create_user(username='manager', email='m@example.com', role='manager')
+        claim = make_claim()
+        with capture(user=user, source='test'):
+            Claim.objects.filter(pk=claim.pk).update(patient_name='Changed')
+            self.assertEqual(len(self.changes(claim)), 1)
+        change = ClaimChange.objects.filter(claim_id=claim.pk).latest('id')
+        self.assertEqual((change.user, change.source), (user, 'test'))
+
+    def test_audited_writes_roll_back_error_responses(self):
+        claim = make_claim()
+
+        @audited_writes
+        def view(request):
+            Claim.objects.filter(pk=claim.pk).update(patient_name='Changed')
+            return HttpResponse(status=409)
+
+        self.assertEqual(view(RequestFactory().patch('/')).status_code, 409)
+        self.assertEqual(Claim.objects.get(pk=claim.pk).patient_name, 'Asha Rao')
+        self.assertEqual(len(self.changes(claim)), 1)
+
+    def test_patch_is_recorded_with_user_and_request(self):
+        claim = make_claim()
+        url = reverse('claim-detail', args=[claim.pk])
+        response = api_client('entry', 'dataentry').patch(url, {'patient_name': 'Changed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        change = ClaimChange.objects.filter(claim_id=claim.pk).latest('id')
+        self.assertEqual(change.changes, {'patient_name': ['Asha Rao', 'Changed']})
+        self.assertEqual((change.user.username, change.source), ('entry', f'PATCH {url}'))
+
+
+class BankReconciliationTests(TestCase):
+    def statement(self, *rows):
+        return ['UTR,Amount,Value Date'] + [','.join(row) for row in rows]
+
+    def test_matching_levels(self):
+        exact = make_claim(claim_id='A', utr_number='utr-0001 x', approved_amount=Decimal('900.00'))
+        fuzzy = make_claim(claim_id='B', utr_number='N1234567890', approved_amount=Decimal('800.00'))
+        by_amount = make_claim(claim_id='C', approved_amount=Decimal('700.00'))
+        mismatch = make_claim(claim_id='D', utr_number='UTR9', approved_amount=Decimal('600.00'))
+
+        report = reconcile_statement(self.statement(
+            ('UTR0001X', '900.00', '2026-02-01'),
+            ('HDFCN1234567890', '800.50', '02/02/2026'),
+            ('', '700.00', '2026-02-03'),
+            ('UTR9', '100.00', '2026-02-04'),
+            ('OTHER', '55.00', '2026-02-05'),
+        ))
+
+        self.assertEqual(report['matched'], {'exact_utr': 1, 'fuzzy_utr': 1, 'amount': 1})
+        self.assertEqual([row['claim'] for row in report['amount_mismatches']], [mismatch.pk])
+        self.assertEqual([line['utr'] for line in report['unmatched_lines']], ['OTHER'])
+        self.assertEqual(report['claims_updated'], 3)
+
+        claims = Claim.objects.in_bulk([exact.pk, fuzzy.pk, by_amount.pk, mismatch.pk])
+        self.assertEqual(claims[exact.pk].settlement_date, date(2026, 2, 1))
+        self.assertEqual(claims[fuzzy.pk].amount_settled_in_ac, Decimal('800.50'))
+        self.assertEqual(claims[by_amount.pk].utr_number, '')
+        for claim in (claims[exact.pk], claims[fuzzy.pk], claims[by_amount.pk]):
+            self.assertTrue(claim.receipt_verified_bank)
+            self.assertEqual(claim.status, 'closed')
+        self.assertFalse(claims[mismatch.pk].receipt_verified_bank)
+
+        change = ClaimChange.objects.filter(claim_id=exact.pk).latest('id')
+        self.assertEqual(change.changes['status'], ['approved_unsettled', 'closed'])
+
+    def test_settlement_date_conflict_keeps_the_recorded_date(self):
+        claim = make_claim(utr_number='UTR1', settlement_date=date(2026, 2, 1))
+        report = reconcile_statement(self.statement(('UTR1', '1000.00', '2026-02-07')))
+        self.assertEqual(
+            [(row['claim'], row['settlement_date'], row['date']) for row in report['settlement_date_conflicts']],
+            [(claim.pk, date(2026, 2, 1), date(2026, 2, 7))],
+        )
+        claim.refresh_from_db()
+        self.assertEqual(claim.settlement_date, date(2026, 2, 1))
+        self.assertTrue(claim.receipt_verified_bank)
+
+    def test_dry_run_writes_nothing(self):
+        claim = make_claim(utr_number='UTR1')
+        report = reconcile_statement(self.statement(('UTR1', '1000.00', '2026-02-07')), dry_run=True)
+        self.assertEqual(report['matched']['exact_utr'], 1)
+        self.assertEqual(report['claims_updated'], 0)
+        self.assertFalse(Claim.objects.get(pk=claim.pk).receipt_verified_bank)
+
+    def test_missing_column(self):
+        with self.assertRaises(StatementError):
+            reconcile_statement(['UTR,Amount', 'UTR1,10'])
+
+
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        use_documents_dir(self)
+        self.claim = make_claim()
+
+    def leftover_chunks(self):
+        return [name for name in os.listdir(incoming_dir()) if name.endswith('.chunk')]
+
+    def test_upload_in_chunks(self):
+        content = b'hello world'
+        upload = start_upload(self.claim, 'approval_letter', 'letter.pdf', len(content),
+                              sha256=hashlib.sha256(content).hexdigest())
+        upload = append_chunk(upload.pk, 0, io.BytesIO(content[:5]))
+        self.assertEqual(upload.offset, 5)
+
+        # A repeated chunk is refused with the offset to carry on from
+        with self.assertRaisesMessage(UploadOffsetMismatch, 'at offset 5'):
+            append_chunk(upload.pk, 0, io.BytesIO(content[:5]))
+
+        document = append_chunk(upload.pk, 5, io.BytesIO(content[5:]))
+        self.assertIsInstance(document, ClaimDocument)
+        self.assertEqual(document.size, len(content))
+        with open(blob_path(document.sha256), 'rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertFalse(DocumentUpload.objects.exists())
+        self.assertTrue(Claim.objects.get(pk=self.claim.pk).approval_letter_uploaded)
+        self.assertEqual(os.listdir(incoming_dir()), [])
+
+    def test_chunk_past_the_declared_size(self):
+        upload = start_upload(self.claim, 'other', 'scan.pdf', 4)
+        with self.assertRaises(DocumentError):
+            append_chunk(upload.pk, 0, io.BytesIO(b'12345'))
+        self.assertEqual(DocumentUpload.objects.get(pk=upload.pk).offset, 0)
+        self.assertEqual(self.leftover_chunks(), [])
+
+    def test_lost_part_bytes_move_the_offset_back(self):
+        upload = start_upload(self.claim, 'other', 'scan.pdf', 10)
+        upload = append_chunk(upload.pk, 0, io.BytesIO(b'12345'))
+        with open(part_path(upload), 'r+b') as f:
+            f.truncate(2)
+        with self.assertRaisesMessage(UploadOffsetMismatch, 'at offset 2'):
+            append_chunk(upload.pk, 5, io.BytesIO(b'67890'))
+        self.assertEqual(self.leftover_chunks(), [])
+
+        document = append_chunk(upload.pk, 2, io.BytesIO(b'34567890'))
+        with open(blob_path(document.sha256), 'rb') as f:
+            self.assertEqual(f.read(), b'1234567890')
+
+    def test_checksum_mismatch_cancels_the_upload(self):
+        upload = start_upload(self.claim, 'other', 'scan.pdf', 3, sha256='0' * 64)
+        with self.assertRaises(DocumentError):
+            append_chunk(upload.pk, 0, io.BytesIO(b'abc'))
+        self.assertFalse(DocumentUpload.objects.exists())
+        self.assertFalse(ClaimDocument.objects.exists())
+        self.assertEqual(os.listdir(incoming_dir()), [])
+
+
+class DocumentApiTests(TestCase):
+    def setUp(self):
+        use_documents_dir(self)
+        self.claim = make_claim()
+        self.client = api_client('entry', 'dataentry')
+
+    def last_change(self):
+        return ClaimChange.objects.filter(claim_id=self.claim.pk).latest('id')
+
+    def test_upload_and_delete_are_recorded_in_the_history(self):
+        url = reverse('claim-document-list', args=[self.claim.pk])
+        response = self.client.post(url, {
+            'kind': 'approval_letter', 'file': SimpleUploadedFile('letter.pdf', b'%PDF-1.4 letter'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        change = self.last_change()
+        self.assertEqual(change.changes, {'approval_letter_uploaded': [False, True]})
+        self.assertEqual((change.user.username, change.source), ('entry', f'POST {url}'))
+
+        url = reverse('claim-document-detail', args=[response.data['id']])
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        change = self.last_change()
+        self.assertEqual(change.changes, {'approval_letter_uploaded': [True, False]})
+        self.assertEqual((change.user.username, change.source), ('entry', f'DELETE {url}'))
+
+    def test_resumable_upload_is_recorded_in_the_history(self):
+        response = self.client.post(
+            reverse('claim-document-upload-start', args=[self.claim.pk]),
+            {'kind': 'physical_file', 'name': 'file.pdf', 'size': 10}, format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        url = reverse('claim-document-upload', args=[response.data['id']])
+
+        def patch(offset, body):
+            return self.client.patch(url, body, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+        self.assertEqual(patch(0, b'01234').data['offset'], 5)
+        response = patch(0, b'01234')
+        self.assertEqual((response.status_code, response.data['offset']), (409, 5))
+        self.assertEqual(patch(5, b'56789').status_code, 201)
+        change = self.last_change()
+        self.assertEqual(change.changes, {'physical_file_uploaded': [False, True]})
+        self.assertEqual((change.user.username, change.source), ('entry', f'PATCH {url}'))
+
+    def test_failed_upload_changes_nothing(self):
+        upload = start_upload(self.claim, 'physical_file', 'file.pdf', 3, sha256='0' * 64)
+        response = self.client.patch(
+            reverse('claim-document-upload', args=[upload.pk]), b'abc',
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ClaimDocument.objects.exists())
+        self.assertFalse(Claim.objects.get(pk=self.claim.pk).physical_file_uploaded)
+        self.assertEqual(ClaimChange.objects.filter(claim_id=self.claim.pk).count(), 1)
+
+
+class DocumentRangeTests(TestCase):
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 100))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 100))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 100))
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 1000))
+        self.assertEqual(parse_range('bytes=990-2000', 1000), (990, 10))
+        self.assertIsNone(parse_range('bytes=0-1,5-9', 1000))
+        self.assertIsNone(parse_range('items=0-1', 1000))
+        self.assertIsNone(parse_range('bytes=-', 1000))
+        self.assertIsNone(parse_range('bytes=5-3', 1000))
+        for header in ('bytes=1000-', 'bytes=1000-1001', 'bytes=-0'):
+            with self.assertRaises(ValueError):
+                parse_range(header, 1000)
+
+    def test_file_responses(self):
+        documents_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, documents_dir)
+        path = os.path.join(documents_dir, 'file')
+        with open(path, 'wb') as f:
+            f.write(b'0123456789')
+        etag = '"abc"'
+        factory = RequestFactory()
+
+        def get(**headers):
+            response = stored_file_response(factory.get('/', **headers), path, etag, filename='file.pdf')
+            self.addCleanup(response.close)
+            return response
+
+        with override_settings(CLAIM_DOCUMENTS_DIR=documents_dir, CLAIM_DOCUMENTS_SENDFILE=''):
+            response = get(HTTP_RANGE='bytes=2-4')
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+            self.assertEqual(b''.join(response.streaming_content), b'234')
+
+            response = get(HTTP_RANGE='bytes=20-')
+            self.assertEqual(response.status_code, 416)
+            self.assertEqual(response['Content-Range'], 'bytes */10')
+
+            response = get(HTTP_RANGE='bytes=5-3')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+            # A stale If-Range gets the whole file
+            response = get(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"other"')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+            self.assertEqual(get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with override_settings(CLAIM_DOCUMENTS_DIR=documents_dir, CLAIM_DOCUMENTS_SENDFILE='x-accel-redirect',
+                               CLAIM_DOCUMENTS_ACCEL_PREFIX='/protected/'):
+            response = get(HTTP_RANGE='bytes=2-4')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['X-Accel-Redirect'], '/protected/file')
+
+
+class MonthCloseTests(TestCase):
+    def setUp(self):
+        use_documents_dir(self, CLAIM_SNAPSHOT_BACKGROUND_REFRESH=False)
+        self.claim = make_claim()
+
+    def test_check_month_uses_the_local_date(self):
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2026, 2, 1)):
+            check_month('2026-01')
+            with self.assertRaises(SnapshotError):
+                check_month('2026-02')
+
+    def test_claim_change_marks_the_snapshot_stale(self):
+        snapshot, written = build_snapshot('2026-01')
+        self.assertTrue(written)
+        self.assertEqual((snapshot.claim_count, snapshot.stale), (1, False))
+
+        self.claim.patient_name = 'Changed'
+        self.claim.save()
+        self.assertTrue(MonthSnapshot.objects.get(pk=snapshot.pk).stale)
+        # An edit to a snapshot that is already stale still counts
+        Claim.objects.filter(pk=self.claim.pk).update(patient_name='Changed again')
+        self.assertEqual(MonthSnapshot.objects.get(pk=snapshot.pk).change_version, snapshot.change_version + 2)
+
+        snapshot, written = build_snapshot('2026-01')
+        self.assertTrue(written)
+        self.assertFalse(snapshot.stale)
+
+    def test_change_during_a_build_keeps_the_snapshot_stale(self):
+        build_snapshot('2026-01')
+        self.claim.patient_name = 'Changed'
+        self.claim.save()
+
+        write_claims_csv = month_close.write_claims_csv
+
+        def write_then_change(claims, f):
+            count = write_claims_csv(claims, f)
+            # Lands after the claims were read, as a concurrent edit would
+            Claim.objects.filter(pk=self.claim.pk).update(patient_name='Changed during the build')
+            return count
+
+        with mock.patch.object(month_close, 'write_claims_csv', write_then_change):
+            snapshot, _ = build_snapshot('2026-01')
+        self.assertTrue(snapshot.stale)
+        self.assertTrue(MonthSnapshot.objects.get(pk=snapshot.pk).stale)
+
+        snapshot, written = build_snapshot('2026-01')
+        self.assertTrue(written)
+        self.assertFalse(snapshot.stale)
+
+
+class PartitionIntervalTests(TestCase):
+    def test_month_range(self):
+        self.assertEqual(month_range('2026-02'), (date(2026, 2, 1), date(2026, 3, 1)))
+        self.assertEqual(month_range('2026-12'), (date(2026, 12, 1), date(2027, 1, 1)))
+
+    def test_intervals(self):
+        self.assertEqual(interval_start(date(2026, 5, 17), 'month'), date(2026, 5, 1))
+        self.assertEqual(interval_start(date(2026, 5, 17), 'quarter'), date(2026, 4, 1))
+        self.assertEqual(interval_start(date(2026, 12, 31), 'quarter'), date(2026, 10, 1))
+        self.assertEqual(next_interval(date(2026, 12, 1), 'month'), date(2027, 1, 1))
+        self.assertEqual(next_interval(date(2026, 10, 1), 'quarter'), date(2027, 1, 1))
+        self.assertEqual(next_interval(date(2026, 1, 1), 'quarter'), date(2026, 4, 1))
+
+    def test_partition_name(self):
+        self.assertEqual(partition_name('claims_claim', date(2026, 3, 1), 'month'), 'claims_claim_2026_03')
+        self.assertEqual(partition_name('claims_claim', date(2026, 10, 1), 'quarter'), 'claims_claim_2026q4')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Claims partitioning needs PostgreSQL')
+class PartitionedTableTests(TestCase):
+    def partition_of(self, claim):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM claims_claim WHERE id = %s', [claim.pk])
+            return cursor.fetchone()[0]
+
+    def test_convert_and_add_partitions(self):
+        old = make_claim(claim_id='A')
+        undated = make_claim(claim_id='B', date_of_discharge=None)
+        far = make_claim(claim_id='C', date_of_admission=date(2030, 5, 1), date_of_discharge=date(2030, 5, 10))
+
+        with connection.cursor() as cursor:
+            # The DDL refuses to run with the claims' deferred foreign key checks still pending
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2026, 3, 15)):
+            created = convert_to_partitioned('month', ahead=1)
+        self.assertTrue(is_partitioned())
+        self.assertEqual(detect_interval(), 'month')
+        # January up to the last discharge month and one ahead, all copied in
+        self.assertEqual(created[0], 'claims_claim_2026_01')
+        self.assertEqual(created[-1], 'claims_claim_2030_06')
+        self.assertEqual(self.partition_of(old), 'claims_claim_2026_01')
+        self.assertEqual(self.partition_of(undated), 'claims_claim_default')
+        self.assertEqual(self.partition_of(far), 'claims_claim_2030_05')
+
+        # New claims keep their numbering, and saves still work through the ORM
+        new = make_claim(claim_id='D', date_of_discharge=date(2031, 2, 3))
+        self.assertGreater(new.pk, far.pk)
+        self.assertEqual(self.partition_of(new), 'claims_claim_default')
+        new.patient_name = 'Changed'
+        new.save()
+
+        # A partition created later takes its rows out of DEFAULT
+        self.assertEqual(create_partitions(date(2031, 2, 1), date(2031, 3, 1), 'month'), ['claims_claim_2031_02'])
+        self.assertEqual(self.partition_of(new), 'claims_claim_2031_02')
+        self.assertEqual(Claim.objects.get(pk=new.pk).patient_name, 'Changed')
+
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2031, 2, 20)):
+            self.assertEqual(ensure_future_partitions('month', ahead=2), ['claims_claim_2031_03', 'claims_claim_2031_04'])
+            self.assertEqual(ensure_future_partitions('month', ahead=2), [])
+        self.assertIn('claims_claim_2031_04', existing_partitions())
+
+
+class ClaimCubeTests(TestCase):
+    def setUp(self):
+        medi, care = Tpa.objects.create(name='Medi Assist'), Tpa.objects.create(name='Care TPA')
+        star = Insurer.objects.create(name='Star Health')
+        rows = [
+            (medi, star, date(2026, 1, 5), None, '1000.00'),
+            (medi, star, date(2026, 1, 9), date(2026, 2, 1), '2500.50'),
+            (medi, None, date(2026, 2, 3), date(2026, 3, 1), '700.25'),
+            (care, star, date(2026, 2, 11), None, '1200.00'),
+            (None, None, date(2026, 1, 20), None, '300.00'),
+        ]
+        for n, (tpa, insurer, discharged, settled_on, bill) in enumerate(rows):
+            make_claim(
+                claim_id=f'CLM-{n}', tpa=tpa, insurer=insurer, date_of_admission=discharged,
+                date_of_discharge=discharged, settlement_date=settled_on, bill_amount=Decimal(bill),
+            )
+
+    def cells(self, cube):
+        columns = cube['columns']
+        keys = cube['dimensions'] + ['grouping']
+        return {
+            tuple(columns[key][i] for key in keys): tuple(columns[m][i] for m in cube['measures'])
+            for i in range(cube['row_count'])
+        }
+
+    def test_cube_matches_orm_aggregates(self):
+        cube = run_cube(Claim.objects.all(), ['tpa_name', 'settled'], ['id__count', 'bill_amount__sum'])
+        cells = self.cells(cube)
+        self.assertEqual(len(cells), cube['row_count'])
+
+        settled = ExpressionWrapper(Q(settlement_date__isnull=False), output_field=BooleanField())
+        claims = Claim.objects.annotate(settled=settled).order_by()
+        expected = {}
+        for dims, grouping in (
+            (('tpa__name', 'settled'), 0), (('tpa__name',), 1), (('settled',), 2), ((), 3),
+        ):
+            if dims:
+                rows = claims.values(*dims).annotate(count=Count('id'), bill=Sum('bill_amount'))
+            else:
+                rows = [claims.aggregate(count=Count('id'), bill=Sum('bill_amount'))]
+            for row in rows:
+                tpa = (row['tpa__name'] or '') if 'tpa__name' in dims else None
+                key = (tpa, row['settled'] if 'settled' in dims else None, grouping)
+                expected[key] = (row['count'], round(float(row['bill']), 2))
+        self.assertEqual(cells, expected)
+        self.assertEqual(cells[(None, None, 3)], (5, 5700.75))
+
+    def test_rollup_and_filters(self):
+        cube = run_cube(
+            Claim.objects.filter(month='2026-01'), ['month', 'parent_insurance'], ['id__count'], mode='rollup',
+        )
+        self.assertEqual(self.cells(cube), {
+            ('2026-01', 'Star Health', 0): (2,),
+            ('2026-01', '', 0): (1,),
+            ('2026-01', None, 1): (3,),
+            (None, None, 3): (3,),
+        })
+
+    def test_row_limit(self):
+        with self.assertRaisesMessage(CubeError, 'exceeds 3 rows'):
+            run_cube(Claim.objects.all(), ['tpa_name', 'month'], ['id__count'], max_rows=3)
+        self.assertEqual(run_cube(Claim.objects.all(), ['settled'], ['id__count'], max_rows=3)['row_count'], 3)
+
+    def test_api(self):
+        client = api_client('manager', 'manager')
+        response = client.get(reverse('claims-cube'), {'dimensions': 'settled', 'measures': 'id__count'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['columns']['id__count'][-1], 5)
+        response = client.get(reverse('claims-cube'), {'dimensions': 'patient_name'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ReceivablesAgeingTests(TestCase):
+    as_of = date(2026, 4, 30)
+
+    def setUp(self):
+        tpa = Tpa.objects.create(name='Medi Assist')
+        for n, (discharged, approved, settled_on) in enumerate([
+            (date(2026, 4, 20), '100.00', None),  # 10 days
+            (date(2026, 3, 31), '200.00', None),  # 30 days, still 0-30
+            (date(2026, 3, 30), '300.00', None),  # 31 days
+            (date(2026, 2, 1), '400.00', None),  # 88 days
+            (date(2025, 12, 1), '500.00', None),  # 150 days
+            (date(2026, 1, 1), '600.00', date(2026, 2, 1)),  # settled
+            (date(2026, 5, 10), '700.00', None),  # after the as-of date
+            (None, '800.00', None),
+        ]):
+            make_claim(
+                claim_id=f'CLM-{n}', tpa=tpa if n % 2 else None, date_of_admission=discharged,
+                date_of_discharge=discharged, approved_amount=Decimal(approved), settlement_date=settled_on,
+            )
+
+    def test_buckets(self):
+        report = ageing_report(Claim.objects.all(), self.as_of, oldest=1)
+        self.assertEqual(
+            [(row['bucket'], row['claim_count'], row['outstanding_amount']) for row in report['totals']],
+            [('0-30', 2, 300.0), ('31-60', 1, 300.0), ('61-90', 1, 400.0), ('90+', 1, 500.0)],
+        )
+        self.assertEqual((report['undated_claims'], report['future_dated_claims']), (1, 1))
+        self.assertEqual(
+            {row['name']: row['buckets'] for row in report['by_tpa']},
+            {
+                'Medi Assist': {'0-30': 200.0, '31-60': 0.0, '61-90': 400.0, '90+': 0.0},
+                '': {'0-30': 100.0, '31-60': 300.0, '61-90': 0.0, '90+': 500.0},
+            },
+        )
+        self.assertEqual(
+            {label: [(claim['claim_id'], claim['age_days']) for claim in claims]
+             for label, claims in report['oldest'].items()},
+            {'0-30': [('CLM-1', 30)], '31-60': [('CLM-2', 31)], '61-90': [('CLM-3', 88)], '90+': [('CLM-4', 150)]},
+        )
+
+    def test_api_ages_from_the_local_date(self):
+        client = api_client('manager', 'manager')
+        with mock.patch('django.utils.timezone.localdate', return_value=self.as_of):
+            response = client.get(reverse('receivables-ageing'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['as_of'], '2026-04-30')
+        self.assertEqual(response.data['future_dated_claims'], 1)
+        self.assertEqual(client.get(reverse('receivables-ageing'), {'as_of': '30/04/2026'}).status_code, 400)
+
+
+class SettlementLagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        medi, care = Tpa.objects.create(name='Medi Assist'), Tpa.objects.create(name='Care TPA')
+        discharged = date(2026, 1, 1)
+        for n, (tpa, settlement_lag, reply_lag) in enumerate([
+            (medi, 10, None), (medi, 20, 3), (medi, 30, None), (medi, 40, 5),
+            (care, 5, None),
+            (care, -2, None),  # settled before discharge: a typing error, left out
+            (care, None, 7),
+        ]):
+            make_claim(
+                claim_id=f'CLM-{n}', tpa=tpa, date_of_admission=discharged, date_of_discharge=discharged,
+                settlement_date=discharged + timedelta(days=settlement_lag) if settlement_lag is not None else None,
+                query_reply_date=discharged + timedelta(days=reply_lag) if reply_lag is not None else None,
+            )
+
+    def test_sketch_matches_percentile_cont(self):
+        sketch = LagSketch()
+        for days in (4, 1, 10, 3, 2):
+            sketch.add(days)
+        self.assertEqual([sketch.quantile(q) for q in (0, 0.5, 0.75, 1)], [1, 3, 4, 10])
+        self.assertAlmostEqual(sketch.quantile(0.9), 7.6)
+        self.assertIsNone(LagSketch().quantile(0.5))
+
+    def test_percentiles_per_group(self):
+        stats = compute_lag_stats('2026-01')
+        self.assertEqual(stats['overall']['settlement_lag'], {'count': 5, 'p50': 20.0, 'p75': 30.0, 'p90': 36.0, 'p99': 39.6})
+        self.assertEqual(stats['overall']['query_reply_lag'], {'count': 3, 'p50': 5.0, 'p75': 6.0, 'p90': 6.6, 'p99': 6.96})
+        by_tpa = {row['name']: row for row in stats['by_tpa']}
+        self.assertEqual(by_tpa['Medi Assist']['settlement_lag']['p50'], 25.0)
+        self.assertEqual(by_tpa['Care TPA']['settlement_lag'], {'count': 1, 'p50': 5.0, 'p75': 5.0, 'p90': 5.0, 'p99': 5.0})
+        self.assertEqual([row['name'] for row in stats['by_insurer']], [''])
+        self.assertEqual(compute_lag_stats('2025-12')['overall']['settlement_lag']['count'], 0)
+
+    def test_cache_follows_claim_changes(self):
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2026, 3, 1)):
+            self.assertFalse(lag_stats('2026-01')['cached'])
+            self.assertTrue(lag_stats('2026-01')['cached'])
+
+            claim = Claim.objects.get(claim_id='CLM-0')
+            claim.settlement_date = date(2026, 1, 3)
+            claim.save()
+            stats = lag_stats('2026-01')
+            self.assertFalse(stats['cached'])
+            self.assertEqual(stats['overall']['settlement_lag']['p50'], 20.0)
+            self.assertTrue(lag_stats('2026-01')['cached'])
+
+            # Bumped once the update commits
+            with self.captureOnCommitCallbacks(execute=True):
+                Claim.objects.filter(claim_id='CLM-4').update(settlement_date=date(2026, 1, 31))
+            stats = lag_stats('2026-01')
+            self.assertFalse(stats['cached'])
+            self.assertEqual(stats['by_tpa'][-1]['settlement_lag']['p50'], 30.0)
+
+            # The current month is always computed live
+            self.assertFalse(lag_stats('2026-03')['cached'])
+            self.assertFalse(lag_stats('2026-03')['cached'])
+
+    def test_cache_entries_expire(self):
+        with override_settings(LAG_STATS_CACHE_SECONDS=0):
+            self.assertFalse(lag_stats()['cached'])
+            self.assertFalse(lag_stats()['cached'])
+
+    def test_api(self):
+        response = api_client('manager', 'manager').get(reverse('settlement-lag-stats'), {'month': '2026-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['overall']['settlement_lag']['count'], 5)
+
+
+class MonthwiseTrendTests(TestCase):
+    def setUp(self):
+        # No claims in 2025-03 or 2025-12, so nothing compares against those months
+        for n, (discharged, bill, co_pay) in enumerate([
+            (date(2025, 1, 10), '1000.00', None),
+            (date(2025, 2, 10), '1000.00', '50.00'),
+            (date(2025, 2, 20), '500.00', None),
+            (date(2025, 4, 10), '600.00', None),
+            (date(2026, 1, 10), '2000.00', None),
+            (date(2026, 2, 10), '3000.00', '25.00'),
+        ]):
+            make_claim(
+                claim_id=f'CLM-{n}', date_of_admission=discharged, date_of_discharge=discharged,
+                bill_amount=Decimal(bill), co_pay=Decimal(co_pay) if co_pay else None,
+            )
+
+    def bills(self, trends):
+        return {
+            row['month']: tuple(row['metrics']['total_bill'][key] for key in ('value', 'mom_pct', 'yoy_pct', 'rolling_3m_avg'))
+            for row in trends
+        }
+
+    def test_windows_follow_the_calendar(self):
+        trends = monthwise_trends()
+        self.assertEqual(self.bills(trends), {
+            '2025-01': (1000.0, None, None, 1000.0),
+            '2025-02': (1500.0, 50.0, None, 1250.0),
+            '2025-04': (600.0, None, None, 1050.0),
+            '2026-01': (2000.0, None, 100.0, 2000.0),
+            '2026-02': (3000.0, 50.0, 100.0, 2500.0),
+        })
+        metrics = {row['month']: row['metrics'] for row in trends}
+        self.assertEqual(metrics['2025-02']['claim_count']['value'], 2)
+        self.assertEqual(metrics['2025-02']['total_deductions']['value'], 50.0)
+        self.assertEqual(metrics['2026-02']['total_deductions']['mom_pct'], None)
+
+    def test_archived_months_join_the_windows(self):
+        archive = ClaimArchive.objects.create(
+            month='2025-03', path='2025-03/a.parquet', row_count=2, size_bytes=1, sha256='0' * 64,
+            archived_before=date(2025, 12, 1), first_claim_id=1, last_claim_id=2,
+        )
+        ClaimArchiveTotal.objects.create(archive=archive, claim_count=2, bill_amount=Decimal('750.00'))
+        bills = self.bills(monthwise_trends(include_archive=True))
+        self.assertEqual(bills['2025-03'], (750.0, -50.0, None, 1083.33))
+        self.assertEqual(bills['2025-04'], (600.0, -20.0, None, 950.0))
+        self.assertNotIn('2025-03', self.bills(monthwise_trends()))
+
+    def test_api(self):
+        response = api_client('manager', 'manager').get(reverse('dashboard-monthwise'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['name'] for row in response.data][:2], ['January 2025', 'February 2025'])
+        self.assertEqual(response.data[-1]['metrics']['total_bill']['yoy_pct'], 100.0)
+
+
+@skipUnless(archive.pyarrow_available(), 'The claims archive needs pyarrow')
+class ClaimArchiveTests(TestCase):
+    before = date(2024, 6, 1)
+
+    def setUp(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        settings_override = override_settings(CLAIMS_ARCHIVE_DIR=path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.archive_dir = path
+
+        tpa = Tpa.objects.create(name='Medi Assist')
+        star = Insurer.objects.create(name='Star Health')
+        for n in range(5):
+            make_claim(
+                claim_id=f'JAN-{n}', patient_name=f'Patient {n}', tpa=tpa, insurer=star if n % 2 else None,
+                date_of_admission=date(2024, 1, 2), date_of_discharge=date(2024, 1, 10 + n),
+                bill_amount=Decimal('1000.25') + n, co_pay=Decimal('10.00'),
+                settlement_date=date(2024, 2, 1), receipt_verified_bank=True,
+            )
+        # Not verified against the bank, and settled after the cutoff: both stay
+        make_claim(claim_id='JAN-X', date_of_discharge=date(2024, 1, 20), settlement_date=date(2024, 2, 1))
+        make_claim(claim_id='FEB-X', date_of_discharge=date(2024, 2, 20), settlement_date=date(2024, 7, 1),
+                   receipt_verified_bank=True)
+
+    def files(self):
+        return [name for _, _, names in os.walk(self.archive_dir) for name in names]
+
+    def test_archive_round_trip(self):
+        archives = archive.archive_claims(self.before)
+        self.assertEqual([(a.month, a.row_count) for a in archives], [('2024-01', 5)])
+        self.assertEqual(
+            sorted(Claim.objects.values_list('claim_id', flat=True)), ['FEB-X', 'JAN-X']
+        )
+        # A move, not a delete
+        self.assertFalse(ClaimChange.objects.filter(action='delete').exists())
+        with open(archive.archive_path(archives[0]), 'rb') as f:
+            self.assertEqual(hashlib.sha256(f.read()).hexdigest(), archives[0].sha256)
+
+        rows = archive.read_archive(months=['2024-01']).to_pylist()
+        self.assertEqual([row['claim_id'] for row in rows], [f'JAN-{n}' for n in range(5)])
+        self.assertEqual(rows[1]['bill_amount'], Decimal('1001.25'))
+        self.assertEqual((rows[1]['tpa_name'], rows[1]['parent_insurance']), ('Medi Assist', 'Star Health'))
+        self.assertEqual(rows[0]['date_of_discharge'], date(2024, 1, 10))
+
+        totals = {
+            total.insurer_id: (total.claim_count, total.bill_amount, total.deductions)
+            for total in ClaimArchiveTotal.objects.filter(archive=archives[0])
+        }
+        star = Insurer.objects.get().pk
+        self.assertEqual(totals, {
+            star: (2, Decimal('2004.50'), Decimal('20.00')),
+            None: (3, Decimal('3006.75'), Decimal('30.00')),
+        })
+        self.assertEqual(archive.archived_totals()[0]['total_bill_amount'], Decimal('5011.25'))
+
+        # Nothing left to move the second time
+        self.assertEqual(archive.archive_claims(self.before), [])
+
+    def test_failed_move_leaves_no_file(self):
+        with mock.patch.object(ClaimArchiveTotal.objects, 'bulk_create', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                archive.archive_claims(self.before)
+        self.assertEqual(self.files(), [])
+        self.assertFalse(ClaimArchive.objects.exists())
+        self.assertEqual(Claim.objects.count(), 7)
+
+    def test_pages_across_row_groups(self):
+        # Two claims per row group
+        with mock.patch.object(archive, 'CHUNK_SIZE', 2):
+            moved, = archive.archive_claims(self.before)
+        self.assertEqual(archive.pq.ParquetFile(archive.archive_path(moved)).num_row_groups, 3)
+        count, rows = archive.read_archive_page('2024-01', 1, 3)
+        self.assertEqual((count, [row['claim_id'] for row in rows]), (5, ['JAN-1', 'JAN-2', 'JAN-3']))
+        count, rows = archive.read_archive_page('2024-01', 0, 10, search='patient 3')
+        self.assertEqual((count, [row['claim_id'] for row in rows]), (1, ['JAN-3']))
+        count, rows = archive.read_archive_page('2024-01', 1, 10, search='jan')
+        self.assertEqual((count, [row['claim_id'] for row in rows]), (5, ['JAN-1', 'JAN-2', 'JAN-3', 'JAN-4']))
+
+    def test_archived_claims_api(self):
+        archive.archive_claims(self.before)
+        client = api_client('manager', 'manager')
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'PAGE_SIZE': 2}):
+            response = client.get(reverse('claim-archive-claims'), {'month': '2024-01', 'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual([row['claim_id'] for row in response.data['results']], ['JAN-2', 'JAN-3'])
+        self.assertIn('page=3', response.data['next'])
+        self.assertIn('page=1', response.data['previous'])
+
+
+@skipUnless(exports.xlsxwriter_available() and openpyxl is not None, 'Excel export tests need XlsxWriter and openpyxl')
+class ExcelExportTests(TestCase):
+    def setUp(self):
+        use_documents_dir(self, CLAIM_SNAPSHOT_BACKGROUND_REFRESH=False)
+        medi = Tpa.objects.canonical('Medi Assist')
+        make_claim(claim_id='A', tpa=medi, approved_amount=Decimal('900.50'), settlement_date=date(2026, 2, 1),
+                   receipt_verified_bank=True)
+        make_claim(claim_id='B', tpa=Tpa.objects.canonical('Care TPA'), date_of_discharge=date(2026, 1, 8))
+        make_claim(claim_id='C', tpa=medi, date_of_admission=date(2026, 2, 1), date_of_discharge=date(2026, 2, 3))
+        self.client = api_client('entry', 'dataentry')
+
+    def sheet_rows(self, content):
+        sheet = openpyxl.load_workbook(io.BytesIO(content), read_only=True).active
+        return [list(row) for row in sheet.iter_rows(values_only=True)]
+
+    def test_typed_cells(self):
+        output = io.BytesIO()
+        self.assertEqual(exports.write_claims_xlsx(Claim.objects.filter(claim_id='A'), output), 1)
+        header, row = self.sheet_rows(output.getvalue())
+        cells = dict(zip(header, row))
+        self.assertEqual(cells['Claim ID'], 'A')
+        self.assertEqual(cells['Status'], 'Settled and Verified')
+        self.assertEqual(cells['Approved Amount'], 900.5)
+        self.assertEqual(cells['Settlement Date'], datetime(2026, 2, 1))
+        self.assertEqual(cells['Receipt Amount Verification'], 'Yes')
+        self.assertEqual(cells['TPA Name'], 'Medi Assist')
+        self.assertIsNone(cells['UTR Number'])
+
+    def test_export_follows_the_list_filters(self):
+        response = self.client.get(reverse('claim-export-xlsx'), {
+            'tpa_name': 'MEDI ASSIST', 'ordering': 'date_of_discharge',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], exports.XLSX_CONTENT_TYPE)
+        rows = self.sheet_rows(b''.join(response.streaming_content))
+        self.assertEqual([row[0] for row in rows[1:]], ['A', 'C'])
+
+        response = self.client.get(reverse('claim-export-xlsx'), {'month': '2026-01', 'search': 'B'})
+        self.assertEqual([row[0] for row in self.sheet_rows(b''.join(response.streaming_content))[1:]], ['B'])
+
+    def test_archive_is_not_exported_to_excel(self):
+        response = self.client.get(reverse('claim-export-xlsx'), {'include_archive': '1'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_closed_month_is_served_from_its_snapshot(self):
+        snapshot, _ = build_snapshot('2026-01')
+        response = self.client.get(reverse('claim-export-xlsx'), {'month': '2026-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{snapshot.content_hash}"')
+        self.assertEqual(sorted(row[0] for row in self.sheet_rows(b''.join(response.streaming_content))[1:]), ['A', 'B'])
+
+        response = self.client.get(
+            reverse('claim-export-xlsx'), {'month': '2026-01'}, HTTP_IF_NONE_MATCH=f'"{snapshot.content_hash}"'
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # A change to the month regenerates the snapshot before it is served
+        Claim.objects.filter(claim_id='B').update(patient_name='Changed')
+        response = self.client.get(reverse('claim-export-xlsx'), {'month': '2026-01'})
+        self.assertNotEqual(response['ETag'], f'"{snapshot.content_hash}"')
+        rows = self.sheet_rows(b''.join(response.streaming_content))
+        self.assertIn('Changed', [row[rows[0].index('Patient Name')] for row in rows[1:]])
+
+
+@skipUnless(archive.pyarrow_available(), 'Parquet and Arrow exports need pyarrow')
+class ColumnarExportTests(TestCase):
+    def setUp(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        settings_override = override_settings(CLAIMS_ARCHIVE_DIR=path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.tpa = Tpa.objects.create(name='Vidal')
+        Tpa.objects.create(name='Medi Assist')
+        star = Insurer.objects.create(name='Star Health')
+        make_claim(claim_id='OLD', tpa=self.tpa, insurer=star, date_of_admission=date(2024, 1, 2),
+                   date_of_discharge=date(2024, 1, 5), settlement_date=date(2024, 2, 1), receipt_verified_bank=True)
+        make_claim(claim_id='B', tpa=self.tpa, bill_amount=Decimal('1234.56'))
+        make_claim(claim_id='A', insurer=star, date_of_discharge=date(2026, 1, 9))
+        self.client = api_client('entry', 'dataentry')
+
+    def export(self, file_format, params=None):
+        response = self.client.get(reverse(f'claim-export-{file_format}'), params or {})
+        self.assertEqual(response.status_code, 200, getattr(response, 'data', None))
+        content = b''.join(response.streaming_content)
+        if file_format == 'parquet':
+            return pq.read_table(pa.BufferReader(content))
+        return pa.ipc.open_file(pa.BufferReader(content)).read_all()
+
+    def test_parquet_types_and_dictionaries(self):
+        table = self.export('parquet')
+        self.assertEqual(table.schema.field('bill_amount').type, pa.decimal128(12, 2))
+        self.assertEqual(table.schema.field('date_of_discharge').type, pa.date32())
+        self.assertTrue(pa.types.is_dictionary(table.schema.field('tpa_name').type))
+        self.assertTrue(pa.types.is_dictionary(table.schema.field('parent_insurance').type))
+
+        # Primary key order, and the whole dimension table as the dictionary
+        rows = table.to_pylist()
+        self.assertEqual([row['claim_id'] for row in rows], ['OLD', 'B', 'A'])
+        self.assertEqual(rows[1]['bill_amount'], Decimal('1234.56'))
+        self.assertEqual(rows[2]['date_of_discharge'], date(2026, 1, 9))
+        self.assertEqual([row['tpa_name'] for row in rows], ['Vidal', 'Vidal', None])
+        self.assertEqual(table.column('tpa_name').chunk(0).dictionary.to_pylist(), ['Medi Assist', 'Vidal'])
+
+    def test_arrow_follows_the_list_filters(self):
+        table = self.export('arrow', {'month': '2026-01', 'ordering': '-date_of_discharge'})
+        self.assertEqual(table.column('claim_id').to_pylist(), ['A', 'B'])
+        self.assertEqual(table.column('parent_insurance').to_pylist(), ['Star Health', None])
+
+    def test_include_archive(self):
+        archive.archive_claims(date(2024, 6, 1))
+        # The archive keeps the name the claim had; the export adds it after the current names
+        self.tpa.name = 'Vidal Health'
+        self.tpa.save()
+
+        table = self.export('parquet', {'include_archive': 'true'})
+        self.assertEqual(table.column('claim_id').to_pylist(), ['B', 'A', 'OLD'])
+        self.assertEqual(table.column('tpa_name').to_pylist(), ['Vidal Health', None, 'Vidal'])
+        self.assertEqual(
+            table.column('tpa_name').chunk(0).dictionary.to_pylist(), ['Medi Assist', 'Vidal Health', 'Vidal']
+        )
+        self.assertEqual(table.column('bill_amount').type, pa.decimal128(12, 2))
+
+        table = self.export('arrow', {'include_archive': 'true', 'month': '2024-01'})
+        self.assertEqual(table.column('claim_id').to_pylist(), ['OLD'])
+
+        response = self.client.get(reverse('claim-export-parquet'), {'include_archive': 'true', 'tpa_name': 'Vidal'})
+        self.assertEqual(response.status_code, 400)
+
+
+@mock.patch.object(db_routers, 'replica_configured', return_value=True)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.router = db_routers.PrimaryReplicaRouter()
+        self.claim = make_claim(settlement_date=date(2026, 2, 1), receipt_verified_bank=True)
+
+    def test_reads_use_the_replica_only_inside_the_block(self, configured):
+        user = get_user_model().objects.create_user(username='entry', password='password', role='dataentry')
+        request = RequestFactory().get('/')
+        request.user = user
+        self.assertEqual(self.router.db_for_read(Claim), 'default')
+        with db_routers.replica_reads(request):
+            self.assertEqual(self.router.db_for_read(Claim), 'replica')
+            self.assertEqual(self.router.db_for_write(Claim), 'default')
+        self.assertEqual(self.router.db_for_read(Claim), 'default')
+
+        db_routers.pin_to_primary(user)
+        with db_routers.replica_reads(request):
+            self.assertEqual(self.router.db_for_read(Claim), 'default')
+
+    def test_successful_write_pins_the_user(self, configured):
+        url = reverse('claim-detail', args=[self.claim.pk])
+        client = api_client('entry', 'dataentry')
+        user = get_user_model().objects.get(username='entry')
+        request = RequestFactory().get('/')
+        request.user = user
+
+        client.get(url)
+        self.assertFalse(db_routers.is_pinned(request))
+        # A refused write leaves the user on the replica
+        response = client.patch(url, {'receipt_verified_bank': False}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(db_routers.is_pinned(request))
+
+        response = client.patch(url, {'patient_name': 'Asha R.'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(db_routers.is_pinned(request))
+
+
+class AsyncDashboardTests(TestCase):
+    def setUp(self):
+        medi = Tpa.objects.create(name='Medi Assist')
+        star = Insurer.objects.create(name='Star Health')
+        make_claim(claim_id='A', tpa=medi, insurer=star, approved_amount=Decimal('900.00'),
+                   settlement_date=date(2026, 2, 1), total_settled_amount=Decimal('850.00'))
+        make_claim(claim_id='B', insurer=star, date_of_discharge=date(2026, 2, 3))
+        make_claim(claim_id='C', bill_amount=Decimal('250.50'))
+        users = get_user_model().objects
+        self.manager = users.create_user(username='manager', email='manager@example.com', password='password', role='manager')
+        self.entry = users.create_user(username='entry', email='entry@example.com', password='password', role='dataentry')
+
+    def request(self, user=None, method='get'):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'} if user else {}
+        return getattr(AsyncRequestFactory(), method)('/', headers=headers)
+
+    async def test_async_views_match_the_sync_views(self):
+        for name in ('summary', 'monthwise', 'companywise'):
+            with self.subTest(name):
+                response = await getattr(async_views, f'dashboard_{name}')(self.request(self.manager))
+                self.assertEqual(response.status_code, 200)
+
+                request = APIRequestFactory().get('/')
+                force_authenticate(request, self.manager)
+                expected = await sync_to_async(getattr(views, f'dashboard_{name}'))(request)
+                expected.render()
+                self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    async def test_authentication_and_permission(self):
+        view = async_views.dashboard_summary
+        self.assertEqual((await view(self.request())).status_code, 401)
+        self.assertEqual((await view(self.request(self.entry))).status_code, 403)
+        self.assertEqual((await view(self.request(self.manager, method='post'))).status_code, 405)
+
+
+class CombinedDashboardTests(TestCase):
+    def setUp(self):
+        medi = Tpa.objects.create(name='Medi Assist')
+        star = Insurer.objects.create(name='Star Health')
+        care = Insurer.objects.create(name='Care Health')
+        make_claim(claim_id='A', tpa=medi, insurer=star, approved_amount=Decimal('900.00'),
+                   settlement_date=date(2026, 2, 1), total_settled_amount=Decimal('850.00'))
+        make_claim(claim_id='B', insurer=star, approved_amount=Decimal('100.00'), date_of_discharge=date(2026, 2, 3))
+        make_claim(claim_id='C', insurer=care, approved_amount=Decimal('2000.00'))
+        make_claim(claim_id='D', bill_amount=Decimal('250.50'))
+        self.manager = get_user_model().objects.create_user(
+            username='manager', email='manager@example.com', password='password', role='manager'
+        )
+
+    def get(self, view, **params):
+        request = APIRequestFactory().get('/', params)
+        force_authenticate(request, self.manager)
+        response = view(request)
+        response.render()
+        return response
+
+    def test_sections_match_the_separate_endpoints(self):
+        response = self.get(views.dashboard)
+        self.assertEqual(response.status_code, 200)
+        combined = json.loads(response.content)
+        self.assertEqual(list(combined), list(views.DASHBOARD_SECTIONS))
+        for name in views.DASHBOARD_SECTIONS:
+            with self.subTest(name):
+                separate = self.get(getattr(views, f'dashboard_{name}'))
+                self.assertEqual(combined[name], json.loads(separate.content))
+
+    def test_requested_sections_only(self):
+        data = self.get(views.dashboard, sections='companywise, summary').data
+        self.assertEqual(set(data), {'summary', 'companywise'})
+        # The summary alone is one ungrouped aggregate
+        with self.assertNumQueries(1):
+            views.build_dashboard(['summary'])
+
+    def test_invalid_section(self):
+        response = self.get(views.dashboard, sections='summary,weekly')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('weekly', response.data['error'])
+
+
+@skipUnless(analytics.numpy_available(), 'The analytics snapshot needs numpy')
+class AnalyticsSnapshotTests(TestCase):
+    def setUp(self):
+        self.medi = Tpa.objects.create(name='Medi Assist')
+        self.vidal = Tpa.objects.create(name='Vidal')
+        self.a = make_claim(claim_id='A', tpa=self.medi, approved_amount=Decimal('900.25'))
+        self.b = make_claim(claim_id='B', tpa=self.medi, date_of_discharge=date(2026, 1, 20))
+        self.c = make_claim(claim_id='C', tpa=self.vidal, date_of_discharge=date(2026, 2, 3))
+        self.snapshot = analytics.ClaimsSnapshot()
+        self.snapshot.load()
+
+    def assertMatchesDatabase(self, start, end):
+        expected = {
+            row['tpa__name']: (row['claim_count'], float(row['bill']))
+            for row in Claim.objects.filter(date_of_discharge__range=(start, end))
+            .values('tpa__name').annotate(claim_count=Count('id'), bill=Sum('bill_amount')).order_by()
+        }
+        for name in ('Medi Assist', 'Vidal'):
+            totals = self.snapshot.range_summary(start, end, name=name)['totals']
+            self.assertEqual(
+                (totals['claim_count'], totals['bill_amount']), expected.get(name, (0, 0)), name
+            )
+
+    def test_range_totals(self):
+        self.assertMatchesDatabase(date(2026, 1, 1), date(2026, 1, 31))
+        self.assertMatchesDatabase(date(2026, 1, 6), date(2026, 2, 28))
+        summary = self.snapshot.range_summary(date(2026, 1, 1), date(2026, 1, 31))
+        self.assertEqual(summary['totals']['approved_amount'], 900.25)
+        self.assertEqual([row['name'] for row in summary['breakdown']], ['Medi Assist'])
+
+    def test_refresh_applies_changes_past_the_watermark(self):
+        watermark = self.snapshot.watermark
+        self.assertEqual(watermark, Claim.objects.latest('updated_at').updated_at)
+
+        self.b.tpa = self.vidal
+        self.b.bill_amount = Decimal('400.00')
+        self.b.save()
+        self.c.delete()
+        make_claim(claim_id='D', tpa=self.vidal, date_of_discharge=date(2026, 1, 25))
+        self.snapshot.refresh()
+        self.assertGreater(self.snapshot.watermark, watermark)
+        self.assertEqual(self.snapshot.stats()['rows'], 3)
+        self.assertMatchesDatabase(date(2026, 1, 1), date(2026, 2, 28))
+
+    def test_late_commit_inside_the_overlap_is_picked_up(self):
+        # A transaction that stamped its row before the watermark but committed after the load
+        late = self.snapshot.watermark - timedelta(minutes=1)
+        Claim.objects.filter(pk=self.a.pk).update(bill_amount=Decimal('5000.00'), updated_at=late)
+        self.snapshot.refresh()
+        self.assertMatchesDatabase(date(2026, 1, 1), date(2026, 1, 31))
+
+    @mock.patch.object(analytics, '_snapshot', None)
+    def test_api(self):
+        client = api_client('manager', 'manager')
+        url = reverse('analytics-range')
+        with override_settings(ANALYTICS_SNAPSHOT=False):
+            self.assertEqual(client.get(url).status_code, 503)
+        with override_settings(ANALYTICS_SNAPSHOT=True):
+            response = client.get(url, {'start': '2026-01-01', 'end': '2026-01-31', 'name': 'Medi Assist'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['totals']['claim_count'], 2)
+            self.assertEqual(client.get(url, {'by': 'month'}).status_code, 400)
+
+
+class AnomalyScanTests(TestCase):
+    def setUp(self):
+        settled = dict(approved_amount=Decimal('1000.00'), settlement_date=date(2026, 2, 1), tds=Decimal('20.00'))
+        self.clean = make_claim(claim_id='OK', total_settled_amount=Decimal('980.00'), **settled)
+        self.short = make_claim(claim_id='SHORT', total_settled_amount=Decimal('880.00'), **settled)
+        make_claim(claim_id='TDS', approved_amount=Decimal('1000.00'), settlement_date=date(2026, 2, 1),
+                   tds=Decimal('50.00'), total_settled_amount=Decimal('950.00'))
+        make_claim(claim_id='DEDUCT', approved_amount=Decimal('100.00'), consumable_deduction=Decimal('150.00'))
+        # Everything predates the first scan, so later scans only see what changes after it
+        Claim.objects.update(updated_at=timezone.now() - timedelta(days=1))
+
+    def findings(self):
+        return set(
+            ClaimAnomaly.objects.filter(status='open').values_list('claim__claim_id', 'kind', 'severity')
+        )
+
+    def test_evaluate_claim(self):
+        row = Claim.objects.values(*anomalies.SCAN_FIELDS, tpa_name=F('tpa__name')).get(claim_id='TDS')
+        [(kind, severity, expected, actual, message)] = anomalies.evaluate_claim(row)
+        self.assertEqual((kind, expected, actual), ('tds_out_of_band', Decimal('20.00'), Decimal('50.00')))
+        self.assertEqual(message, 'TDS is 5.00% of approved, expected 0.5-2.0%')
+
+        with override_settings(ANOMALY_TDS_BANDS={'Medi Assist': (4, 6)}):
+            self.assertEqual(anomalies.evaluate_claim({**row, 'tpa_name': 'Medi Assist'}), [])
+
+    def test_incremental_scan(self):
+        scan = anomalies.run_scan()
+        self.assertTrue(scan.full_scan)
+        self.assertEqual(scan.claims_scanned, 4)
+        self.assertEqual(self.findings(), {
+            ('SHORT', 'short_settlement', ClaimAnomaly.SEVERITY_HIGH),
+            ('TDS', 'tds_out_of_band', ClaimAnomaly.SEVERITY_MEDIUM),
+            ('DEDUCT', 'deductions_exceed_approved', ClaimAnomaly.SEVERITY_HIGH),
+        })
+        detected_at = ClaimAnomaly.objects.get(claim=self.short).detected_at
+
+        # Only the changed claim is re-evaluated, and its finding resolves
+        self.short.total_settled_amount = Decimal('980.00')
+        self.short.save()
+        scan = anomalies.run_scan()
+        self.assertFalse(scan.full_scan)
+        self.assertEqual((scan.claims_scanned, scan.anomalies_resolved), (1, 1))
+        self.assertEqual(ClaimAnomaly.objects.get(claim=self.short).status, 'resolved')
+        self.assertEqual(len(self.findings()), 2)
+
+        # Found again, it is a new occurrence
+        self.short.total_settled_amount = Decimal('970.00')
+        self.short.save()
+        anomalies.run_scan()
+        anomaly = ClaimAnomaly.objects.get(claim=self.short)
+        self.assertEqual((anomaly.status, anomaly.severity), ('open', ClaimAnomaly.SEVERITY_LOW))
+        self.assertGreater(anomaly.detected_at, detected_at)
+        self.assertIsNone(anomaly.resolved_at)
+
+
+class DuplicateScanTests(TestCase):
+    def setUp(self):
+        tpa = Tpa.objects.create(name='Medi Assist')
+        self.original = make_claim(tpa=tpa)
+        # The same admission keyed in again with a different claim number and spelling
+        self.copy = make_claim(claim_id='CLM-9', uhid_ip_no='uh1', patient_name='Mrs. Rao Asha', tpa=tpa)
+        # Shares only the bill amount block
+        self.other = make_claim(claim_id='CLM-2', uhid_ip_no='UH-2', patient_name='Ravi Kumar',
+                                date_of_admission=date(2026, 1, 11), date_of_discharge=date(2026, 1, 14))
+        Claim.objects.update(updated_at=timezone.now() - timedelta(days=1))
+
+    def rows(self):
+        return list(Claim.objects.order_by('id').values(*dedupe.DEDUPE_FIELDS))
+
+    def test_normalisation(self):
+        self.assertEqual(dedupe.normalise_name(' Mrs. RAO,  asha '), 'asha rao')
+        self.assertEqual(dedupe.normalise_uhid('00-1234/a'), '1234A')
+
+    def test_score_pair(self):
+        original, copy, other = self.rows()
+        score, reasons = dedupe.score_pair(original, copy)
+        self.assertEqual(score, Decimal('0.95'))
+        self.assertEqual(
+            set(reasons), {'uhid', 'discharge_date', 'admission_date', 'bill_amount', 'tpa', 'name'}
+        )
+        self.assertEqual(dedupe.score_pair(original, other), (Decimal('0.10'), ['bill_amount']))
+
+    def test_find_pairs(self):
+        rows = self.rows()
+        self.assertEqual(list(dedupe.find_pairs(rows)), [(self.original.pk, self.copy.pk)])
+        self.assertEqual(dedupe.find_pairs(rows, changed_ids={self.other.pk}), {})
+        with mock.patch.object(dedupe, 'MAX_BLOCK_SIZE', 1):
+            self.assertEqual(dedupe.find_pairs(rows), {})
+
+    def test_incremental_scan(self):
+        scan = dedupe.run_scan()
+        self.assertEqual((scan.full_scan, scan.claims_scanned, scan.pairs_found), (True, 3, 1))
+        candidate = DuplicateCandidate.objects.get()
+        self.assertEqual((candidate.claim_a, candidate.claim_b), (self.original, self.copy))
+        candidate.status = 'dismissed'
+        candidate.save()
+
+        # A reviewed pair keeps its status when one side is re-scanned
+        self.copy.bill_amount = Decimal('1200.00')
+        self.copy.save()
+        scan = dedupe.run_scan()
+        self.assertEqual((scan.full_scan, scan.claims_scanned), (False, 1))
+        candidate.refresh_from_db()
+        self.assertEqual((candidate.status, candidate.score), ('dismissed', Decimal('0.85')))
+
+        # An open pair that no longer matches is removed
+        candidate.status = 'open'
+        candidate.save()
+        self.copy.uhid_ip_no = 'UH-7'
+        self.copy.date_of_discharge = date(2026, 1, 6)
+        self.copy.save()
+        scan = dedupe.run_scan()
+        self.assertEqual(scan.pairs_removed, 1)
+        self.assertFalse(DuplicateCandidate.objects.exists())
+
+
+class DimensionAliasTests(TestCase):
+    def test_alias_key(self):
+        self.assertEqual(alias_key('  Medi-Assist India Pvt. Ltd '), 'medi assist india')
+        self.assertEqual(alias_key('Bajaj & Allianz'), alias_key('BAJAJ AND ALLIANZ'))
+        self.assertEqual(alias_key('Ltd.'), '')
+
+    def test_canonical(self):
+        medi = Tpa.objects.canonical('Medi  Assist')
+        self.assertEqual(medi.name, 'Medi Assist')
+        self.assertEqual(Tpa.objects.canonical('MEDI ASSIST PVT LTD'), medi)
+        self.assertEqual(Tpa.objects.find('medi-assist'), medi)
+        self.assertEqual(list(TpaAlias.objects.values_list('key', flat=True)), ['medi assist'])
+        self.assertIsNone(Tpa.objects.canonical('  '))
+        self.assertIsNone(Tpa.objects.find('Vidal'))
+
+        # A merged spelling resolves to its target; the insurer table keeps its own aliases
+        TpaAlias.objects.create(key=alias_key('MD India'), target=medi)
+        self.assertEqual(Tpa.objects.canonical('MD India Ltd'), medi)
+        self.assertEqual(Tpa.objects.count(), 1)
+        self.assertEqual(Insurer.objects.canonical('Medi Assist').name, 'Medi Assist')
+        self.assertEqual(InsurerAlias.objects.count(), 1)
+
+    def test_claims_are_written_and_filtered_through_aliases(self):
+        client = api_client('entry', 'dataentry')
+        response = client.post(reverse('claim-list-create'), {
+            'claim_id': 'A', 'uhid_ip_no': 'UH-1', 'patient_name': 'Asha Rao', 'tpa_name': 'Medi Assist',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = client.post(reverse('claim-list-create'), {
+            'claim_id': 'B', 'uhid_ip_no': 'UH-2', 'patient_name': 'Ravi Kumar', 'tpa_name': 'MEDI-ASSIST LIMITED',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['tpa_name'], 'Medi Assist')
+        self.assertEqual(Tpa.objects.count(), 1)
+
+        response = client.get(reverse('claim-list-create'), {'tpa_name': 'medi assist pvt ltd'})
+        self.assertEqual(response.data['count'], 2)
+        response = client.get(reverse('claim-list-create'), {'tpa_name': 'Vidal'})
+        self.assertEqual(response.data['count'], 0)
+
+
+class DocumentPreviewTests(TestCase):
+    def setUp(self):
+        self.dir = use_documents_dir(self)
+        self.claim = make_claim()
+
+    def attach(self, content, name):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return attach_document(self.claim, 'approval_letter', path, hash_file(path), len(content), name).sha256
+
+    def image(self):
+        from PIL import Image
+
+        output = io.BytesIO()
+        Image.new('RGB', (2000, 1000), 'white').save(output, 'PNG')
+        return output.getvalue()
+
+    def status(self, sha256):
+        return DocumentPreview.objects.get(sha256=sha256).status
+
+    def test_generate_missing_and_retries(self):
+        scan = self.attach(self.image(), 'scan.png')
+        text = self.attach(b'not a scan', 'notes.txt')
+        with mock.patch.object(previews, 'render', side_effect=OSError('disk full')):
+            self.assertEqual(previews.generate_missing(workers=1), {'failed': 2})
+        self.assertEqual(previews.generate_missing(workers=1), {})
+
+        self.assertEqual(previews.generate_missing(workers=1, retry_failed=True), {'done': 1, 'unsupported': 1})
+        preview = DocumentPreview.objects.get(sha256=scan)
+        self.assertEqual((preview.source_type, preview.width, preview.height, preview.error), ('image', 2000, 1000, ''))
+        self.assertTrue(previews.is_cached(preview))
+        self.assertEqual(self.status(text), 'unsupported')
+
+        # Unsupported files are only retried when asked
+        self.assertEqual(previews.generate_missing(workers=1, retry_failed=True), {})
+        self.assertEqual(previews.generate_missing(workers=1, retry_unsupported=True), {'unsupported': 1})
+
+    @mock.patch.object(previews, '_in_flight', {})
+    @mock.patch.object(previews, '_executor', None)
+    def test_broken_pool_is_replaced(self):
+        sha256 = self.attach(self.image(), 'scan.png')
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool('worker died')
+        working = mock.Mock()
+        future = working.submit.return_value = Future()
+        with mock.patch.object(previews, '_pool', side_effect=[broken, working]) as pool:
+            # Breaking on submit leaves the item pending and drops the pool
+            self.assertEqual(previews.enqueue(sha256).status, 'pending')
+            broken.shutdown.assert_called_once_with(wait=False)
+            self.assertIsNone(previews._executor)
+            self.assertEqual(previews._in_flight, {})
+
+            previews.enqueue(sha256)
+            self.assertEqual(pool.call_count, 2)
+            self.assertIs(previews._executor, working)
+            self.assertIn(sha256, previews._in_flight)
+            # A worker dying mid-render breaks the pool the same way
+            future.set_exception(BrokenProcessPool('worker died'))
+            self.assertIsNone(previews._executor)
+            self.assertEqual(previews._in_flight, {})
+        self.assertEqual(self.status(sha256), 'pending')
+
+
+@skipUnless(synthetic.numpy_available(), 'Synthetic claims need numpy')
+class SyntheticClaimsTests(TestCase):
+    end = date(2026, 6, 30)
+    fields = ('claim_id', 'tpa__name', 'patient_name', 'date_of_discharge', 'settlement_date',
+              'bill_amount', 'tds', 'difference_amount', 'status')
+
+    def loaded(self, seed):
+        return list(synthetic.synthetic_claims(seed).order_by('claim_id').values_list(*self.fields))
+
+    def test_same_seed_same_claims(self):
+        first = list(synthetic.generate(250, seed=7, months=6, end=self.end))
+        again = list(synthetic.generate(250, seed=7, months=6, end=self.end))
+        other = list(synthetic.generate(250, seed=8, months=6, end=self.end))
+        for name in synthetic.COLUMNS:
+            self.assertEqual(first[0][name].tolist(), again[0][name].tolist(), name)
+        self.assertNotEqual(first[0]['bill_amount'].tolist(), other[0]['bill_amount'].tolist())
+
+        # The insert batch size does not change what is loaded
+        synthetic.load(250, seed=7, months=6, end=self.end, batch_size=40)
+        rows = self.loaded(7)
+        synthetic.remove(7)
+        synthetic.load(250, seed=7, months=6, end=self.end, batch_size=1000)
+        self.assertEqual(self.loaded(7), rows)
+
+    def test_loaded_claims_match_the_model_rules(self):
+        synthetic.load(300, seed=3, months=6, end=self.end)
+        claims = synthetic.synthetic_claims(3)
+        self.assertEqual(claims.count(), 300)
+        self.assertFalse(claims.exclude(status=claim_status_expression()).exists())
+        self.assertFalse(claims.filter(date_of_discharge__gt=self.end).exists())
+        self.assertFalse(ClaimChange.objects.exists())
+        # difference_amount as Claim.save computes it
+        for claim in claims.order_by('id')[:20]:
+            stored = claim.difference_amount
+            claim.save()
+            self.assertEqual(claim.difference_amount, stored)
+
+    def test_remove_one_seed(self):
+        synthetic.load(20, seed=1, months=6, end=self.end)
+        # Seed 12's ids start with SYN1 as well
+        synthetic.load(30, seed=12, months=6, end=self.end)
+        make_claim(claim_id='SYN-7')
+        with self.assertRaises(synthetic.SyntheticDataError):
+            synthetic.remove(None)
+        self.assertEqual(synthetic.remove(1), 20)
+        self.assertEqual(synthetic.synthetic_claims(12).count(), 30)
+        self.assertTrue(Claim.objects.filter(claim_id='SYN-7').exists())
@@ -0,0 +1,132 @@
+"""
+Month-over-month, year-over-year and rolling metrics per discharge month.
+
+Monthly totals are aggregated in a CTE and the comparisons come from window
+functions over a calendar month index in the same query. The windows use
+``RANGE`` frames on that index rather than ``LAG(n)`` over rows, so a month
+with no claims yields a NULL previous value instead of comparing against
+whichever month happens to precede it.
+
+With ``include_archive`` the archived monthly totals are added to the CTE
+before the windows run, so archived months compare like any other month.
+"""
+from decimal import Decimal
+
+from django.db import connections, router
+from django.db.models import Count, DecimalField, F, IntegerField, Min, Sum, Value
+from django.db.models.functions import Cast, Coalesce, ExtractMonth, ExtractYear, Substr
+
+from .models import Claim, ClaimArchiveTotal
+
+DEDUCTION_FIELDS = ('mou_discount', 'co_pay', 'consumable_deduction', 'hospital_discount', 'other_deductions')
+
+
+def _monthly_aggregates():
+    """Metric name -> aggregate over the month's claims"""
+    zero = Value(Decimal('0'), output_field=DecimalField(max_digits=15, decimal_places=2))
+    deductions = sum((Coalesce(field, zero) for field in DEDUCTION_FIELDS[1:]), Coalesce(DEDUCTION_FIELDS[0], zero))
+    return {
+        'claim_count': Count('id'),
+        'total_bill': Sum('bill_amount'),
+        'total_approved': Sum('approved_amount'),
+        'total_settled': Sum('total_settled_amount'),
+        'total_tds': Sum('tds'),
+        'total_deductions': Sum(deductions, output_field=DecimalField(max_digits=15, decimal_places=2)),
+    }
+
+
+METRICS = tuple(_monthly_aggregates())
+
+
+def _number(value):
+    if value is None:
+        return None
+    return round(float(value), 2)
+
+
+def _change_pct(current, previous):
+    if previous in (None, 0) or current is None:
+        return None
+    return round((float(current) - float(previous)) / abs(float(previous)) * 100, 2)
+
+
+def _archived_monthly():
+    """Archived totals per month, with the same columns in the same order as the live query"""
+    month = F('archive__month')
+    year_number = Cast(Substr(month, 1, 4), IntegerField())
+    month_number = Cast(Substr(month, 6, 2), IntegerField())
+    return (
+        ClaimArchiveTotal.objects
+        .values(month=month)
+        .annotate(
+            month_index=Min(year_number * 12 + month_number),
+            claim_count=Sum('claim_count'),
+            total_bill=Sum('bill_amount'),
+            total_approved=Sum('approved_amount'),
+            total_settled=Sum('total_settled_amount'),
+            total_tds=Sum('tds'),
+            total_deductions=Sum('deductions'),
+        )
+        .order_by()
+    )
+
+
+def monthwise_trends(queryset=None, include_archive=False):
+    """One row per month with each metric, its MoM/YoY change and 3-month average"""
+    queryset = Claim.objects.all() if queryset is None else queryset
+    monthly = (
+        queryset
+        .exclude(month__isnull=True)
+        .values('month')
+        .annotate(
+            month_index=Min(ExtractYear('date_of_discharge') * 12 + ExtractMonth('date_of_discharge')),
+            **_monthly_aggregates(),
+        )
+        .order_by()
+    )
+    monthly_sql, params = monthly.query.sql_with_params()
+
+    connection = connections[router.db_for_read(Claim)]
+    qn = connection.ops.quote_name
+    if include_archive:
+        archived_sql, archived_params = _archived_monthly().query.sql_with_params()
+        sums = ', '.join(f'SUM({qn(metric)}) AS {qn(metric)}' for metric in METRICS)
+        monthly_sql = (
+            f'SELECT {qn("month")}, MIN({qn("month_index")}) AS {qn("month_index")}, {sums} '
+            f'FROM ({monthly_sql} UNION ALL {archived_sql}) combined GROUP BY {qn("month")}'
+        )
+        params = tuple(params) + tuple(archived_params)
+    order = f'ORDER BY {qn("month_index")}'
+    columns = []
+    for metric in METRICS:
+        m = qn(metric)
+        columns += [
+            m,
+            f'SUM({m}) OVER ({order} RANGE BETWEEN 1 PRECEDING AND 1 PRECEDING)',
+            f'SUM({m}) OVER ({order} RANGE BETWEEN 12 PRECEDING AND 12 PRECEDING)',
+            f'AVG({m}) OVER ({order} RANGE BETWEEN 2 PRECEDING AND CURRENT ROW)',
+        ]
+    sql = (
+        f'WITH monthly AS ({monthly_sql}) '
+        f'SELECT {qn("month")}, {", ".join(columns)} FROM monthly {order}'
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    trends = []
+    for month, *values in rows:
+        item = {'month': month, 'metrics': {}}
+        for i, metric in enumerate(METRICS):
+            current, previous_month, previous_year, rolling = values[4 * i:4 * i + 4]
+            value = _number(current) or 0
+            item['metrics'][metric] = {
+                'value': int(value) if metric == 'claim_count' else value,
+                'mom_pct': _change_pct(current, previous_month),
+                'yoy_pct': _change_pct(current, previous_year),
+                'rolling_3m_avg': _number(rolling),
+            }
+        item['total_approved'] = item['metrics']['total_approved']['value']
+        trends.append(item)
+    return trends
@@ -1,5 +1,35 @@
+from django.conf import settings
 from django.urls import path
+from . import async_views
 from .views import (
+    MonthSnapshotListView,
+    close_month,
+    month_snapshot,
+    month_snapshot_file,
+    ClaimExportView,
+    ClaimDocumentListView,
+    ClaimDocumentDetailView,
+    download_document,
+    document_preview,
+    preview_queue,
+    start_document_upload,
+    document_upload,
+    claim_queues,
+    ClaimQueueView,
+    ClaimHistoryView,
+    ClaimArchiveListView,
+    archived_claims,
+    DuplicateCandidateListView,
+    DuplicateCandidateUpdateView,
+    scan_duplicates,
+    reconcile_bank_statement,
+    ClaimAnomalyListView,
+    scan_anomalies,
+    analytics_range,
+    settlement_lag_stats,
+    receivables_ageing,
+    claims_cube,
+    dashboard,
     dashboard_companywise,
     dashboard_monthwise,
     dashboard_summary,
@@ -8,16 +38,66 @@ from .views import (
     update_file_status,
 )
 
+# Serve the dashboard from native async views when running under ASGI
+if settings.ASYNC_DASHBOARD:
+    dashboard_summary = async_views.dashboard_summary
+    dashboard_monthwise = async_views.dashboard_monthwise
+    dashboard_companywise = async_views.dashboard_companywise
+
 urlpatterns = [
     # Claims CRUD
     path('', ClaimListCreateView.as_view(), name='claim-list-create'),
+    path('export.xlsx', ClaimExportView.as_view(), {'file_format': 'xlsx'}, name='claim-export-xlsx'),
+    path('export.parquet', ClaimExportView.as_view(), {'file_format': 'parquet'}, name='claim-export-parquet'),
+    path('export.arrow', ClaimExportView.as_view(), {'file_format': 'arrow'}, name='claim-export-arrow'),
     path('<int:pk>/', ClaimRetrieveUpdateDestroyView.as_view(), name='claim-detail'),
+    path('<int:pk>/history/', ClaimHistoryView.as_view(), name='claim-history'),
     
     # File status management
     path('<int:claim_id>/update-file-status/<str:file_field>/', update_file_status, name='update-file-status'),
     
+    # Claim documents
+    path('<int:pk>/documents/', ClaimDocumentListView.as_view(), name='claim-document-list'),
+    path('<int:pk>/documents/uploads/', start_document_upload, name='claim-document-upload-start'),
+    path('documents/<int:pk>/', ClaimDocumentDetailView.as_view(), name='claim-document-detail'),
+    path('documents/<int:pk>/download/', download_document, name='claim-document-download'),
+    path('documents/<int:pk>/thumbnail/', document_preview, {'variant': 'thumbnail'}, name='claim-document-thumbnail'),
+    path('documents/<int:pk>/preview/', document_preview, {'variant': 'preview'}, name='claim-document-preview'),
+    path('documents/previews/queue/', preview_queue, name='claim-document-preview-queue'),
+    path('documents/uploads/<uuid:upload_id>/', document_upload, name='claim-document-upload'),
+    
     # Dashboard endpoints
+    path('dashboard/', dashboard, name='dashboard'),
     path('dashboard/summary/', dashboard_summary, name='dashboard-summary'),
     path('dashboard/monthwise/', dashboard_monthwise, name='dashboard-monthwise'),
     path('dashboard/companywise/', dashboard_companywise, name='dashboard-companywise'),
+    
+    # Analytics
+    path('cube/', claims_cube, name='claims-cube'),
+    path('ageing/', receivables_ageing, name='receivables-ageing'),
+    path('settlement-lag/', settlement_lag_stats, name='settlement-lag-stats'),
+    path('analytics/range/', analytics_range, name='analytics-range'),
+    
+    # Reconciliation
+    path('anomalies/', ClaimAnomalyListView.as_view(), name='claim-anomaly-list'),
+    path('anomalies/scan/', scan_anomalies, name='claim-anomaly-scan'),
+    path('reconcile-bank/', reconcile_bank_statement, name='claim-reconcile-bank'),
+    path('duplicates/', DuplicateCandidateListView.as_view(), name='claim-duplicate-list'),
+    path('duplicates/<int:pk>/', DuplicateCandidateUpdateView.as_view(), name='claim-duplicate-detail'),
+    path('duplicates/scan/', scan_duplicates, name='claim-duplicate-scan'),
+    
+    # Work queues
+    path('queues/', claim_queues, name='claim-queues'),
+    path('queues/<str:status>/', ClaimQueueView.as_view(), name='claim-queue'),
+    
+    # Cold archive
+    path('archive/', ClaimArchiveListView.as_view(), name='claim-archive-list'),
+    path('archive/claims/', archived_claims, name='claim-archive-claims'),
+    
+    # Month close
+    path('months/', MonthSnapshotListView.as_view(), name='month-snapshot-list'),
+    path('months/<str:month>/', month_snapshot, name='month-snapshot'),
+    path('months/<str:month>/close/', close_month, name='month-close'),
+    path('months/<str:month>/claims.csv', month_snapshot_file, {'extension': 'csv'}, name='month-snapshot-csv'),
+    path('months/<str:month>/claims.xlsx', month_snapshot_file, {'extension': 'xlsx'}, name='month-snapshot-xlsx'),
 ]
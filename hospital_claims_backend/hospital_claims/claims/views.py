@@ -1,21 +1,57 @@
 from rest_framework import generics, filters, status, serializers
+from rest_framework.exceptions import NotFound
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from django.db.models import Sum, Count, Q, Avg
 from django.db.models.functions import TruncMonth
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
-from .models import Claim
-from claims.serializers import ClaimSerializer, ClaimListSerializer
+from django.http import FileResponse
+from django.utils import timezone
+from django.utils.http import parse_etags
+from django.conf import settings
+from .ageing import ageing_report
+from .archive import ArchiveError, archived_totals, pyarrow_available, read_archive_page
+from .anomalies import run_scan
+from .audit import AuditedWritesMixin, audited_writes
+from .dedupe import run_scan as run_duplicate_scan
+from .exports import EXPORT_FORMATS
+from .month_close import SnapshotError, build as build_snapshot, file_response as snapshot_file_response, fresh_snapshot
+from .documents import (
+    DocumentError, DocumentUploadHandler, UploadOffsetMismatch, append_chunk, attach_document, cancel_upload,
+    current_offset, delete_document, document_response, start_upload, stored_file_response,
+)
+from .previews import SIZES as PREVIEW_SIZES, enqueue as enqueue_preview, is_cached, preview_path, queue_stats
+from .bank_reconciliation import StatementError, reconcile_statement
+from .analytics import get_snapshot, numpy_available
+from .lag_stats import lag_stats
+from .trends import monthwise_trends
+from .cube import CubeError, DEFAULT_MEASURES, run_cube
+from .filters import ClaimFilter
+from .models import (
+    CLAIM_STATUS_LABELS, OPEN_CLAIM_STATUSES, Claim, ClaimAnomaly, ClaimArchive, ClaimChange, ClaimDocument,
+    DocumentPreview, DocumentUpload, DuplicateCandidate, Insurer, MonthSnapshot, Tpa,
+)
+from claims.serializers import (
+    ClaimSerializer, ClaimListSerializer, ClaimAnomalySerializer, ClaimArchiveSerializer,
+    ClaimChangeSerializer, ClaimDocumentSerializer, DocumentUploadSerializer, DuplicateCandidateSerializer,
+    MonthSnapshotSerializer
+)
 from authentication.permissions import IsDataEntryOrManager, IsManager
+from hospital_claims.db_routers import read_from_replica, replica_reads
+from datetime import date
+from decimal import Decimal, InvalidOperation
 import calendar
+import io
 import os
+import tempfile
 
-class ClaimListCreateView(generics.ListCreateAPIView):
-    queryset = Claim.objects.all()
+class ClaimListCreateView(AuditedWritesMixin, generics.ListCreateAPIView):
+    queryset = Claim.objects.select_related('tpa', 'insurer')
     permission_classes = [IsDataEntryOrManager]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['tpa_name', 'parent_insurance', 'month', 'physical_file_dispatch']
+    filterset_class = ClaimFilter
     search_fields = ['claim_id', 'patient_name', 'uhid_ip_no']
     ordering_fields = ['date_of_discharge', 'settlement_date', 'bill_amount', 'approved_amount']
     ordering = ['-created_at']
@@ -24,11 +60,24 @@ class ClaimListCreateView(generics.ListCreateAPIView):
         #     return ClaimListSerializer
         return ClaimSerializer
 
-class ClaimRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Claim.objects.all()
+    def list(self, request, *args, **kwargs):
+        with replica_reads(request):
+            return super().list(request, *args, **kwargs)
+
+class ClaimRetrieveUpdateDestroyView(AuditedWritesMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Claim.objects.select_related('tpa', 'insurer')
     serializer_class = ClaimSerializer
     permission_classes = [IsDataEntryOrManager]
     
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # ?reopen=true lets a manager take back a wrong settlement or bank verification
+        context['reopen'] = (
+            self.request.user.role == 'manager'
+            and self.request.query_params.get('reopen', '').lower() in ('1', 'true', 'yes')
+        )
+        return context
+    
     def update(self, request, *args, **kwargs):
         """Override update to handle partial updates properly"""
         partial = kwargs.pop('partial', False)
@@ -48,8 +97,74 @@ class ClaimRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         """Handle PATCH requests for partial updates"""
         return self.update(request, *args, **kwargs)
 
+class ClaimExportView(generics.GenericAPIView):
+    """The claims list as an Excel workbook, or Parquet / Arrow IPC for analytics, with the list's filters"""
+    queryset = Claim.objects.all()
+    permission_classes = [IsDataEntryOrManager]
+    filter_backends = ClaimListCreateView.filter_backends
+    filterset_class = ClaimFilter
+    search_fields = ClaimListCreateView.search_fields
+    ordering_fields = ClaimListCreateView.ordering_fields
+    ordering = ClaimListCreateView.ordering
+    
+    def get(self, request, *args, file_format='xlsx', **kwargs):
+        content_type, write_claims, available, requirement = EXPORT_FORMATS[file_format]
+        if not available():
+            return Response(
+                {'error': f'Export to .{file_format} needs {requirement}'}, 
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        
+        # ?include_archive=true adds the cold archive, which only the analytics formats and the month filter reach
+        include_archive = wants_archive(request.query_params)
+        if include_archive:
+            if file_format == 'xlsx':
+                return Response(
+                    {'error': 'Archived claims are exported as Parquet or Arrow only'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            others = sorted(set(request.query_params) - {'include_archive', 'month', 'ordering'})
+            if others:
+                return Response(
+                    {'error': f'include_archive only combines with the month filter, not {", ".join(others)}'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        # The whole of a closed month is its month-end report, already written by close_month
+        month = request.query_params.get('month')
+        if file_format == 'xlsx' and month and set(request.query_params) == {'month'}:
+            snapshot = fresh_snapshot(month)
+            if snapshot is not None and snapshot.xlsx_size is not None:
+                return snapshot_file_response(request, snapshot, 'xlsx')
+        
+        with replica_reads(request):
+            queryset = self.filter_queryset(self.get_queryset())
+            if file_format != 'xlsx' and 'ordering' not in request.query_params:
+                # Bulk exports stream in primary key order, straight off the index without a sort
+                queryset = queryset.order_by('id')
+            # The file is built in an unnamed temporary file, never in memory
+            output = tempfile.TemporaryFile()
+            try:
+                if include_archive:
+                    write_claims(queryset, output, include_archive=True, months=[month] if month else None)
+                else:
+                    write_claims(queryset, output)
+            except Exception as e:
+                output.close()
+                return Response(
+                    {'error': f'Error exporting claims: {str(e)}'}, 
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+        
+        output.seek(0)
+        return FileResponse(
+            output, as_attachment=True, filename=f'claims-{timezone.localdate():%Y-%m-%d}.{file_format}',
+            content_type=content_type,
+        )
+
 @api_view(['PATCH'])
 @permission_classes([IsDataEntryOrManager])
+@audited_writes
 def update_file_status(request, claim_id, file_field):
     """Update file upload status for a claim"""
     try:
@@ -85,54 +200,89 @@ def update_file_status(request, claim_id, file_field):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+def wants_archive(params):
+    """True when the request asks for archived claims to be counted too (?include_archive=true)"""
+    return params.get('include_archive', '').lower() in ('1', 'true', 'yes')
+
+def summary_aggregates():
+    """Aggregate expressions behind the dashboard summary cards"""
+    return {
+        'total_bill_amount': Sum('bill_amount'),
+        'total_approved_amount': Sum('approved_amount'),
+        'total_tds': Sum('tds'),
+        'total_consumable_deduction': Sum('consumable_deduction'),
+        'total_paid_by_patient': Sum('paid_by_patient'),
+    }
+
+def company_queryset(dimension):
+    """Top 10 TPAs or insurers ('tpa'/'insurer') by approved amount, grouped on the foreign key"""
+    return (
+        Claim.objects
+        .exclude(**{f'{dimension}__isnull': True})
+        .values(dimension, f'{dimension}__name')
+        .annotate(
+            claim_count=Count('id'),
+            total_approved=Sum('approved_amount'),
+            total_settled=Sum('total_settled_amount'),
+        )
+        .order_by('-total_approved')[:10]
+    )
+
+def format_summary(totals, pending_claims):
+    """Shape summary aggregates into the frontend DashboardStats format"""
+    return {
+        'totalBillAmount': float(totals['total_bill_amount'] or 0),
+        'totalApprovedAmount': float(totals['total_approved_amount'] or 0),
+        'totalTds': float(totals['total_tds'] or 0),
+        'totalRejections': pending_claims,  # Using pending claims as rejections for now
+        'totalConsumables': float(totals['total_consumable_deduction'] or 0),
+        'totalPaidByPatients': float(totals['total_paid_by_patient'] or 0),
+    }
+
+def format_monthwise(monthly_data):
+    """Shape month rows into the frontend ChartData[] format"""
+    formatted_data = []
+    for item in monthly_data:
+        try:
+            # Convert month string to readable format
+            if item['month'] and '-' in item['month']:
+                year, month_num = item['month'].split('-')
+                month_name = calendar.month_name[int(month_num)]
+                
+                formatted_item = {
+                    'name': f"{month_name} {year}",
+                    'value': float(item['total_approved'] or 0),
+                    'month': item['month']
+                }
+                if 'metrics' in item:
+                    formatted_item['metrics'] = item['metrics']
+                formatted_data.append(formatted_item)
+        except (ValueError, TypeError, AttributeError):
+            # Skip invalid month data
+            continue
+    return formatted_data
+
+def format_company_chart(rows, name_field, unknown_label):
+    """Shape TPA/insurance rows into the frontend ChartData[] format"""
+    return [
+        {
+            'name': item[name_field] or unknown_label,
+            'value': float(item['total_approved'] or 0),
+            'claim_count': item['claim_count'],
+            'total_settled': float(item['total_settled'] or 0),
+        }
+        for item in rows
+    ]
+
 @api_view(['GET'])
 @permission_classes([IsManager])
+@read_from_replica
 def dashboard_summary(request):
     """Dashboard summary with key metrics"""
     try:
-        claims = Claim.objects.all()
-        
-        # Basic statistics
-        total_claims = claims.count()
-        total_bill_amount = claims.aggregate(Sum('bill_amount'))['bill_amount__sum'] or 0
-        total_approved_amount = claims.aggregate(Sum('approved_amount'))['approved_amount__sum'] or 0
-        total_settled_amount = claims.aggregate(Sum('total_settled_amount'))['total_settled_amount__sum'] or 0
-        total_tds = claims.aggregate(Sum('tds'))['tds__sum'] or 0
-        total_consumable_deduction = claims.aggregate(Sum('consumable_deduction'))['consumable_deduction__sum'] or 0
-        total_paid_by_patient = claims.aggregate(Sum('paid_by_patient'))['paid_by_patient__sum'] or 0
-        
-        # Claims with difference (potential issues)
-        claims_with_difference = claims.exclude(difference_amount=0).count()
-        
-        # Settlement status
-        settled_claims = claims.exclude(settlement_date__isnull=True).count()
-        pending_claims = claims.filter(settlement_date__isnull=True).count()
-        
-        # Average processing time (for settled claims)
-        settled_claims_qs = claims.exclude(settlement_date__isnull=True).exclude(date_of_discharge__isnull=True)
-        avg_processing_days = 0
-        if settled_claims_qs.exists():
-            processing_times = []
-            for claim in settled_claims_qs:
-                try:
-                    days = (claim.settlement_date - claim.date_of_discharge).days
-                    if days >= 0:  # Only include valid processing times
-                        processing_times.append(days)
-                except (TypeError, AttributeError):
-                    # Skip claims with invalid dates
-                    continue
-            avg_processing_days = sum(processing_times) / len(processing_times) if processing_times else 0
-        
-        summary_data = {
-            'totalBillAmount': float(total_bill_amount),
-            'totalApprovedAmount': float(total_approved_amount),
-            'totalTds': float(total_tds),
-            'totalRejections': pending_claims,  # Using pending claims as rejections for now
-            'totalConsumables': float(total_consumable_deduction),
-            'totalPaidByPatients': float(total_paid_by_patient),
-        }
-        
-        return Response(summary_data)
+        # One aggregate, with the pending claims as a filtered count
+        data = build_dashboard(['summary'], include_archive=wants_archive(request.query_params))
+        return Response(data['summary'])
     
     except Exception as e:
         return Response(
@@ -142,54 +292,13 @@ def dashboard_summary(request):
 
 @api_view(['GET'])
 @permission_classes([IsManager])
+@read_from_replica
 def dashboard_monthwise(request):
     """Monthly statistics for charts"""
     try:
-        # Group claims by month, excluding null months
-        monthly_data = (
-            Claim.objects
-            .exclude(month__isnull=True)  # Exclude claims with null month
-            .values('month')
-            .annotate(
-                claim_count=Count('id'),
-                total_bill=Sum('bill_amount'),
-                total_approved=Sum('approved_amount'),
-                total_settled=Sum('total_settled_amount'),
-                total_tds=Sum('tds'),
-            )
-            .order_by('month')
-        )
+        monthly_data = monthwise_trends(include_archive=wants_archive(request.query_params))
         
-        # Format data for frontend charts
-        chart_data = []
-        for item in monthly_data:
-            try:
-                # Convert month string to readable format
-                if item['month'] and '-' in item['month']:
-                    year, month_num = item['month'].split('-')
-                    month_name = calendar.month_name[int(month_num)]
-                    
-                    chart_data.append({
-                        'month': f"{month_name} {year}",
-                        'month_code': item['month'],
-                        'claim_count': item['claim_count'],
-                        'total_bill': float(item['total_bill'] or 0),
-                        'total_approved': float(item['total_approved'] or 0),
-                        'total_settled': float(item['total_settled'] or 0),
-                        'total_tds': float(item['total_tds'] or 0),
-                    })
-            except (ValueError, TypeError, AttributeError) as e:
-                # Skip invalid month data
-                continue
-        
-        # Format for frontend ChartData[] format
-        formatted_data = []
-        for item in chart_data:
-            formatted_data.append({
-                'name': item['month'],
-                'value': item['total_approved'],
-                'month': item['month_code']
-            })
+        formatted_data = format_monthwise(monthly_data)
         
         return Response(formatted_data)
     
@@ -201,55 +310,17 @@ def dashboard_monthwise(request):
 
 @api_view(['GET'])
 @permission_classes([IsManager])
+@read_from_replica
 def dashboard_companywise(request):
     """Company/TPA wise statistics for pie charts"""
     try:
-        # TPA wise data
-        tpa_data = (
-            Claim.objects
-            .exclude(tpa_name__isnull=True)
-            .exclude(tpa_name='')
-            .values('tpa_name')
-            .annotate(
-                claim_count=Count('id'),
-                total_approved=Sum('approved_amount'),
-                total_settled=Sum('total_settled_amount'),
-            )
-            .order_by('-total_approved')[:10]  # Top 10 TPAs
-        )
+        if wants_archive(request.query_params):
+            return Response(build_dashboard(['companywise'], include_archive=True)['companywise'])
         
         # Insurance wise data
-        insurance_data = (
-            Claim.objects
-            .exclude(parent_insurance__isnull=True)
-            .exclude(parent_insurance='')
-            .values('parent_insurance')
-            .annotate(
-                claim_count=Count('id'),
-                total_approved=Sum('approved_amount'),
-                total_settled=Sum('total_settled_amount'),
-            )
-            .order_by('-total_approved')[:10]  # Top 10 Insurance companies
-        )
+        insurance_data = company_queryset('insurer')
         
-        # Format for pie charts
-        tpa_chart = []
-        for item in tpa_data:
-            tpa_chart.append({
-                'name': item['tpa_name'] or 'Unknown TPA',
-                'value': float(item['total_approved'] or 0),
-                'claim_count': item['claim_count'],
-                'total_settled': float(item['total_settled'] or 0),
-            })
-        
-        insurance_chart = []
-        for item in insurance_data:
-            insurance_chart.append({
-                'name': item['parent_insurance'] or 'Unknown Insurance',
-                'value': float(item['total_approved'] or 0),
-                'claim_count': item['claim_count'],
-                'total_settled': float(item['total_settled'] or 0),
-            })
+        insurance_chart = format_company_chart(insurance_data, 'insurer__name', 'Unknown Insurance')
         
         # Return insurance data as ChartData[] format for frontend
         return Response(insurance_chart)
@@ -258,4 +329,659 @@ def dashboard_companywise(request):
         return Response(
             {'error': f'Error generating company data: {str(e)}'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+DASHBOARD_SECTIONS = ('summary', 'monthwise', 'companywise')
+
+def _add(a, b):
+    return (a or 0) + (b or 0)
+
+def build_dashboard(sections, include_archive=False):
+    """
+    Compute the requested dashboard sections with as few reads as possible.
+
+    Summary and companywise share one read grouped only by what they need
+    (the insurer key for companywise) and are rolled up from those rows in
+    Python; with only the summary requested this is a single ungrouped
+    aggregate. Monthwise comes from the windowed monthwise_trends query.
+    With include_archive the archive manifest totals are rolled up too.
+    """
+    group_fields = []
+    if 'companywise' in sections:
+        group_fields.append('insurer')
+    
+    aggregates = summary_aggregates()
+    aggregates['claim_count'] = Count('id')
+    aggregates['total_settled'] = Sum('total_settled_amount')
+    aggregates['pending_claims'] = Count('id', filter=Q(settlement_date__isnull=True))
+    
+    if group_fields:
+        rows = list(Claim.objects.values(*group_fields).annotate(**aggregates).order_by())
+    else:
+        rows = [Claim.objects.aggregate(**aggregates)]
+    if include_archive:
+        # Only bank-verified, settled claims are archived, so none are pending
+        rows += [{**row, 'pending_claims': 0} for row in archived_totals(*group_fields)]
+    
+    data = {}
+    if 'summary' in sections:
+        totals = {key: 0 for key in aggregates}
+        for row in rows:
+            for key in totals:
+                totals[key] = _add(totals[key], row[key])
+        data['summary'] = format_summary(totals, totals['pending_claims'])
+    
+    if 'monthwise' in sections:
+        # Period-over-period metrics need window functions, so this is a second read
+        data['monthwise'] = format_monthwise(monthwise_trends(include_archive=include_archive))
+    
+    if 'companywise' in sections:
+        companies = {}
+        insurer_names = Insurer.objects.names()
+        for row in rows:
+            if row['insurer'] is None:
+                continue
+            company = companies.setdefault(row['insurer'], {
+                'parent_insurance': insurer_names.get(row['insurer'], ''),
+                'claim_count': 0, 'total_approved': 0, 'total_settled': 0,
+            })
+            company['claim_count'] += row['claim_count']
+            company['total_approved'] = _add(company['total_approved'], row['total_approved_amount'])
+            company['total_settled'] = _add(company['total_settled'], row['total_settled'])
+        top_companies = sorted(companies.values(), key=lambda c: c['total_approved'], reverse=True)[:10]
+        data['companywise'] = format_company_chart(top_companies, 'parent_insurance', 'Unknown Insurance')
+    
+    return data
+
+@api_view(['GET'])
+@permission_classes([IsManager])
+@read_from_replica
+def dashboard(request):
+    """Summary, monthwise and companywise dashboard data in one request"""
+    sections_param = request.query_params.get('sections')
+    if sections_param:
+        sections = [section.strip() for section in sections_param.split(',') if section.strip()]
+    else:
+        sections = list(DASHBOARD_SECTIONS)
+    
+    invalid_sections = [section for section in sections if section not in DASHBOARD_SECTIONS]
+    if invalid_sections:
+        return Response(
+            {'error': f'Invalid sections: {", ".join(invalid_sections)}. '
+                      f'Choose from {", ".join(DASHBOARD_SECTIONS)}.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        return Response(build_dashboard(sections, include_archive=wants_archive(request.query_params)))
+    
+    except Exception as e:
+        return Response(
+            {'error': f'Error generating dashboard: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+def _list_param(request, name, default=()):
+    value = request.query_params.get(name)
+    if not value:
+        return list(default)
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+@api_view(['GET'])
+@permission_classes([IsManager])
+@read_from_replica
+def claims_cube(request):
+    """Roll-ups of the claims over whitelisted dimensions, as columnar JSON"""
+    claim_filter = ClaimFilter(request.query_params, queryset=Claim.objects.all())
+    if not claim_filter.is_valid():
+        return Response(claim_filter.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        cube = run_cube(
+            claim_filter.qs,
+            dimensions=_list_param(request, 'dimensions'),
+            measures=_list_param(request, 'measures', DEFAULT_MEASURES),
+            mode=request.query_params.get('mode', 'cube'),
+            max_rows=settings.CUBE_MAX_ROWS,
+        )
+        return Response(cube)
+    
+    except CubeError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {'error': f'Error generating cube: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@permission_classes([IsManager])
+@read_from_replica
+def receivables_ageing(request):
+    """Outstanding approved amounts of unsettled claims by days since discharge"""
+    claim_filter = ClaimFilter(request.query_params, queryset=Claim.objects.all())
+    if not claim_filter.is_valid():
+        return Response(claim_filter.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        as_of_param = request.query_params.get('as_of')
+        as_of = date.fromisoformat(as_of_param) if as_of_param else timezone.localdate()
+        oldest = min(int(request.query_params.get('oldest', 10)), 100)
+    except ValueError:
+        return Response(
+            {'error': 'as_of must be YYYY-MM-DD and oldest must be an integer'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        return Response(ageing_report(claim_filter.qs, as_of, oldest=max(oldest, 0)))
+    
+    except Exception as e:
+        return Response(
+            {'error': f'Error generating ageing report: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@permission_classes([IsManager])
+@read_from_replica
+def settlement_lag_stats(request):
+    """p50/p75/p90/p99 settlement and query-reply lag per TPA and insurer"""
+    month = request.query_params.get('month')
+    if month:
+        try:
+            date.fromisoformat(f'{month}-01')
+        except ValueError:
+            return Response({'error': 'month must be YYYY-MM'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        return Response(lag_stats(month))
+    
+    except Exception as e:
+        return Response(
+            {'error': f'Error generating lag statistics: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@permission_classes([IsManager])
+@read_from_replica
+def analytics_range(request):
+    """Date-range x TPA/insurer totals served from the in-memory snapshot"""
+    if not settings.ANALYTICS_SNAPSHOT or not numpy_available():
+        return Response(
+            {'error': 'Analytics snapshot is disabled (set ANALYTICS_SNAPSHOT and install numpy)'}, 
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    
+    by = request.query_params.get('by', 'tpa')
+    if by not in ('tpa', 'insurer'):
+        return Response({'error': 'by must be "tpa" or "insurer"'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        start = request.query_params.get('start')
+        end = request.query_params.get('end')
+        start = date.fromisoformat(start) if start else None
+        end = date.fromisoformat(end) if end else None
+    except ValueError:
+        return Response({'error': 'start and end must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        snapshot = get_snapshot()
+        return Response(snapshot.range_summary(start, end, by=by, name=request.query_params.get('name')))
+    
+    except Exception as e:
+        return Response(
+            {'error': f'Error generating analytics: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+class ClaimAnomalyListView(generics.ListAPIView):
+    """Page through anomalies, most severe first (open ones by default)"""
+    serializer_class = ClaimAnomalySerializer
+    permission_classes = [IsManager]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['kind', 'severity', 'claim']
+    
+    def get_queryset(self):
+        queryset = ClaimAnomaly.objects.select_related('claim__tpa')
+        anomaly_status = self.request.query_params.get('status', 'open')
+        if anomaly_status != 'all':
+            queryset = queryset.filter(status=anomaly_status)
+        return queryset.order_by('-severity', '-detected_at', 'id')
+    
+    def list(self, request, *args, **kwargs):
+        with replica_reads(request):
+            return super().list(request, *args, **kwargs)
+
+@api_view(['POST'])
+@permission_classes([IsManager])
+def scan_anomalies(request):
+    """Run an incremental anomaly scan (or a full one with {"full": true})"""
+    try:
+        scan = run_scan(full=bool(request.data.get('full', False)))
+        return Response({
+            'message': 'Anomaly scan completed',
+            'full_scan': scan.full_scan,
+            'claims_scanned': scan.claims_scanned,
+            'anomalies_open': scan.anomalies_open,
+            'anomalies_resolved': scan.anomalies_resolved,
+            'seconds': (scan.finished_at - scan.started_at).total_seconds(),
+        })
+    
+    except Exception as e:
+        return Response(
+            {'error': f'Error scanning anomalies: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['POST'])
+@permission_classes([IsManager])
+@audited_writes
+def reconcile_bank_statement(request):
+    """Match an uploaded bank statement CSV (UTR, amount, date) against claims"""
+    statement = request.FILES.get('file')
+    if statement is None:
+        return Response({'error': 'Upload the statement CSV as "file"'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        tolerance = Decimal(str(request.data.get('tolerance', '1.00')))
+    except InvalidOperation:
+        return Response({'error': 'tolerance must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        
+    try:
+        lines = io.TextIOWrapper(statement.file, encoding='utf-8-sig', newline='')
+        report = reconcile_statement(lines, tolerance=tolerance, dry_run=dry_run, unmatched_limit=1000)
+        return Response(report)
+        
+    except (StatementError, UnicodeDecodeError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {'error': f'Error reconciling bank statement: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+class DuplicateCandidateListView(generics.ListAPIView):
+    """Page through possible duplicate pairs, highest score first (open ones by default)"""
+    serializer_class = DuplicateCandidateSerializer
+    permission_classes = [IsManager]
+    
+    def get_queryset(self):
+        queryset = DuplicateCandidate.objects.select_related('claim_a__tpa', 'claim_b__tpa')
+        pair_status = self.request.query_params.get('status', 'open')
+        if pair_status != 'all':
+            queryset = queryset.filter(status=pair_status)
+        claim = self.request.query_params.get('claim')
+        if claim:
+            queryset = queryset.filter(Q(claim_a_id=claim) | Q(claim_b_id=claim))
+        min_score = self.request.query_params.get('min_score')
+        if min_score:
+            queryset = queryset.filter(score__gte=min_score)
+        return queryset.order_by('-score', '-detected_at', 'id')
+    
+    def list(self, request, *args, **kwargs):
+        with replica_reads(request):
+            return super().list(request, *args, **kwargs)
+
+class DuplicateCandidateUpdateView(generics.RetrieveUpdateAPIView):
+    """Mark a pair as a confirmed duplicate or dismiss it"""
+    queryset = DuplicateCandidate.objects.select_related('claim_a__tpa', 'claim_b__tpa')
+    serializer_class = DuplicateCandidateSerializer
+    permission_classes = [IsManager]
+
+@api_view(['POST'])
+@permission_classes([IsManager])
+def scan_duplicates(request):
+    """Look for duplicates among claims changed since the last scan (or all with {"full": true})"""
+    try:
+        scan = run_duplicate_scan(full=bool(request.data.get('full', False)))
+        return Response({
+            'message': 'Duplicate scan completed',
+            'full_scan': scan.full_scan,
+            'claims_scanned': scan.claims_scanned,
+            'pairs_found': scan.pairs_found,
+            'pairs_removed': scan.pairs_removed,
+            'seconds': (scan.finished_at - scan.started_at).total_seconds(),
+        })
+        
+    except Exception as e:
+        return Response(
+            {'error': f'Error scanning for duplicates: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+class ClaimArchiveListView(generics.ListAPIView):
+    """Archive manifest, one entry per archived file (filter with ?month=YYYY-MM)"""
+    serializer_class = ClaimArchiveSerializer
+    permission_classes = [IsManager]
+    
+    def get_queryset(self):
+        queryset = ClaimArchive.objects.all()
+        month = self.request.query_params.get('month')
+        if month:
+            queryset = queryset.filter(month=month)
+        return queryset
+
+@api_view(['GET'])
+@permission_classes([IsManager])
+def archived_claims(request):
+    """Archived claims of one discharge month, read back from the archive files"""
+    if not pyarrow_available():
+        return Response(
+            {'error': 'Reading the claims archive needs pyarrow'}, 
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    
+    month = request.query_params.get('month', '')
+    try:
+        date.fromisoformat(f'{month}-01')
+    except ValueError:
+        return Response({'error': 'month must be YYYY-MM'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        page = int(request.query_params.get('page', 1))
+    except ValueError:
+        page = 0
+    if page < 1:
+        return Response({'error': 'page must be a positive number'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        # Paged like the claims list; only the row groups holding the page are read
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        count, rows = read_archive_page(
+            month, (page - 1) * page_size, page_size, search=request.query_params.get('search', '')
+        )
+        url = request.build_absolute_uri()
+        return Response({
+            'month': month,
+            'count': count,
+            'next': replace_query_param(url, 'page', page + 1) if page * page_size < count else None,
+            'previous': replace_query_param(url, 'page', page - 1) if page > 1 else None,
+            'results': rows,
+        })
+    
+    except (ArchiveError, OSError) as e:
+        return Response(
+            {'error': f'Error reading archived claims: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+class MonthSnapshotListView(generics.ListAPIView):
+    """Closed months, newest first"""
+    queryset = MonthSnapshot.objects.select_related('closed_by')
+    serializer_class = MonthSnapshotSerializer
+    permission_classes = [IsManager]
+
+@api_view(['POST'])
+@permission_classes([IsManager])
+def close_month(request, month):
+    """Freeze a month's reports into a snapshot, or regenerate it (?force=true rewrites unchanged files)"""
+    force = request.query_params.get('force', '').lower() in ('1', 'true', 'yes')
+    try:
+        snapshot, _ = build_snapshot(month, user=request.user, force=force)
+        return Response(MonthSnapshotSerializer(snapshot, context={'request': request}).data)
+    
+    except SnapshotError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response(
+            {'error': f'Error closing {month}: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+def _closed_month(month):
+    try:
+        snapshot = fresh_snapshot(month)
+    except SnapshotError as e:
+        raise NotFound(str(e))
+    if snapshot is None:
+        raise NotFound(f'{month} has not been closed')
+    return snapshot
+
+@api_view(['GET'])
+@permission_classes([IsManager])
+def month_snapshot(request, month):
+    """Summary and per-TPA breakdown of a closed month, as frozen at close (and after later changes)"""
+    snapshot = _closed_month(month)
+    etag = f'"{snapshot.content_hash}"'
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return Response(
+        MonthSnapshotSerializer(snapshot, context={'request': request}).data,
+        headers={'ETag': etag, 'Cache-Control': 'private, no-cache'},
+    )
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([IsManager])
+def month_snapshot_file(request, month, extension):
+    """A closed month's claims as CSV or XLSX, from the snapshot files"""
+    snapshot = _closed_month(month)
+    if extension == 'xlsx' and snapshot.xlsx_size is None:
+        return Response(
+            {'error': 'The snapshot has no Excel file; install XlsxWriter and close the month again'}, 
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    return snapshot_file_response(request, snapshot, extension)
+
+class ClaimHistoryView(generics.ListAPIView):
+    """Field-level change history of a claim, newest first (kept after the claim is deleted)"""
+    serializer_class = ClaimChangeSerializer
+    permission_classes = [IsManager]
+    
+    def get_queryset(self):
+        return ClaimChange.objects.filter(claim_id=self.kwargs['pk']).select_related('user')
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['tpa_names'] = Tpa.objects.names()
+        context['insurer_names'] = Insurer.objects.names()
+        return context
+
+@api_view(['GET'])
+@permission_classes([IsDataEntryOrManager])
+@read_from_replica
+def claim_queues(request):
+    """Claim count of every open work queue, each counted from its own partial index"""
+    try:
+        counts = dict.fromkeys(OPEN_CLAIM_STATUSES, 0)
+        per_status = [
+            Claim.objects.filter(status=queue).values('status').annotate(count=Count('id')).order_by()
+            for queue in OPEN_CLAIM_STATUSES
+        ]
+        for row in per_status[0].union(*per_status[1:], all=True):
+            counts[row['status']] = row['count']
+        
+        return Response([
+            {'status': queue, 'label': CLAIM_STATUS_LABELS[queue], 'count': counts[queue]}
+            for queue in OPEN_CLAIM_STATUSES
+        ])
+    
+    except Exception as e:
+        return Response(
+            {'error': f'Error counting work queues: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+class ClaimQueueView(generics.ListAPIView):
+    """Claims in one open work queue, oldest discharge first (the order of its index)"""
+    serializer_class = ClaimSerializer
+    permission_classes = [IsDataEntryOrManager]
+    
+    def get_queryset(self):
+        queue = self.kwargs['status']
+        if queue not in OPEN_CLAIM_STATUSES:
+            raise NotFound(f'Unknown work queue "{queue}". Choose from {", ".join(OPEN_CLAIM_STATUSES)}.')
+        return (
+            Claim.objects.filter(status=queue)
+            .select_related('tpa', 'insurer')
+            .order_by('date_of_discharge', 'id')
+        )
+    
+    def list(self, request, *args, **kwargs):
+        with replica_reads(request):
+            return super().list(request, *args, **kwargs)
+
+class ClaimDocumentListView(AuditedWritesMixin, generics.ListCreateAPIView):
+    """Documents of a claim (?kind= to filter); POST uploads one as multipart form data (`file`, `kind`)"""
+    serializer_class = ClaimDocumentSerializer
+    permission_classes = [IsDataEntryOrManager]
+    
+    def get_queryset(self):
+        queryset = ClaimDocument.objects.filter(claim_id=self.kwargs['pk']).select_related('uploaded_by')
+        kind = self.request.query_params.get('kind')
+        if kind:
+            queryset = queryset.filter(kind=kind)
+        return queryset
+    
+    def create(self, request, *args, **kwargs):
+        claim = get_object_or_404(Claim, pk=self.kwargs['pk'])
+        # Stream the file to disk and hash it on the way instead of buffering it
+        handler = DocumentUploadHandler(request)
+        request.upload_handlers = [handler]
+        try:
+            upload = request.FILES.get('file')
+            if handler.too_large:
+                return Response(
+                    {'error': f'{handler.too_large[0]} is larger than the '
+                              f'{settings.CLAIM_DOCUMENT_MAX_SIZE // (1024 * 1024)} MB document limit'},
+                    status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                )
+            if upload is None:
+                return Response(
+                    {'error': 'Send the document as multipart form data in a "file" field'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            document = attach_document(
+                claim, request.data.get('kind', ''), upload.temporary_file_path(), upload.sha256, upload.size,
+                upload.name, content_type=upload.content_type, user=request.user,
+            )
+        except DocumentError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            handler.cleanup()
+        
+        return Response(self.get_serializer(document).data, status=status.HTTP_201_CREATED)
+
+class ClaimDocumentDetailView(AuditedWritesMixin, generics.RetrieveDestroyAPIView):
+    """One document; deleting the last of its kind clears the claim's *_uploaded flag"""
+    queryset = ClaimDocument.objects.select_related('uploaded_by')
+    serializer_class = ClaimDocumentSerializer
+    permission_classes = [IsDataEntryOrManager]
+    
+    def perform_destroy(self, instance):
+        delete_document(instance)
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([IsDataEntryOrManager])
+def download_document(request, pk):
+    """The document's file; Range, If-Range and If-None-Match are honoured (see CLAIM_DOCUMENTS_SENDFILE)"""
+    document = get_object_or_404(ClaimDocument, pk=pk)
+    try:
+        return document_response(request, document)
+    
+    except OSError as e:
+        return Response(
+            {'error': f'Error reading document {document.pk}: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([IsDataEntryOrManager])
+def document_preview(request, pk, variant):
+    """JPEG thumbnail or preview of a document's first page; 202 while it is still being rendered"""
+    document = get_object_or_404(ClaimDocument, pk=pk)
+    if variant not in PREVIEW_SIZES:
+        raise NotFound(f'Unknown preview "{variant}"')
+    
+    try:
+        preview = DocumentPreview.objects.filter(sha256=document.sha256).first()
+        if preview is None or not is_cached(preview):
+            if preview is not None and preview.status in ('unsupported', 'failed'):
+                return Response(
+                    {'status': preview.status, 'error': preview.error}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            # Not rendered yet, or the images were removed: (re)queue and ask the client to retry
+            preview = enqueue_preview(document.sha256)
+            return Response({'status': preview.status}, status=status.HTTP_202_ACCEPTED)
+        
+        return stored_file_response(
+            request, preview_path(document.sha256, variant), f'"{document.sha256}-{variant}"', 'image/jpeg'
+        )
+    
+    except OSError as e:
+        return Response(
+            {'error': f'Error reading preview of document {document.pk}: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@permission_classes([IsManager])
+def preview_queue(request):
+    """Depth of the thumbnail queue and render timings"""
+    try:
+        return Response(queue_stats())
+    
+    except Exception as e:
+        return Response(
+            {'error': f'Error reading preview queue: {str(e)}'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['POST'])
+@permission_classes([IsDataEntryOrManager])
+def start_document_upload(request, pk):
+    """Open a resumable upload for a claim from `kind`, `name` and `size` (bytes), optionally `sha256`"""
+    claim = get_object_or_404(Claim, pk=pk)
+    try:
+        size = int(request.data.get('size', 0))
+    except (TypeError, ValueError):
+        return Response({'error': 'size must be a number of bytes'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        upload = start_upload(
+            claim,
+            request.data.get('kind', ''),
+            request.data.get('name', ''),
+            size,
+            content_type=request.data.get('content_type', ''),
+            sha256=request.data.get('sha256', ''),
+            user=request.user,
+        )
+        return Response(DocumentUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+    
+    except DocumentError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET', 'PATCH', 'DELETE'])
+@permission_classes([IsDataEntryOrManager])
+@audited_writes
+def document_upload(request, upload_id):
+    """Resumable upload: GET its offset, PATCH the next chunk as the raw body with an
+    Upload-Offset header (the last chunk returns the document), DELETE to cancel it"""
+    upload = get_object_or_404(DocumentUpload, pk=upload_id)
+    if request.method == 'GET':
+        # A correction of the offset made by a failed request was rolled back with it
+        upload.offset = current_offset(upload)
+        return Response(DocumentUploadSerializer(upload).data)
+    if request.method == 'DELETE':
+        cancel_upload(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return Response({'error': 'Upload-Offset header is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        # The body is read from the request stream block by block, never parsed or buffered
+        result = append_chunk(upload.pk, offset, request.stream)
+    except UploadOffsetMismatch as e:
+        upload.refresh_from_db()
+        return Response({'error': str(e), 'offset': current_offset(upload)}, status=status.HTTP_409_CONFLICT)
+    except DocumentError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if isinstance(result, ClaimDocument):
+        return Response(ClaimDocumentSerializer(result).data, status=status.HTTP_201_CREATED)
+    return Response(DocumentUploadSerializer(result).data)
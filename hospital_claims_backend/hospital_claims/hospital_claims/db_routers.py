@@ -0,0 +1,131 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the ``default`` (primary) database. Reads go to the
+``replica`` database only inside a ``replica_reads()`` block, which the
+read-only list, export and dashboard views open around their work. A user who
+has just written is pinned to the primary for ``REPLICA_PIN_SECONDS`` so they
+never read their own change back from a lagging replica. The pin is a cache
+key, and settings refuse a replica without a shared cache (``CACHE_URL``):
+the user's next read may be served by another worker process.
+"""
+import functools
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+REPLICA_ALIAS = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def _pin_key(user):
+    return f'replica-pin:{user.pk}'
+
+
+def pin_to_primary(user):
+    """Keep this user's reads on the primary for the configured window"""
+    if user is not None and user.is_authenticated:
+        cache.set(_pin_key(user), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def is_pinned(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return False
+    return bool(cache.get(_pin_key(user)))
+
+
+@contextmanager
+def replica_reads(request=None):
+    """Route ORM reads in this block to the replica unless the user is pinned"""
+    if not replica_configured() or (request is not None and is_pinned(request)):
+        yield
+        return
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@asynccontextmanager
+async def areplica_reads(request=None):
+    """replica_reads for async views; the pin is looked up off the event loop (the cache may be a table)"""
+    if not replica_configured() or (request is not None and await sync_to_async(is_pinned)(request)):
+        yield
+        return
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_from_replica(view_func):
+    """Decorator for read-only function views (place it under @api_view)"""
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads(request):
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    """Send reads to the replica only when a replica_reads() block is active"""
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data, so cross-alias relations are fine
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives schema changes through replication
+        return db == 'default'
+
+
+class PinPrimaryAfterWriteMiddleware:
+    """Pin users to the primary for a short window after a successful write"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Under ASGI, stay async so requests are not pushed through a thread here
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _should_pin(self, request, response):
+        return (replica_configured()
+                and request.method not in SAFE_METHODS
+                and response.status_code < 400)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self._should_pin(request, response):
+            # DRF copies the JWT-authenticated user back onto the HttpRequest
+            pin_to_primary(getattr(request, 'user', None))
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self._should_pin(request, response):
+            await sync_to_async(pin_to_primary)(getattr(request, 'user', None))
+        return response
@@ -2,6 +2,7 @@ import os
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -24,6 +25,7 @@ INSTALLED_APPS = [
     'django_filters',
 ]
 
+# All but WhiteNoise (sync only as of 6.x) handle ASGI requests without a thread hop
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -34,6 +36,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'hospital_claims.db_routers.PinPrimaryAfterWriteMiddleware',
 ]
 
 ROOT_URLCONF = 'hospital_claims.urls'
@@ -56,6 +59,12 @@ TEMPLATES = [
 
 
 WSGI_APPLICATION = 'hospital_claims.wsgi.application'
+ASGI_APPLICATION = 'hospital_claims.asgi.application'
+
+# 'wsgi' (gunicorn sync workers) or 'asgi' (gunicorn with uvicorn workers)
+SERVER_MODE = config('SERVER_MODE', default='wsgi')
+# Native async dashboard views; on by default under ASGI
+ASYNC_DASHBOARD = config('ASYNC_DASHBOARD', default=SERVER_MODE == 'asgi', cast=bool)
 
 # PostgreSQL Database Configuration
 import dj_database_url
@@ -78,6 +87,37 @@ else:
         }
     }
 
+# Cache shared by every worker process: redis://host:6379/0 (needs the redis
+# package) or db://<table> (a table made by `manage.py createcachetable`).
+# Unset, each process keeps its own in-memory cache
+CACHE_URL = config('CACHE_URL', default=None)
+
+if CACHE_URL and CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}}
+elif CACHE_URL and CACHE_URL.startswith('db://'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': CACHE_URL[len('db://'):] or 'claims_cache',
+    }}
+elif CACHE_URL:
+    raise ImproperlyConfigured('CACHE_URL must start with redis://, rediss:// or db://')
+
+# Optional read replica for list, export and dashboard reads
+DATABASE_REPLICA_URL = config('DATABASE_REPLICA_URL', default=None)
+
+if DATABASE_REPLICA_URL:
+    # A write pins the user to the primary through the cache; with a per-process
+    # cache the next read could land on another worker and see the replica's old row
+    if not CACHE_URL:
+        raise ImproperlyConfigured('DATABASE_REPLICA_URL needs a shared cache: set CACHE_URL as well')
+    DATABASES['replica'] = dj_database_url.parse(DATABASE_REPLICA_URL)
+    # Tests run against the primary only; the replica alias mirrors it
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS = ['hospital_claims.db_routers.PrimaryReplicaRouter']
+
+# Seconds a user's reads stay on the primary after they write (kept in the shared cache)
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -90,6 +130,56 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# Row limit for /api/claims/cube/ results
+CUBE_MAX_ROWS = config('CUBE_MAX_ROWS', default=5000, cast=int)
+
+# Optional in-memory NumPy snapshot behind /api/claims/analytics/range/
+ANALYTICS_SNAPSHOT = config('ANALYTICS_SNAPSHOT', default=False, cast=bool)
+# Seconds before the snapshot applies changes made since its watermark
+ANALYTICS_SNAPSHOT_MAX_AGE = config('ANALYTICS_SNAPSHOT_MAX_AGE', default=30, cast=int)
+
+# Expected TDS as a percentage of the approved amount, for the anomaly scanner
+ANOMALY_TDS_BAND = (0.5, 2.0)
+# Per-TPA overrides, e.g. {'Star Health Insurance': (1.0, 2.0)}
+ANOMALY_TDS_BANDS = {}
+
+# Cold archive of old settled claims (`manage.py archive_claims`): where the
+# Parquet files go, and how many days after settlement a claim may be archived
+CLAIMS_ARCHIVE_DIR = config('CLAIMS_ARCHIVE_DIR', default=os.path.join(BASE_DIR, 'archive'))
+CLAIMS_ARCHIVE_AFTER_DAYS = config('CLAIMS_ARCHIVE_AFTER_DAYS', default=730, cast=int)
+
+# Claim documents, stored once per SHA-256 (kept outside MEDIA_ROOT so they are
+# never served without a permission check), the largest file accepted, and the
+# hours an unfinished resumable upload is kept (`manage.py prune_claim_documents`)
+CLAIM_DOCUMENTS_DIR = config('CLAIM_DOCUMENTS_DIR', default=os.path.join(BASE_DIR, 'documents'))
+CLAIM_DOCUMENT_MAX_SIZE = config('CLAIM_DOCUMENT_MAX_SIZE', default=200 * 1024 * 1024, cast=int)
+CLAIM_DOCUMENT_UPLOAD_EXPIRY_HOURS = config('CLAIM_DOCUMENT_UPLOAD_EXPIRY_HOURS', default=48, cast=int)
+# Who sends document downloads: '' streams them from Django, 'x-accel-redirect'
+# (nginx) and 'x-sendfile' (Apache mod_xsendfile, lighttpd) hand the file to the
+# front server after the permission check. For nginx, the prefix is an
+# `internal` location whose alias is CLAIM_DOCUMENTS_DIR
+CLAIM_DOCUMENTS_SENDFILE = config('CLAIM_DOCUMENTS_SENDFILE', default='')
+CLAIM_DOCUMENTS_ACCEL_PREFIX = config('CLAIM_DOCUMENTS_ACCEL_PREFIX', default='/protected-documents/')
+# Processes per web worker rendering document thumbnails in the background (0 leaves
+# them to `manage.py generate_previews`), and how many files may wait for them
+CLAIM_PREVIEW_WORKERS = config('CLAIM_PREVIEW_WORKERS', default=2, cast=int)
+CLAIM_PREVIEW_QUEUE_LIMIT = config('CLAIM_PREVIEW_QUEUE_LIMIT', default=200, cast=int)
+# Regenerate a closed month's snapshot (`manage.py close_month`) in a background thread
+# as soon as one of its claims changes; when off, the next request for it regenerates it
+CLAIM_SNAPSHOT_BACKGROUND_REFRESH = config('CLAIM_SNAPSHOT_BACKGROUND_REFRESH', default=True, cast=bool)
+
+# Width of claims partitions when converting with `manage.py partition_claims --convert`
+# (PostgreSQL only; 'month' or 'quarter'), and how many future partitions to keep
+CLAIMS_PARTITION_INTERVAL = config('CLAIMS_PARTITION_INTERVAL', default='month')
+CLAIMS_PARTITIONS_AHEAD = config('CLAIMS_PARTITIONS_AHEAD', default=6, cast=int)
+
+# Seconds settlement-lag statistics of past months stay cached. Claim changes
+# invalidate them sooner, in every worker only when CACHE_URL is a shared cache
+LAG_STATS_CACHE_SECONDS = config('LAG_STATS_CACHE_SECONDS', default=900, cast=int)
+
+# Pairs scoring at least this (0-1) are reported as possible duplicate claims
+DUPLICATE_MIN_SCORE = config('DUPLICATE_MIN_SCORE', default=0.6, cast=float)
+
 # JWT Configuration
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=24),
@@ -5,11 +5,20 @@ cd hospital_claims
 echo "Running migrations..."
 python manage.py migrate
 
+# Create the cache table when CACHE_URL=db://... (no-op otherwise)
+python manage.py createcachetable
+
+# Create upcoming claims partitions (no-op unless the table is partitioned)
+python manage.py partition_claims
+
 # Collect static files
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
 # Start the server
 echo "Starting server..."
-gunicorn hospital_claims.wsgi:application --bind 0.0.0.0:$PORT --workers 2 --timeout 120
-  
\ No newline at end of file
+if [ "$SERVER_MODE" = "asgi" ]; then
+    gunicorn hospital_claims.asgi:application --bind 0.0.0.0:$PORT --workers 2 --timeout 120 -k uvicorn.workers.UvicornWorker
+else
+    gunicorn hospital_claims.wsgi:application --bind 0.0.0.0:$PORT --workers 2 --timeout 120
+fi
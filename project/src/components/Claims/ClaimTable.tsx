@@ -12,7 +12,9 @@ import {
   X
 } from 'lucide-react';
 import { Claim } from '../../types';
-import { exportToCSV } from '../../utils/csvExport';
+import { claimsService } from '../../services/claimsService';
+import { downloadBlob } from '../../utils/download';
+import { useToast } from '../../hooks/useToast';
 import { DateInput } from '../Common/DateInput';
 
 interface ClaimTableProps {
@@ -55,6 +57,8 @@ export const ClaimTable: React.FC<ClaimTableProps> = ({
   } | null>(null);
   const [showColumnSelector, setShowColumnSelector] = useState(false);
   const [showFilters, setShowFilters] = useState(false);
+  const [isExporting, setIsExporting] = useState(false);
+  const { showToast } = useToast();
   const [visibleColumns, setVisibleColumns] = useState<Set<string>>(new Set([
     'month', 'date_of_admission', 'date_of_discharge', 'tpa_name', 'claim_id', 
     'patient_name', 'bill_amount', 'approved_amount', 'settlement_status', 'files', 'actions'
@@ -386,8 +390,36 @@ export const ClaimTable: React.FC<ClaimTableProps> = ({
     // Implement bulk actions
   };
 
-  const handleExportCSV = () => {
-    exportToCSV(filteredClaims, 'claims-export.csv');
+  // The server builds the workbook from the same search and filters, over all pages
+  const exportParams = () => {
+    const params = new URLSearchParams();
+    if (searchTerm) params.append('search', searchTerm);
+    if (appliedFilters.patientName) params.append('patient_name__icontains', appliedFilters.patientName);
+    if (appliedFilters.claimId) params.append('claim_id__icontains', appliedFilters.claimId);
+    if (appliedFilters.tpaName) params.append('tpa_name__icontains', appliedFilters.tpaName);
+    if (appliedFilters.parentInsurance) params.append('parent_insurance__icontains', appliedFilters.parentInsurance);
+    if (appliedFilters.settlementStatus) {
+      params.append('has_settlement_date', appliedFilters.settlementStatus === 'settled' ? 'true' : 'false');
+    }
+    if (appliedFilters.fileStatus) params.append('physical_file_dispatch', appliedFilters.fileStatus);
+    if (appliedFilters.admissionDateFrom) params.append('date_of_admission_from', appliedFilters.admissionDateFrom);
+    if (appliedFilters.admissionDateTo) params.append('date_of_admission_to', appliedFilters.admissionDateTo);
+    if (appliedFilters.dischargeDateFrom) params.append('date_of_discharge_from', appliedFilters.dischargeDateFrom);
+    if (appliedFilters.dischargeDateTo) params.append('date_of_discharge_to', appliedFilters.dischargeDateTo);
+    return params.toString();
+  };
+
+  const handleExport = async () => {
+    setIsExporting(true);
+    try {
+      const blob = await claimsService.exportClaimsXlsx(exportParams());
+      downloadBlob(blob, `claims-${new Date().toISOString().slice(0, 10)}.xlsx`);
+    } catch (error) {
+      console.error('Error exporting claims:', error);
+      showToast('Failed to export claims', 'error');
+    } finally {
+      setIsExporting(false);
+    }
   };
 
   const formatCurrency = (amount: number) => {
@@ -566,11 +598,12 @@ export const ClaimTable: React.FC<ClaimTableProps> = ({
               </button>
               
               <button
-                onClick={handleExportCSV}
+                onClick={handleExport}
+                disabled={isExporting}
                 className="btn btn-success"
               >
                 <Download className="w-4 h-4 mr-2" />
-                Export CSV
+                {isExporting ? 'Exporting...' : 'Export Excel'}
               </button>
             </div>
           </div>
@@ -82,15 +82,14 @@ export const Dashboard: React.FC = () => {
           if (appliedFilters.company) params.append('company', appliedFilters.company);
           if (appliedFilters.tpa) params.append('tpa', appliedFilters.tpa);
         
-        const [statsData, monthlyDataData, companyDataData] = await Promise.all([
-          claimsService.getDashboardStats(params.toString()),
-          claimsService.getMonthwiseData(params.toString()),
-          claimsService.getCompanywiseData(params.toString())
-        ]);
+        const dashboardData = await claimsService.getDashboard(
+          ['summary', 'monthwise', 'companywise'],
+          params.toString()
+        );
         
-        setStats(statsData);
-        setMonthlyData(monthlyDataData || []);
-        setCompanyData(companyDataData || []);
+        if (dashboardData.summary) setStats(dashboardData.summary);
+        setMonthlyData(dashboardData.monthwise || []);
+        setCompanyData(dashboardData.companywise || []);
       } catch (error) {
         console.error('Failed to load dashboard data:', error);
         // Set default values on error
@@ -41,6 +41,12 @@ export interface CreateClaimRequest {
   receipt_verified_bank: boolean;
 }
 
+export interface DashboardResponse {
+  summary?: DashboardStats;
+  monthwise?: ChartData[];
+  companywise?: ChartData[];
+}
+
 export const claimsService = {
   async getClaims(page: number = 1, search?: string): Promise<ClaimsResponse> {
     const params = new URLSearchParams();
@@ -97,6 +103,12 @@ export const claimsService = {
     await api.delete(`/api/claims/${id}/`);
   },
 
+  async exportClaimsXlsx(params?: string): Promise<Blob> {
+    const url = params ? `/api/claims/export.xlsx?${params}` : '/api/claims/export.xlsx';
+    const response = await api.get<Blob>(url, { responseType: 'blob' });
+    return response.data;
+  },
+
   async updateFileStatus(claimId: string, fileField: string, uploaded: boolean): Promise<void> {
     await api.patch(`/api/claims/${claimId}/update-file-status/${fileField}/`, { uploaded });
   },
@@ -107,6 +119,13 @@ export const claimsService = {
     return response.data;
   },
 
+  async getDashboard(sections: string[], params?: string): Promise<DashboardResponse> {
+    const query = new URLSearchParams(params);
+    query.set('sections', sections.join(','));
+    const response = await api.get<DashboardResponse>(`/api/claims/dashboard/?${query.toString()}`);
+    return response.data;
+  },
+
   async getMonthwiseData(params?: string): Promise<ChartData[]> {
     const url = params ? `/api/claims/dashboard/monthwise/?${params}` : '/api/claims/dashboard/monthwise/';
     const response = await api.get<ChartData[]>(url);
@@ -95,8 +95,16 @@ export interface DashboardStats {
   totalPaidByPatients: number;
 }
 
+export interface PeriodMetric {
+  value: number;
+  mom_pct: number | null;
+  yoy_pct: number | null;
+  rolling_3m_avg: number | null;
+}
+
 export interface ChartData {
   name: string;
   value: number;
   month?: string;
+  metrics?: Record<string, PeriodMetric>;
 }
\ No newline at end of file